@@ -0,0 +1,359 @@
+import numpy as np
+import pandas as pd
+import shutil
+import warnings
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from OpportunityModel import ColumnStore
+from OpportunityView import OppSelect, intersect_ranges
+
+KINDS = ["corr", "lag", "peak"]
+
+
+def column_blocks(n_cols: int, block_size: int) -> List[slice]:
+    return [
+        slice(start, min(start + block_size, n_cols))
+        for start in range(0, n_cols, block_size)
+    ]
+
+
+def centred_block(matrix: np.ndarray, block: slice) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Columns of a block centred on their mean, with the NaNs set to 0,
+    and their validity mask, both as float64.
+    """
+    values = np.asarray(matrix[:, block], dtype=np.float64)
+    valid = ~np.isnan(values)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        means = np.nanmean(values, axis=0)
+    values = np.where(valid, values - np.nan_to_num(means), 0.0)
+    return values, valid.astype(np.float64)
+
+
+def standardized_block(matrix: np.ndarray, block: slice) -> np.ndarray:
+    """
+    Columns of a block standardized to zero mean and unit variance,
+    with the NaNs and constant columns set to 0.
+    """
+    values, valid = centred_block(matrix, block)
+    counts = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stds = np.sqrt((values * values).sum(axis=0) / counts)
+        values = values / stds
+    values[:, ~(stds > 0)] = 0.0
+    return values
+
+
+def correlation_matrix(matrix: np.ndarray, block_size: int = 64) -> np.ndarray:
+    """
+    Pearson correlation of every pair of columns, over the rows where both
+    are not NaN, as DataFrame.corr, with a few matrix products per pair of
+    column blocks instead of one pass per pair of columns.
+    Arguments:
+        matrix {np.ndarray} -- Rows are samples, columns are signals.
+        block_size {int} -- Columns per block, bounds the temporary memory
+        to a few copies of block_size columns.
+    Returns:
+        np.ndarray -- Symmetric (n_cols, n_cols) matrix, NaN for the pairs
+        with less than two common samples or a constant column.
+    """
+    n_cols = matrix.shape[1]
+    result = np.full((n_cols, n_cols), np.nan)
+    blocks = column_blocks(n_cols, block_size)
+    for i, block_i in enumerate(blocks):
+        x, x_valid = centred_block(matrix, block_i)
+        for block_j in blocks[i:]:
+            y, y_valid = centred_block(matrix, block_j)
+            counts = x_valid.T @ y_valid
+            with np.errstate(invalid="ignore", divide="ignore"):
+                sum_x = x.T @ y_valid
+                sum_y = x_valid.T @ y
+                covariance = x.T @ y - sum_x * sum_y / counts
+                variance_x = (x * x).T @ y_valid - sum_x * sum_x / counts
+                variance_y = x_valid.T @ (y * y) - sum_y * sum_y / counts
+                correlation = covariance / np.sqrt(variance_x * variance_y)
+            correlation[counts < 2] = np.nan
+            correlation[~((variance_x > 0) & (variance_y > 0))] = np.nan
+            correlation = np.clip(correlation, -1, 1)
+            result[block_i, block_j] = correlation
+            result[block_j, block_i] = correlation.T
+    return result
+
+
+def lag_correlations(
+    matrix: np.ndarray,
+    max_lag: int = 30,
+    block_size: int = 32,
+    seams: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Best-lag cross-correlation of every pair of columns, through the FFT
+    of the standardized columns. The correlation at lag k of the columns
+    i and j is the mean of z_i[t + k] * z_j[t], NaNs counting as 0, so at
+    lag 0 and without NaNs it is their Pearson correlation.
+    Arguments:
+        matrix {np.ndarray} -- Rows are samples, columns are signals.
+        max_lag {int} -- Lags searched, from -max_lag to max_lag samples.
+        block_size {int} -- Columns per block, the temporary memory is about
+        block_size times the FFT length times 24 bytes.
+        seams {Optional[np.ndarray]} -- Rows starting a new contiguous range,
+        e.g. another episode, samples are never paired across them.
+    Returns:
+        Tuple[np.ndarray, np.ndarray] -- (n_cols, n_cols) matrices of the lag of
+        the highest absolute correlation and of the correlation at that lag.
+    """
+    n_rows, n_cols = matrix.shape
+    lags = np.zeros((n_cols, n_cols), dtype=np.int64)
+    peaks = np.full((n_cols, n_cols), np.nan)
+    if n_rows == 0:
+        return lags, peaks
+    max_lag = min(max_lag, n_rows - 1)
+    if seams is not None and len(seams) and max_lag > 0:
+        # max_lag NaN rows at every seam only pair samples with NaNs, which
+        # count as 0, and leave the means and deviations unchanged
+        if not np.issubdtype(matrix.dtype, np.floating):
+            matrix = matrix.astype(np.float64)
+        matrix = np.insert(matrix, np.repeat(seams, max_lag), np.nan, axis=0)
+    n_fft = 1 << int(np.ceil(np.log2(len(matrix) + max_lag)))
+    lag_values = np.arange(-max_lag, max_lag + 1)
+    lag_rows = lag_values % n_fft
+    blocks = column_blocks(n_cols, block_size)
+    for i, block_i in enumerate(blocks):
+        spectra_i = np.fft.rfft(standardized_block(matrix, block_i), n_fft, axis=0)
+        for block_j in blocks[i:]:
+            spectra_j = np.fft.rfft(standardized_block(matrix, block_j), n_fft, axis=0)
+            spectra_j = np.conj(spectra_j)
+            for column, spectrum in zip(
+                range(block_i.start, block_i.stop), spectra_i.T
+            ):
+                correlations = np.fft.irfft(
+                    spectrum[:, np.newaxis] * spectra_j, n_fft, axis=0
+                )
+                correlations = correlations[lag_rows] / n_rows
+                best = np.abs(correlations).argmax(axis=0)
+                lags[column, block_j] = lag_values[best]
+                peaks[column, block_j] = correlations[best, np.arange(len(best))]
+            lags[block_j, block_i] = -lags[block_i, block_j].T
+            peaks[block_j, block_i] = peaks[block_i, block_j].T
+    return lags, peaks
+
+
+class CorrelationStore:
+    """
+        Correlations between the signals of every segment.
+        For every PID, RunID, label class and label, as the keys of
+        HistogramStore, the store keeps the Pearson correlation matrix of
+        the signals and the lag and value of their best-lag cross-correlation,
+        as stacked, memory-mapped .npy arrays next to an index table.
+        A signal is identified by its column position in the OppDF.
+    """
+
+    INDEX_NAME = "index"
+    COLUMNS_NAME = "columns.npy"
+    KEY_COLUMNS = ["PID", "RunID", "Class", "Label"]
+
+    def __init__(self, path: str):
+        """
+        Opens an existing store.
+        Arguments:
+            path {str} -- Path to the folder of the store.
+        """
+        self.path = Path(path)
+        self.index = ColumnStore(self.path / self.INDEX_NAME).to_frame()
+        self.columns = np.load(self.path / self.COLUMNS_NAME)
+        self.arrays = {
+            kind: np.load(self.path / f"{kind}.npy", mmap_mode="r") for kind in KINDS
+        }
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def select(self, filter_dict: Optional[dict] = None) -> pd.DataFrame:
+        """
+        Returns the rows of the index matching filter_dict.
+        E.g. : self.select({'PID': '2', 'Label': ['Walk', 'Stand']})
+        Arguments:
+            filter_dict {dict} -- Column of the index to the value or list of values to keep.
+        Returns:
+            pd.DataFrame -- The selected rows of the index.
+        """
+        selected = self.index
+        for key, values in (filter_dict or {}).items():
+            if type(values) is str:
+                values = [values]
+            selected = selected[selected[key].isin(values)]
+        return selected
+
+    def matrix(self, row, kind: str = "corr") -> pd.DataFrame:
+        """
+        The corr, lag or peak matrix of a row of the index, labelled by
+        column position.
+        """
+        return pd.DataFrame(
+            np.asarray(self.arrays[kind][row.Index]),
+            index=self.columns,
+            columns=self.columns,
+        )
+
+    def pairs(
+        self, filter_dict: Optional[dict] = None, threshold: float = 0.9
+    ) -> pd.DataFrame:
+        """
+        The pairs of signals whose absolute correlation reaches threshold
+        in the segments matching filter_dict, see select, e.g. to find
+        redundant sensors.
+        Returns:
+            pd.DataFrame -- One row per segment and pair, with the keys, the
+            Column and Other positions and the corr, lag and peak values.
+        """
+        selected = self.select(filter_dict)
+        upper = np.triu(np.ones((len(self.columns),) * 2, dtype=bool), k=1)
+        pairs = []
+        for row in selected.itertuples():
+            corr = np.asarray(self.arrays["corr"][row.Index])
+            first, second = np.nonzero(upper & (np.abs(corr) >= threshold))
+            pair = pd.DataFrame(
+                {
+                    "Column": self.columns[first],
+                    "Other": self.columns[second],
+                    "corr": corr[first, second],
+                    "lag": self.arrays["lag"][row.Index][first, second],
+                    "peak": self.arrays["peak"][row.Index][first, second],
+                }
+            )
+            for position, key in enumerate(self.KEY_COLUMNS):
+                pair.insert(position, key, getattr(row, key))
+            pairs.append(pair)
+        if not pairs:
+            return pd.DataFrame(columns=self.KEY_COLUMNS + ["Column", "Other"] + KINDS)
+        return pd.concat(pairs, ignore_index=True)
+
+    @classmethod
+    def create(
+        cls,
+        path: str,
+        keys: List[tuple],
+        n_rows: List[int],
+        columns: List[int],
+    ) -> Dict[str, np.ndarray]:
+        """
+        Writes the index of a store in path, replacing any previous store
+        there, and allocates its arrays, to be filled segment by segment
+        without holding them in memory.
+        Arguments:
+            path {str} -- Path to the folder of the store.
+            keys {List[tuple]} -- (PID, RunID, Class, Label) of every segment.
+            n_rows {List[int]} -- Samples of every segment.
+            columns {List[int]} -- Positions of the signals.
+        Returns:
+            Dict[str, np.ndarray] -- The corr, lag and peak memory-mapped arrays,
+            of shape (segments, signals, signals).
+        """
+        path = Path(path)
+        if path.exists():
+            shutil.rmtree(path)
+        path.mkdir(parents=True)
+
+        index = pd.DataFrame(keys, columns=cls.KEY_COLUMNS)
+        for key in cls.KEY_COLUMNS:
+            index[key] = index[key].astype(str)
+        index["n_rows"] = np.asarray(n_rows, dtype=np.int64)
+        ColumnStore.write(index, path / cls.INDEX_NAME)
+        np.save(path / cls.COLUMNS_NAME, np.asarray(columns, dtype=np.int64))
+        shape = (len(keys), len(columns), len(columns))
+        return {
+            kind: np.lib.format.open_memmap(
+                path / f"{kind}.npy", mode="w+", dtype=dtype, shape=shape
+            )
+            for kind, dtype in zip(KINDS, [np.float32, np.int32, np.float32])
+        }
+
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        keys: List[tuple],
+        n_rows: List[int],
+        columns: List[int],
+        corrs: List[np.ndarray],
+        lags: List[np.ndarray],
+        peaks: List[np.ndarray],
+    ) -> "CorrelationStore":
+        """
+        Writes correlations as a store in path, replacing any previous store there.
+        Arguments:
+            path {str} -- Path to the folder of the store.
+            keys {List[tuple]} -- (PID, RunID, Class, Label) of every segment.
+            n_rows {List[int]} -- Samples of every segment.
+            columns {List[int]} -- Positions of the signals.
+            corrs {List[np.ndarray]} -- Correlation matrix of every segment.
+            lags {List[np.ndarray]} -- Best lag matrix of every segment.
+            peaks {List[np.ndarray]} -- Best-lag correlation matrix of every segment.
+        Returns:
+            CorrelationStore -- The written store.
+        """
+        arrays = cls.create(path, keys, n_rows, columns)
+        for kind, values in zip(KINDS, [corrs, lags, peaks]):
+            for position, value in enumerate(values):
+                arrays[kind][position] = value
+            arrays[kind].flush()
+        del arrays
+        return cls(path)
+
+
+def segment_correlations(
+    db_view: OppSelect,
+    path: str,
+    label_class: str = "Locomotion",
+    columns: Optional[List[int]] = None,
+    max_lag: int = 30,
+    block_size: int = 32,
+) -> CorrelationStore:
+    """
+    Computes the correlations of the signals of every PID, RunID and label
+    of a label class in the current selection of an OppSelect, over all the
+    rows of the run with that label, as the histograms of main, and writes
+    them as a CorrelationStore, one segment at a time. The best lags are
+    searched within every episode of the label, never across two of them.
+    Arguments:
+        db_view {OppSelect} -- The selection.
+        path {str} -- Path to the folder of the store.
+        label_class {str} -- The label class of the segments.
+        columns {Optional[List[int]]} -- Positions of the signals, None for all.
+        max_lag {int} -- Lags searched, see lag_correlations.
+        block_size {int} -- Columns per block, see lag_correlations.
+    Returns:
+        CorrelationStore -- The written store.
+    """
+    if columns is None:
+        columns = list(range(1, len(db_view.metadata)))
+    segments = db_view.segments[db_view.segments["Class"] == label_class]
+    keys, segment_ranges = [], []
+    for (pid, run_id, label), group in segments.groupby(
+        ["PID", "RunID", "Label"], sort=False
+    ):
+        ranges = intersect_ranges(db_view.ranges, group[["start", "stop"]].to_numpy())
+        if len(ranges):
+            keys.append((pid, run_id, label_class, label))
+            segment_ranges.append(ranges)
+    lengths = [ranges[:, 1] - ranges[:, 0] for ranges in segment_ranges]
+    arrays = CorrelationStore.create(
+        path, keys, [int(length.sum()) for length in lengths], columns
+    )
+    for position, ranges in enumerate(segment_ranges):
+        matrix = np.concatenate(
+            [
+                db_view.model.signal_matrix(columns, start, stop)
+                for start, stop in ranges
+            ]
+        )
+        arrays["corr"][position] = correlation_matrix(matrix, 2 * block_size)
+        seams = np.cumsum(lengths[position])[:-1]
+        arrays["lag"][position], arrays["peak"][position] = lag_correlations(
+            matrix, max_lag, block_size, seams
+        )
+    for array in arrays.values():
+        array.flush()
+    del arrays
+    return CorrelationStore(path)
@@ -0,0 +1,152 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+
+class Pyramid:
+    """
+        Min/max decimation pyramid of a series, for plotting it at any zoom
+        without drawing every sample. Level k summarises blocks of factor**k
+        samples by their minimum and maximum, and where they are, so that
+        a decimated plot keeps every peak of the series. The series itself
+        is level 0. Building all the levels takes one pass over the samples,
+        and 4 / (factor - 1) times the memory of their float64 values.
+        E.g. : times, values = Pyramid(signal.time, signal.data).points(800)
+    """
+
+    def __init__(
+        self,
+        time: Optional[np.ndarray],
+        values: np.ndarray,
+        factor: int = 4,
+        min_block: int = 2,
+    ):
+        """
+        Arguments:
+            time {Optional[np.ndarray]} -- Sorted times of the samples,
+            None for their positions.
+            values {np.ndarray} -- The samples, NaNs are left out of the extremes.
+            factor {int} -- Samples of a block of a level per block of the next.
+            min_block {int} -- Stop once a level has fewer blocks.
+        """
+        self.values = np.asarray(values)
+        self.time = np.arange(len(self.values)) if time is None else np.asarray(time)
+        self.factor = factor
+        # Minimums, maximums and their positions of every level, from level 1
+        self.levels: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+
+        values = self.values.astype(np.float64)
+        nans = np.isnan(values)
+        mins = np.where(nans, np.inf, values)
+        maxs = np.where(nans, -np.inf, values)
+        min_positions = max_positions = np.arange(len(values))
+        while len(mins) >= factor * min_block:
+            mins, min_positions = self._reduce(mins, min_positions, np.argmin, np.inf)
+            maxs, max_positions = self._reduce(maxs, max_positions, np.argmax, -np.inf)
+            self.levels.append((mins, maxs, min_positions, max_positions))
+
+    def _reduce(
+        self, values: np.ndarray, positions: np.ndarray, arg, fill: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Extremes of every factor consecutive values and their positions.
+        """
+        n_blocks = -(-len(values) // self.factor)
+        padding = n_blocks * self.factor - len(values)
+        values = np.append(values, np.full(padding, fill)).reshape(n_blocks, -1)
+        positions = np.append(positions, np.full(padding, positions[-1]))
+        best = arg(values, axis=1)
+        rows = np.arange(n_blocks)
+        return values[rows, best], positions.reshape(n_blocks, -1)[rows, best]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def level(self, n_samples: int, n_points: int) -> int:
+        """
+        Coarsest level that still draws n_samples in at least n_points,
+        at two points per block.
+        """
+        level, size = 0, 1
+        while (
+            level < len(self.levels)
+            and 2 * n_samples / (size * self.factor) >= n_points
+        ):
+            level += 1
+            size *= self.factor
+        return level
+
+    def points(
+        self, n_points: int, start: int = 0, stop: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The samples of [start, stop) decimated to about n_points, e.g. the
+        width of the plot in pixels, or all of them when they are fewer.
+        Arguments:
+            n_points {int} -- Number of points to draw.
+            start {int} -- First sample.
+            stop {Optional[int]} -- Sample where to stop, None for the end.
+        Returns:
+            Tuple[np.ndarray, np.ndarray] -- Times and values of the points,
+            the extremes of every block in their order.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = max(start, 0)
+        level = self.level(stop - start, n_points)
+        if level == 0:
+            return self.time[start:stop], self.values[start:stop]
+        size = self.factor**level
+        mins, maxs, min_positions, max_positions = self.levels[level - 1]
+        blocks = slice(start // size, -(-stop // size))
+        mins, maxs = mins[blocks], maxs[blocks]
+        min_positions, max_positions = min_positions[blocks], max_positions[blocks]
+        min_first = min_positions <= max_positions
+        positions = np.empty(2 * len(mins), dtype=np.int64)
+        values = np.empty(2 * len(mins))
+        positions[0::2] = np.where(min_first, min_positions, max_positions)
+        positions[1::2] = np.where(min_first, max_positions, min_positions)
+        values[0::2] = np.where(min_first, mins, maxs)
+        values[1::2] = np.where(min_first, maxs, mins)
+        # Blocks of NaNs only
+        values[np.isinf(values)] = np.nan
+        return self.time[positions], values
+
+    def window(
+        self, n_points: int, first: float, last: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The samples between the times first and last, and one more on each
+        side so the lines reach the edges, decimated, see points.
+        """
+        start = np.searchsorted(self.time, first, side="left") - 1
+        stop = np.searchsorted(self.time, last, side="right") + 1
+        return self.points(n_points, start, stop)
+
+
+def plot(pyramid: Pyramid, *args, ax=None, n_points: Optional[int] = None, **kwargs):
+    """
+    Plots a Pyramid at the resolution of the axes, and plots the visible
+    range again at a finer level whenever the axes are zoomed or panned.
+    Arguments:
+        pyramid {Pyramid} -- The series to plot.
+        args, kwargs -- Format and properties of the line, as for ax.plot.
+        ax {matplotlib.axes.Axes} -- The axes, the current ones by default.
+        n_points {Optional[int]} -- Points to draw, the width of ax in
+        pixels by default.
+    Returns:
+        matplotlib.lines.Line2D -- The line.
+    """
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        ax = plt.gca()
+
+    def resolution() -> int:
+        return n_points or max(int(ax.bbox.width), 100)
+
+    (line,) = ax.plot(*pyramid.points(resolution()), *args, **kwargs)
+
+    def refine(ax):
+        line.set_data(*pyramid.window(resolution(), *sorted(ax.get_xlim())))
+
+    ax.callbacks.connect("xlim_changed", refine)
+    return line
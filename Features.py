@@ -0,0 +1,281 @@
+import numpy as np
+import pandas as pd
+import warnings
+from numpy.lib.stride_tricks import as_strided
+from pandas.api.types import union_categoricals
+from typing import List, Optional, Sequence, Tuple
+from OpportunityView import OppSelect, column_positions, intersect_ranges
+
+FEATURES = ["mean", "std", "min", "max", "energy", "zero_crossings", "valid"]
+RUN_COLUMNS = ["file", "PID", "RunID"]
+
+
+def sliding_windows(values: np.ndarray, window: int, stride: int) -> np.ndarray:
+    """
+    Zero-copy view of the windows of an array along its first axis.
+    Arguments:
+        values {np.ndarray} -- Rows are samples.
+        window {int} -- Samples per window.
+        stride {int} -- Samples between the starts of consecutive windows.
+    Returns:
+        np.ndarray -- Read-only view of shape (n_windows, window, ...).
+    """
+    n_windows = max(0, (len(values) - window) // stride + 1)
+    return as_strided(
+        values,
+        shape=(n_windows, window) + values.shape[1:],
+        strides=(values.strides[0] * stride,) + values.strides,
+        writeable=False,
+    )
+
+
+def window_sums(values: np.ndarray, window: int, stride: int) -> np.ndarray:
+    """
+    Sums of the windows of an array along its first axis, from prefix sums.
+    """
+    cumulative = np.zeros((len(values) + 1,) + values.shape[1:], dtype=np.float64)
+    np.cumsum(values, axis=0, out=cumulative[1:])
+    starts = np.arange(0, max(0, len(values) - window + 1), stride)
+    return cumulative[starts + window] - cumulative[starts]
+
+
+def window_statistics(
+    matrix: np.ndarray,
+    window: int,
+    stride: int,
+    features: Sequence[str] = FEATURES,
+    bin_edges: Optional[List[np.ndarray]] = None,
+) -> np.ndarray:
+    """
+    Computes features of every window of every column of a 2-D matrix.
+    NaN samples are ignored. Sums are taken from prefix sums and extremes
+    are reduced over a strided view, so no window is ever copied.
+        mean, std, energy -- Mean, standard deviation and mean square.
+        min, max -- Extremes.
+        zero_crossings -- Sign changes between consecutive valid samples.
+        valid -- Fraction of non-NaN samples.
+        hist -- When bin_edges are given, the fraction of the valid samples
+        of every bin of the column, as features hist0, hist1, ...
+    Arguments:
+        matrix {np.ndarray} -- Rows are samples, columns are signals.
+        window {int} -- Samples per window.
+        stride {int} -- Samples between the starts of consecutive windows.
+        features {Sequence[str]} -- Features among FEATURES and hist.
+        bin_edges {Optional[List[np.ndarray]]} -- Bin edges of every column.
+    Returns:
+        np.ndarray -- float32 array of shape (n_windows, n_features, n_cols).
+    """
+    valid = ~np.isnan(matrix)
+    values = np.where(valid, matrix, 0)
+    counts = window_sums(valid, window, stride)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sums = window_sums(values, window, stride)
+        mean = sums / counts
+        energy = (
+            window_sums(np.square(values, dtype=np.float64), window, stride) / counts
+        )
+    windows = sliding_windows(matrix, window, stride)
+    results = []
+    for feature in features:
+        if feature == "mean":
+            results.append(mean)
+        elif feature == "std":
+            results.append(np.sqrt(np.clip(energy - mean**2, 0, None)))
+        elif feature == "min":
+            results.append(np.fmin.reduce(windows, axis=1))
+        elif feature == "max":
+            results.append(np.fmax.reduce(windows, axis=1))
+        elif feature == "energy":
+            results.append(energy)
+        elif feature == "zero_crossings":
+            crossings = np.signbit(values[1:]) != np.signbit(values[:-1])
+            crossings &= valid[1:] & valid[:-1] & (values[1:] != 0) & (values[:-1] != 0)
+            results.append(window_sums(crossings, window - 1, stride))
+        elif feature == "valid":
+            results.append(counts / window)
+        elif feature == "hist":
+            if bin_edges is None:
+                raise ValueError("The hist feature needs bin_edges")
+            bins = np.full(matrix.shape, -1, dtype=np.intp)
+            for col, edges in enumerate(bin_edges):
+                column_bins = np.searchsorted(edges, matrix[:, col], side="right") - 1
+                column_bins = np.minimum(column_bins, len(edges) - 2)
+                bins[:, col] = np.where(valid[:, col], column_bins, -1)
+            n_bins = max(len(edges) for edges in bin_edges) - 1
+            for b in range(n_bins):
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    results.append(window_sums(bins == b, window, stride) / counts)
+        else:
+            raise ValueError(f"Unknown feature {feature}")
+    if not results:
+        return np.empty((len(counts), 0, matrix.shape[1]), dtype=np.float32)
+    return np.stack(results, axis=1).astype(np.float32)
+
+
+def majority(codes: np.ndarray, window: int, stride: int) -> np.ndarray:
+    """
+    Most frequent code of every window, -1 (no label) included.
+    Ties go to the smallest code.
+    """
+    values = np.unique(codes)
+    best = np.full(max(0, (len(codes) - window) // stride + 1), -1, dtype=codes.dtype)
+    best_counts = np.full(len(best), -1.0)
+    for value in values:
+        value_counts = window_sums(codes == value, window, stride)
+        better = value_counts > best_counts
+        best[better] = value
+        best_counts[better] = value_counts[better]
+    return best
+
+
+def window_blocks(
+    start: int, stop: int, window: int, stride: int, block_size: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """
+    Splits the windows of a row range in blocks of consecutive windows,
+    each reading about block_size rows, so a long range never has to be
+    in memory at once. The windows of the blocks are those of the range.
+    Arguments:
+        start {int} -- First row of the range.
+        stop {int} -- Row where the range stops.
+        window {int} -- Samples per window.
+        stride {int} -- Samples between the starts of consecutive windows.
+        block_size {Optional[int]} -- Rows per block, None for a single block.
+    Returns:
+        List[Tuple[int, int]] -- The rows [start, stop) of every block.
+    """
+    n_windows = (stop - start - window) // stride + 1
+    if n_windows <= 0:
+        return []
+    per_block = n_windows if block_size is None else max(1, block_size // stride)
+    return [
+        (
+            start + first * stride,
+            start + (min(first + per_block, n_windows) - 1) * stride + window,
+        )
+        for first in range(0, n_windows, per_block)
+    ]
+
+
+def window_features(
+    db_view: OppSelect,
+    window: int,
+    stride: int,
+    features: Sequence[str] = FEATURES,
+    label_classes: Sequence[str] = ("Locomotion",),
+    num_of_bins: int = 10,
+) -> pd.DataFrame:
+    """
+    Windowed features of every signal column of the current selection of
+    an OppSelect. Windows do not span two runs or two separate row ranges
+    of the selection. The rows are read block by block, of about the
+    chunk_size of the OppSelect, so out of core the memory used does not
+    grow with the selection.
+    Arguments:
+        db_view {OppSelect} -- The selection.
+        window {int} -- Samples per window.
+        stride {int} -- Samples between the starts of consecutive windows.
+        features {Sequence[str]} -- See window_statistics. The bins of hist
+        split the range of every column over the selection in num_of_bins.
+        label_classes {Sequence[str]} -- Label classes to attach, as the
+        majority label of every window.
+        num_of_bins {int} -- Bins of the hist feature.
+    Returns:
+        pd.DataFrame -- One row per window, with the PID, RunID, Time of the
+        first sample and labels of the window, then a float32 column
+        named position_signal_feature per signal and feature, position
+        being the column position of the signal, as signal names repeat.
+    """
+    column_names = db_view.column_names
+    non_signals = set(["Time"] + list(db_view.labels["Class"].unique()) + RUN_COLUMNS)
+    signals = [
+        position
+        for position in db_view.column_positions
+        if column_names[position] not in non_signals
+    ]
+    n_signals = len(signals)
+    ranges = intersect_ranges(
+        db_view.ranges, db_view.runs[["start", "stop"]].to_numpy()
+    )
+    ranges = ranges[ranges[:, 1] - ranges[:, 0] >= window]
+    blocks = [
+        block
+        for start, stop in ranges
+        for block in window_blocks(start, stop, window, stride, db_view.chunk_size)
+    ]
+
+    bin_edges = None
+    if "hist" in features and blocks:
+        firsts = np.full(n_signals, np.nan)
+        lasts = np.full(n_signals, np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            for start, stop in blocks:
+                matrix = db_view.rows(start, stop, signals).to_numpy()
+                firsts = np.fmin(firsts, np.nanmin(matrix, axis=0))
+                lasts = np.fmax(lasts, np.nanmax(matrix, axis=0))
+        firsts, lasts = np.nan_to_num(firsts), np.nan_to_num(lasts)
+        bin_edges = [
+            np.linspace(first, max(last, first + 1), num_of_bins + 1)
+            for first, last in zip(firsts, lasts)
+        ]
+
+    other_columns = list(
+        column_positions(column_names, ["Time", "PID", "RunID"] + list(label_classes))
+    )
+    values, heads, labels = [], [], {label_class: [] for label_class in label_classes}
+    for start, stop in blocks:
+        frame = db_view.rows(start, stop, signals + other_columns)
+        values.append(
+            window_statistics(
+                frame.iloc[:, :n_signals].to_numpy(),
+                window,
+                stride,
+                features,
+                bin_edges,
+            )
+        )
+        heads.append(frame.iloc[: stop - start - window + 1 : stride, n_signals:])
+        for label_class in label_classes:
+            block_labels = frame[label_class].astype("category")
+            labels[label_class].append(
+                pd.Categorical.from_codes(
+                    majority(block_labels.cat.codes.to_numpy(), window, stride),
+                    block_labels.cat.categories,
+                )
+            )
+
+    if not heads:
+        frame = db_view.rows(0, 0, other_columns)
+        heads.append(frame)
+        for label_class in label_classes:
+            labels[label_class].append(frame[label_class].astype("category").values)
+
+    feature_names = []
+    for feature in features:
+        if feature == "hist":
+            feature_names.extend(f"hist{b}" for b in range(num_of_bins))
+        else:
+            feature_names.append(feature)
+    n_values = len(feature_names) * n_signals
+    values = (
+        np.concatenate(values).reshape(-1, n_values)
+        if values and n_values
+        else np.zeros((sum(len(head) for head in heads), n_values), dtype=np.float32)
+    )
+    columns = [
+        f"{signal}_{column_names[signal]}_{feature}"
+        for feature in feature_names
+        for signal in signals
+    ]
+    result = pd.DataFrame(values, columns=columns)
+
+    for position, label_class in enumerate(label_classes):
+        result.insert(position, label_class, union_categoricals(labels[label_class]))
+    for column in ["Time", "RunID", "PID"]:
+        result.insert(
+            0,
+            column,
+            np.concatenate([head[column].to_numpy() for head in heads]),
+        )
+    return result
@@ -0,0 +1,339 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import Instrumentation
+from OpportunityModel import ColumnStore
+from Signal import FuzzySet
+
+
+class HistogramStore:
+    """
+        Compact store of FuzzySet histograms.
+        All the histograms and bin edges are kept in two contiguous arrays,
+        saved as memory-mapped .npy files, and an index table keyed by
+        PID, RunID, label class, label and signal tells where each one is.
+        A signal is identified by its column position in the OppDF, and
+        described by its Name, Sensor, Location and Signal attributes.
+        Selecting a slice of the index only reads the histograms it points to.
+    """
+
+    INDEX_NAME = "index"
+    HISTS_NAME = "hists.npy"
+    EDGES_NAME = "edges.npy"
+    KEY_COLUMNS = ["PID", "RunID", "Class", "Label", "Column"]
+
+    def __init__(self, path: str):
+        """
+        Opens an existing store.
+        Arguments:
+            path {str} -- Path to the folder of the store.
+        """
+        self.path = Path(path)
+        self.index = ColumnStore(self.path / self.INDEX_NAME).to_frame()
+        self.hists = np.load(self.path / self.HISTS_NAME, mmap_mode="r")
+        self.edges = np.load(self.path / self.EDGES_NAME, mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def select(self, filter_dict: Optional[dict] = None) -> pd.DataFrame:
+        """
+        Returns the rows of the index matching filter_dict.
+        E.g. : self.select({'PID': '2', 'Location': 'BACK', 'Sensor': 'Accelerometer'})
+        Arguments:
+            filter_dict {dict} -- Column of the index to the value or list of values to keep.
+            Besides the keys, the Name, Sensor, Location and Signal attributes can be used.
+        Returns:
+            pd.DataFrame -- The selected rows of the index.
+        """
+        selected = self.index
+        for key, values in (filter_dict or {}).items():
+            if type(values) is str:
+                values = [values]
+            selected = selected[selected[key].isin(values)]
+        return selected
+
+    def fuzzy_set(self, row) -> FuzzySet:
+        """
+        FuzzySet viewing the histogram of a row of the index.
+        """
+        return FuzzySet.from_histogram(
+            self.hists[row.offset : row.offset + row.n_bins],
+            self.edges[row.edge_offset : row.edge_offset + row.n_bins + 1],
+        )
+
+    def fuzzy_sets(self, filter_dict: Optional[dict] = None) -> Dict[tuple, FuzzySet]:
+        """
+        FuzzySets of the rows matching filter_dict, see select.
+        Returns:
+            Dict[tuple, FuzzySet] -- (PID, RunID, Class, Label, Column) to FuzzySet.
+        """
+        return {
+            tuple(getattr(row, key) for key in self.KEY_COLUMNS): self.fuzzy_set(row)
+            for row in self.select(filter_dict).itertuples(index=False)
+        }
+
+    def signal_info(self, filter_dict: Optional[dict] = None) -> dict:
+        """
+        FuzzySets of the rows matching filter_dict, nested as
+        signal_info[pid][run_id][label][signal_name]['fs'].
+        """
+        signal_info = {}
+        for row in self.select(filter_dict).itertuples(index=False):
+            signal_info.setdefault(row.PID, {}).setdefault(row.RunID, {}).setdefault(
+                row.Label, {}
+            )[row.Name] = {"fs": self.fuzzy_set(row)}
+        return signal_info
+
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        keys: List[tuple],
+        hists: List[np.ndarray],
+        bin_edges: List[np.ndarray],
+        metadata: pd.DataFrame,
+    ) -> "HistogramStore":
+        """
+        Writes histograms as a store in path, replacing any previous store there.
+        Arguments:
+            path {str} -- Path to the folder of the store.
+            keys {List[tuple]} -- (PID, RunID, Class, Label, Column) of every histogram.
+            hists {List[np.ndarray]} -- The histograms.
+            bin_edges {List[np.ndarray]} -- The bin edges of every histogram.
+            metadata {pd.DataFrame} -- OppDF metadata, indexed by column position,
+            giving the Name, Sensor, Location and Signal of every column.
+        Returns:
+            HistogramStore -- The written store.
+        """
+        n_bins = np.array([len(hist) for hist in hists], dtype=np.int64)
+        return cls.write_arrays(
+            path,
+            keys,
+            n_bins,
+            np.concatenate([np.empty(0)] + hists),
+            np.concatenate([np.empty(0)] + bin_edges),
+            metadata,
+        )
+
+    @classmethod
+    @Instrumentation.instrumented("HistogramStore.write")
+    def write_arrays(
+        cls,
+        path: str,
+        keys: List[tuple],
+        n_bins: np.ndarray,
+        hists: np.ndarray,
+        edges: np.ndarray,
+        metadata: pd.DataFrame,
+    ) -> "HistogramStore":
+        """
+        Writes histograms already laid out contiguously as a store in path,
+        see write. hists and edges may be memory-mapped, they are copied
+        to the store without being read in memory at once.
+        Arguments:
+            n_bins {np.ndarray} -- Number of bins of every histogram.
+            hists {np.ndarray} -- The histograms, one after the other.
+            edges {np.ndarray} -- The bin edges, n_bins + 1 per histogram.
+        """
+        path = Path(path)
+        if path.exists():
+            shutil.rmtree(path)
+        path.mkdir(parents=True)
+
+        index = pd.DataFrame(keys, columns=cls.KEY_COLUMNS)
+        for key in ["PID", "RunID", "Class", "Label"]:
+            index[key] = index[key].astype(str)
+        index["Column"] = index["Column"].astype(np.int64)
+        attributes = metadata.loc[index["Column"]]
+        index["Name"] = (attributes["Location"] + "_" + attributes["Signal"]).to_numpy()
+        for attribute in ["Sensor", "Location", "Signal"]:
+            index[attribute] = attributes[attribute].to_numpy()
+        n_bins = np.asarray(n_bins, dtype=np.int64)
+        index["n_bins"] = n_bins
+        index["offset"] = np.cumsum(n_bins) - n_bins
+        index["edge_offset"] = index["offset"] + np.arange(len(n_bins))
+
+        ColumnStore.write(index, path / cls.INDEX_NAME)
+        np.save(path / cls.HISTS_NAME, hists)
+        np.save(path / cls.EDGES_NAME, edges)
+        return cls(path)
+
+
+class HistogramWriter:
+    """
+        Writes the histograms of a HistogramStore segment by segment as they
+        are computed, so they are never all held in memory, and checkpoints
+        every segment written, so an interrupted run resumes where it stopped.
+        The histograms and bin edges are appended to raw float64 files of a
+        .partial folder next to the store, then a line giving their keys and
+        where they end is appended to its checkpoint. On resume, whatever
+        was written after the last complete line is dropped. finish copies
+        them into the store and removes the folder.
+        E.g. : writer = HistogramWriter(output_path, run={'binning': 'fd'})
+               for segment, columns, hists, bin_edges in results:
+                   if not writer.done(segment):
+                       writer.write(segment, columns, hists, bin_edges)
+               store = writer.finish(db.metadata)
+    """
+
+    CHECKPOINT_NAME = "checkpoint.jsonl"
+    HISTS_NAME = "hists.bin"
+    EDGES_NAME = "edges.bin"
+
+    def __init__(self, path: str, run: Optional[dict] = None, resume: bool = True):
+        """
+        Arguments:
+            path {str} -- Path to the folder of the store.
+            run {Optional[dict]} -- JSON description of the run, e.g. the
+            sources of the dataset and the binning. A checkpoint of another
+            run is discarded.
+            resume {bool} -- Whether to keep the segments of a previous run.
+        """
+        self.path = Path(path)
+        self.partial = self.path.with_name(self.path.name + ".partial")
+        self.run = json.loads(json.dumps(run or {}, sort_keys=True))
+        self.segments = []
+        ends = (0, 0)
+        if resume:
+            self.segments, ends = self._load_checkpoint()
+        if not self.segments:
+            if self.partial.exists():
+                shutil.rmtree(self.partial)
+            self.partial.mkdir(parents=True)
+            with open(self.partial / self.CHECKPOINT_NAME, "w") as checkpoint:
+                checkpoint.write(json.dumps(self.run, sort_keys=True) + "\n")
+        self._done = {tuple(segment["segment"]) for segment in self.segments}
+        self.hists_file = open(self.partial / self.HISTS_NAME, "ab")
+        self.edges_file = open(self.partial / self.EDGES_NAME, "ab")
+        self.checkpoint_file = open(self.partial / self.CHECKPOINT_NAME, "a")
+        # Drop the data written after the last checkpoint
+        self.hists_file.truncate(ends[0] * 8)
+        self.edges_file.truncate(ends[1] * 8)
+
+    def _load_checkpoint(self) -> Tuple[List[dict], Tuple[int, int]]:
+        """
+        Segments of the checkpoint of the same run, and where their
+        histograms and bin edges end.
+        """
+        try:
+            with open(self.partial / self.CHECKPOINT_NAME, "rb") as checkpoint:
+                lines = checkpoint.read().split(b"\n")
+        except FileNotFoundError:
+            return [], (0, 0)
+        try:
+            if json.loads(lines[0]) != self.run:
+                return [], (0, 0)
+        except ValueError:
+            return [], (0, 0)
+        segments, size = [], len(lines[0]) + 1
+        # The last line is incomplete when a run stopped while writing it
+        for line in lines[1:-1]:
+            try:
+                segments.append(json.loads(line))
+            except ValueError:
+                break
+            size += len(line) + 1
+        with open(self.partial / self.CHECKPOINT_NAME, "r+b") as checkpoint:
+            checkpoint.truncate(size)
+        if not segments:
+            return [], (0, 0)
+        return segments, (segments[-1]["hists_end"], segments[-1]["edges_end"])
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def done(self, segment: tuple) -> bool:
+        """
+        Whether the histograms of segment, e.g. (PID, RunID, Class, Label),
+        were written by this run or a previous one.
+        """
+        return tuple(json.loads(json.dumps(list(segment)))) in self._done
+
+    def write(
+        self,
+        segment: tuple,
+        columns: List[int],
+        hists: List[np.ndarray],
+        bin_edges: List[np.ndarray],
+    ):
+        """
+        Appends the histograms of a segment and checkpoints them.
+        Arguments:
+            segment {tuple} -- (PID, RunID, Class, Label) of the segment.
+            columns {List[int]} -- Column position of every histogram.
+            hists {List[np.ndarray]} -- The histograms.
+            bin_edges {List[np.ndarray]} -- The bin edges of every histogram.
+        """
+        hists_end, edges_end = 0, 0
+        if self.segments:
+            hists_end = self.segments[-1]["hists_end"]
+            edges_end = self.segments[-1]["edges_end"]
+        n_bins = [len(hist) for hist in hists]
+        hists = np.concatenate([np.empty(0)] + list(hists))
+        bin_edges = np.concatenate([np.empty(0)] + list(bin_edges))
+        with Instrumentation.span("write_segment", histograms=len(n_bins)):
+            for data, data_file in [
+                (hists, self.hists_file),
+                (bin_edges, self.edges_file),
+            ]:
+                data.astype(np.float64).tofile(data_file)
+                data_file.flush()
+                os.fsync(data_file.fileno())
+            entry = {
+                "segment": list(segment),
+                "columns": [int(column) for column in columns],
+                "n_bins": n_bins,
+                "hists_end": hists_end + len(hists),
+                "edges_end": edges_end + len(bin_edges),
+            }
+            # The data are on disk before the line that points to them
+            self.checkpoint_file.write(json.dumps(entry) + "\n")
+            self.checkpoint_file.flush()
+            os.fsync(self.checkpoint_file.fileno())
+        self.segments.append(entry)
+        self._done.add(tuple(entry["segment"]))
+
+    def close(self):
+        """
+        Closes the files, keeping the checkpoint to resume from.
+        """
+        for data_file in (self.hists_file, self.edges_file, self.checkpoint_file):
+            data_file.close()
+
+    def __enter__(self) -> "HistogramWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def finish(self, metadata: pd.DataFrame) -> HistogramStore:
+        """
+        Writes the segments written as a HistogramStore in path, then
+        removes the .partial folder.
+        Arguments:
+            metadata {pd.DataFrame} -- OppDF metadata, see HistogramStore.write.
+        Returns:
+            HistogramStore -- The written store.
+        """
+        self.close()
+        keys = [
+            tuple(segment["segment"]) + (column,)
+            for segment in self.segments
+            for column in segment["columns"]
+        ]
+        n_bins = [n for segment in self.segments for n in segment["n_bins"]]
+        arrays = []
+        for name in (self.HISTS_NAME, self.EDGES_NAME):
+            if (self.partial / name).stat().st_size:
+                arrays.append(np.memmap(self.partial / name, np.float64, mode="r"))
+            else:
+                arrays.append(np.empty(0))
+        store = HistogramStore.write_arrays(self.path, keys, n_bins, *arrays, metadata)
+        del arrays
+        shutil.rmtree(self.partial)
+        return store
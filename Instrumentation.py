@@ -0,0 +1,359 @@
+import atexit
+import cProfile
+import json
+import logging
+import multiprocessing
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+# Comma separated sinks enabling the instrumentation at import, e.g.
+# OPP_INSTRUMENT="log,json=summary.json,cprofile=run.prof,tracemalloc"
+ENV_VAR = "OPP_INSTRUMENT"
+
+logger = logging.getLogger("opportunity")
+
+
+class NullSpan:
+    """
+        Span returned while the instrumentation is disabled, it records nothing.
+        It is falsy, so the fields costly to compute can be guarded by it.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+    def __bool__(self) -> bool:
+        return False
+
+    def add(self, **fields):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    """
+        Times a block and records it with its fields, summed over its calls,
+        such as the rows scanned or the bytes read. While tracemalloc traces,
+        the bytes the block leaves allocated are recorded too.
+    """
+
+    __slots__ = ("recorder", "name", "fields", "start", "memory")
+
+    def __init__(self, recorder: "Recorder", name: str, fields: dict):
+        self.recorder = recorder
+        self.name = name
+        self.fields = fields
+        self.memory = None
+
+    def __enter__(self) -> "Span":
+        if tracemalloc.is_tracing():
+            self.memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        seconds = time.perf_counter() - self.start
+        if self.memory is not None and tracemalloc.is_tracing():
+            current = tracemalloc.get_traced_memory()[0]
+            self.fields["bytes_allocated"] = max(current - self.memory, 0)
+        self.recorder.record(self.name, seconds, self.fields, exc_info[0] is not None)
+        return False
+
+    def __bool__(self) -> bool:
+        return True
+
+    def add(self, **fields):
+        for key, value in fields.items():
+            self.fields[key] = self.fields.get(key, 0) + value
+
+
+class LogSink:
+    """
+        Logs every span as one JSON line.
+    """
+
+    def __init__(self, level: int = logging.INFO):
+        self.level = level
+
+    def start(self):
+        # Without any logging configuration, log to stderr
+        if not logger.handlers and not logging.getLogger().handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+        if not logger.isEnabledFor(self.level):
+            logger.setLevel(self.level)
+
+    def span(self, name: str, seconds: float, fields: dict):
+        if logger.isEnabledFor(self.level):
+            logger.log(
+                self.level, json.dumps({"span": name, "seconds": seconds, **fields})
+            )
+
+    def close(self, summary: dict):
+        pass
+
+
+class JsonSink:
+    """
+        Writes the summary of the spans and counters to a JSON file on close.
+    """
+
+    def __init__(self, path: str = "instrumentation.json"):
+        self.path = path
+
+    def start(self):
+        pass
+
+    def span(self, name: str, seconds: float, fields: dict):
+        pass
+
+    def close(self, summary: dict):
+        with open(self.path, "w") as f:
+            json.dump(summary, f, indent=2, default=float)
+
+
+class ProfileSink:
+    """
+        Profiles the process with cProfile between start and close, and dumps
+        the statistics to path, for pstats or snakeviz.
+    """
+
+    def __init__(self, path: str = "profile.prof"):
+        self.path = path
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def span(self, name: str, seconds: float, fields: dict):
+        pass
+
+    def close(self, summary: dict):
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+
+
+class TracemallocSink:
+    """
+        Traces the allocations with tracemalloc between start and close, so the
+        spans record the bytes they allocate. On close the peak is added to the
+        summary and, given a path, a snapshot is dumped there.
+    """
+
+    def __init__(self, path: Optional[str] = None, frames: int = 1):
+        self.path = path
+        self.frames = frames
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def span(self, name: str, seconds: float, fields: dict):
+        pass
+
+    def close(self, summary: dict):
+        if not tracemalloc.is_tracing():
+            return
+        summary["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+        if self.path is not None:
+            tracemalloc.take_snapshot().dump(self.path)
+        tracemalloc.stop()
+
+
+SINKS = {
+    "log": LogSink,
+    "json": JsonSink,
+    "cprofile": ProfileSink,
+    "tracemalloc": TracemallocSink,
+}
+
+
+class Recorder:
+    """
+        Sums the spans by name and the counters, and passes the spans to the sinks.
+    """
+
+    def __init__(self, sinks: List):
+        self.sinks = sinks
+        self.spans: Dict[str, dict] = {}
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.start = time.perf_counter()
+
+    def record(self, name: str, seconds: float, fields: dict, failed: bool = False):
+        stats = self.spans.get(name)
+        if stats is None:
+            stats = self.spans[name] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0}
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        if failed:
+            stats["errors"] = stats.get("errors", 0) + 1
+        for key, value in fields.items():
+            stats[key] = stats.get(key, 0) + value
+        for sink in self.sinks:
+            sink.span(name, seconds, fields)
+
+    def summary(self) -> dict:
+        spans = {}
+        for name, stats in self.spans.items():
+            stats = dict(stats)
+            if stats["seconds"] > 0 and "rows" in stats:
+                stats["rows_per_s"] = stats["rows"] / stats["seconds"]
+            spans[name] = stats
+        return {
+            "pid": os.getpid(),
+            "wall_seconds": time.perf_counter() - self.start,
+            "spans": spans,
+            "counters": dict(self.counters),
+        }
+
+
+# None while disabled, so every hook costs a single comparison
+_recorder: Optional[Recorder] = None
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def span(name: str, **fields) -> Span:
+    """
+    Context manager timing a block as the span name, see Span.
+    Arguments:
+        name {str} -- Name of the span, the calls of a name are summed.
+        fields -- Numbers summed with the span, such as rows or bytes.
+    Returns:
+        Span -- The span, NULL_SPAN while the instrumentation is disabled.
+    """
+    if _recorder is None:
+        return NULL_SPAN
+    return Span(_recorder, name, fields)
+
+
+def count(name: str, value: int = 1):
+    """
+    Adds value to the counter name, does nothing while disabled.
+    """
+    if _recorder is not None:
+        _recorder.counters[name] += value
+
+
+def record(name: str, seconds: float, **fields):
+    """
+    Records a span timed by the caller, e.g. before the instrumentation
+    could be used. Does nothing while disabled.
+    """
+    if _recorder is not None:
+        _recorder.record(name, seconds, fields)
+
+
+def instrumented(name: Optional[str] = None) -> Callable:
+    """
+    Decorator recording every call of a function as a span, named after
+    the function by default.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        span_name = name or function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with Span(_recorder, span_name, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def summary() -> Optional[dict]:
+    """
+    The spans and counters recorded so far, None while disabled.
+    """
+    if _recorder is None:
+        return None
+    return _recorder.summary()
+
+
+def enable(sinks: Optional[List] = None):
+    """
+    Enables the instrumentation, replacing any previous recorder.
+    Arguments:
+        sinks {Optional[List]} -- Sinks of the spans, a LogSink by default.
+    """
+    global _recorder
+    disable()
+    sinks = [LogSink()] if sinks is None else list(sinks)
+    for sink in sinks:
+        sink.start()
+    _recorder = Recorder(sinks)
+
+
+def disable() -> Optional[dict]:
+    """
+    Disables the instrumentation and closes the sinks.
+    Returns:
+        Optional[dict] -- The final summary, None if it was disabled.
+    """
+    global _recorder
+    if _recorder is None:
+        return None
+    recorder, _recorder = _recorder, None
+    result = recorder.summary()
+    for sink in recorder.sinks:
+        sink.close(result)
+    return result
+
+
+def parse_sinks(value: str) -> List:
+    """
+    Sinks from a comma separated list of names, each optionally followed
+    by =path, e.g. "log,json=summary.json". Without a path, json writes
+    instrumentation.json and cprofile profile.prof in the working directory.
+    """
+    sinks = []
+    for item in filter(None, (item.strip() for item in value.split(","))):
+        name, _, path = item.partition("=")
+        if name not in SINKS:
+            raise ValueError(
+                f"Unknown instrumentation sink {name!r}, expected one of {list(SINKS)}"
+            )
+        sinks.append(SINKS[name](path) if path else SINKS[name]())
+    return sinks
+
+
+def configure_from_env():
+    """
+    Enables the instrumentation with the sinks of the OPP_INSTRUMENT
+    environment variable, if set, until the process exits. Worker processes
+    inherit the variable but are left disabled, their spans are timed by
+    the spans of the parent.
+    """
+    value = os.environ.get(ENV_VAR)
+    if not value or multiprocessing.parent_process() is not None:
+        return
+    try:
+        sinks = parse_sinks(value)
+    except ValueError as error:
+        # A typo in the variable must not break every import
+        logger.error("Instrumentation left disabled, invalid %s: %s", ENV_VAR, error)
+        return
+    enable(sinks)
+    atexit.register(disable)
+
+
+configure_from_env()
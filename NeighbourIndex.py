@@ -0,0 +1,209 @@
+import heapq
+import numpy as np
+import pandas as pd
+from typing import Optional
+from HistogramStore import HistogramStore
+import Similarity
+
+
+class NeighbourIndex:
+    """
+        Nearest-neighbour index over the FuzzySets of a HistogramStore.
+        Every histogram is rebinned on common bin edges and embedded as the
+        square root of its bin probabilities, where the euclidean distance
+        is sqrt(2) times the Hellinger distance. A vantage-point tree over
+        the embeddings answers exact top-k queries, optionally restricted
+        to the rows of the store matching a metadata filter.
+    """
+
+    INDEX_NAME = "neighbours.npz"
+
+    def __init__(
+        self,
+        store: HistogramStore,
+        num_of_bins: Optional[int] = None,
+        leaf_size: int = 64,
+        seed: int = 0,
+    ):
+        """
+        Builds the index of all the histograms of a store.
+        Arguments:
+            store {HistogramStore} -- The store to index.
+            num_of_bins {Optional[int]} -- Number of common bins, see Similarity.common_edges.
+            leaf_size {int} -- Rows scanned at once at the leaves of the tree.
+            seed {int} -- Seed of the choice of vantage points.
+        """
+        if leaf_size < 1:
+            raise ValueError(f"leaf_size must be at least 1, got {leaf_size}")
+        self.store = store
+        fuzzy_sets = [store.fuzzy_set(row) for row in store.index.itertuples()]
+        self.bin_edges = Similarity.common_edges(fuzzy_sets, num_of_bins)
+        self.embeddings = self.embed(fuzzy_sets)
+        self._build(leaf_size, np.random.default_rng(seed))
+
+    def embed(self, fuzzy_sets: list) -> np.ndarray:
+        """
+        Embeddings of FuzzySets on the bin edges of the index.
+        """
+        masses = Similarity.rebin(fuzzy_sets, self.bin_edges)
+        return np.sqrt(np.clip(np.nan_to_num(masses), 0, None)).astype(np.float32)
+
+    def _build(self, leaf_size: int, rng: np.random.Generator):
+        """
+        Builds the vantage-point tree. Node i either is a leaf, covering
+        order[start[i]:stop[i]], or splits its rows by their distance to the
+        vantage point in inside (< radius) and outside (>= radius) children.
+        """
+        self.order = np.arange(len(self.embeddings))
+        vantage, radius, inside, outside, start, stop = [], [], [], [], [], []
+        pending = [(len(vantage), 0, len(self.order))]
+        for values in (vantage, radius, inside, outside, start, stop):
+            values.append(-1)
+        while pending:
+            node, first, last = pending.pop()
+            start[node], stop[node] = first, last
+            if last - first <= leaf_size:
+                continue
+            rows = self.order[first:last]
+            pick = rng.integers(last - first)
+            rows[[0, pick]] = rows[[pick, 0]]
+            distances = np.linalg.norm(
+                self.embeddings[rows[1:]] - self.embeddings[rows[0]], axis=1
+            )
+            sorting = np.argsort(distances, kind="stable")
+            rows[1:] = rows[1:][sorting]
+            middle = (last - first) // 2
+            vantage[node] = rows[0]
+            radius[node] = distances[sorting][middle - 1]
+            for side, (child_first, child_last) in (
+                (inside, (first + 1, first + middle)),
+                (outside, (first + middle, last)),
+            ):
+                child = len(vantage)
+                for values in (vantage, radius, inside, outside, start, stop):
+                    values.append(-1)
+                side[node] = child
+                pending.append((child, child_first, child_last))
+        self.vantage = np.array(vantage)
+        self.radius = np.array(radius, dtype=np.float64)
+        self.inside = np.array(inside)
+        self.outside = np.array(outside)
+        self.start = np.array(start)
+        self.stop = np.array(stop)
+
+    def _search(self, query: np.ndarray, k: int, mask: np.ndarray) -> list:
+        """
+        Returns the (distance, row) pairs of the k nearest allowed rows.
+        """
+        heap = []
+
+        def consider(rows, distances):
+            for row, distance in zip(rows, distances):
+                if len(heap) < k:
+                    heapq.heappush(heap, (-distance, row))
+                elif distance < -heap[0][0]:
+                    heapq.heapreplace(heap, (-distance, row))
+
+        def tau():
+            return -heap[0][0] if len(heap) == k else np.inf
+
+        def visit(node):
+            if self.vantage[node] < 0:
+                rows = self.order[self.start[node] : self.stop[node]]
+                rows = rows[mask[rows]]
+                if len(rows):
+                    distances = np.linalg.norm(self.embeddings[rows] - query, axis=1)
+                    consider(rows, distances)
+                return
+            vantage = self.vantage[node]
+            distance = float(np.linalg.norm(self.embeddings[vantage] - query))
+            if mask[vantage]:
+                consider([vantage], [distance])
+            if distance < self.radius[node]:
+                visit(self.inside[node])
+                if distance + tau() >= self.radius[node]:
+                    visit(self.outside[node])
+            else:
+                visit(self.outside[node])
+                if distance - tau() <= self.radius[node]:
+                    visit(self.inside[node])
+
+        visit(0)
+        return sorted((-distance, row) for distance, row in heap)
+
+    def query(
+        self,
+        fuzzy_set,
+        k: int = 10,
+        filter_dict: Optional[dict] = None,
+        exclude: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Finds the k FuzzySets of the store most similar to fuzzy_set.
+        E.g. : self.query(fs, 5, {'Sensor': 'InertialMeasurementUnit'})
+        Arguments:
+            fuzzy_set {FuzzySet} -- The FuzzySet to look up.
+            k {int} -- Number of neighbours.
+            filter_dict {Optional[dict]} -- Only consider the rows matching it,
+            see HistogramStore.select.
+            exclude {Optional[int]} -- Position of a row of the store to skip.
+        Returns:
+            pd.DataFrame -- Rows of the store index of the neighbours, nearest
+            first, with their Hellinger distance in a distance column.
+        """
+        mask = np.ones(len(self.embeddings), dtype=bool)
+        if filter_dict:
+            selected = self.store.select(filter_dict)
+            mask[:] = False
+            mask[self.store.index.index.get_indexer(selected.index)] = True
+        if exclude is not None:
+            mask[exclude] = False
+        query = self.embed([fuzzy_set])[0]
+        found = self._search(query, k, mask)
+        rows = [row for _, row in found]
+        result = self.store.index.iloc[rows].copy()
+        result["distance"] = [distance / np.sqrt(2) for distance, _ in found]
+        return result
+
+    def query_row(
+        self, position: int, k: int = 10, filter_dict: Optional[dict] = None
+    ) -> pd.DataFrame:
+        """
+        Finds the k FuzzySets most similar to the one at a position of the
+        store index, other than itself, see query.
+        """
+        row = self.store.index.iloc[position]
+        return self.query(self.store.fuzzy_set(row), k, filter_dict, exclude=position)
+
+    def save(self, path: Optional[str] = None):
+        """
+        Saves the index, by default next to the histograms of its store.
+        """
+        if path is None:
+            path = self.store.path / self.INDEX_NAME
+        np.savez(
+            path,
+            bin_edges=self.bin_edges,
+            embeddings=self.embeddings,
+            order=self.order,
+            vantage=self.vantage,
+            radius=self.radius,
+            inside=self.inside,
+            outside=self.outside,
+            start=self.start,
+            stop=self.stop,
+        )
+
+    @classmethod
+    def load(cls, store: HistogramStore, path: Optional[str] = None) -> "NeighbourIndex":
+        """
+        Loads an index saved for store, see save.
+        """
+        if path is None:
+            path = store.path / cls.INDEX_NAME
+        index = cls.__new__(cls)
+        index.store = store
+        with np.load(path) as arrays:
+            for name in arrays.files:
+                setattr(index, name, arrays[name])
+        return index
@@ -1,43 +1,602 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import json
 import os
 import re
+import shutil
+import Instrumentation
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 from pathlib import Path
 
+LABEL_COLUMNS = {
+    243: "Locomotion",
+    244: "HL_Activity",
+    245: "LL_Left_Arm",
+    246: "LL_Left_Arm_Object",
+    247: "LL_Right_Arm",
+    248: "LL_Right_Arm_Object",
+    249: "ML_Both_Arms",
+}
 
-def dat_reader(full_filepath: str) -> pd.DataFrame:
+
+def dat_schema(column_file: str) -> Dict[int, type]:
+    """
+    Builds the dtypes of the dat file columns from the column_names file.
+    The time column is read as int64, the sensor columns as float32
+    and the label columns as int32.
+    Arguments:
+        column_file {str} -- Path to the column_names txt file.
+    Returns:
+        Dict[int, type] -- Column position to dtype, as expected by read_csv.
+    """
+    column_pattern = r"^Column: (\d+) (\S+)"
+    schema = {}
+    with open(column_file, "r") as f:
+        for line in f:
+            ptrn_match = re.match(string=line.strip(), pattern=column_pattern)
+            if ptrn_match:
+                position = int(ptrn_match.group(1)) - 1
+                if position == 0:
+                    schema[position] = np.int64
+                elif position in LABEL_COLUMNS:
+                    schema[position] = np.int32
+                else:
+                    schema[position] = np.float32
+    return schema
+
+
+def dat_reader(full_filepath: str, dtype: Optional[dict] = None) -> pd.DataFrame:
     basename = os.path.basename(full_filepath)
     filename_pattern = "^S(\d)-(ADL\d|Drill).*"
     file_re = re.match(pattern=filename_pattern, string=basename)
-    df = pd.read_csv(full_filepath, sep=" ", header=None)
+    df = pd.read_csv(full_filepath, sep=" ", header=None, dtype=dtype)
     # Hack to search labels easier
-    df.rename(
-        {
-            243: "Locomotion",
-            244: "HL_Activity",
-            245: "LL_Left_Arm",
-            246: "LL_Left_Arm_Object",
-            247: "LL_Right_Arm",
-            248: "LL_Right_Arm_Object",
-            249: "ML_Both_Arms",
-        },
-        axis="columns",
-        inplace=True,
-    )
+    df.rename(LABEL_COLUMNS, axis="columns", inplace=True)
     df["file"] = basename
     df["PID"] = file_re.group(1)
     df["RunID"] = file_re.group(2)
     return df
 
 
+def concat_frames(df_list: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenates frames sharing the same columns into a single frame.
+    Every column is copied once into a preallocated array and the input
+    frames are released as soon as they have been consumed, so the peak
+    memory stays close to the size of the result.
+    Arguments:
+        df_list {List[pd.DataFrame]} -- Frames to concatenate. The list is emptied.
+    Returns:
+        pd.DataFrame -- Frame equal to pd.concat(df_list, sort=False).
+    """
+    if not df_list:
+        raise ValueError("No frames to concatenate")
+    columns = df_list[0].columns
+    dtypes = {column: {df[column].dtype for df in df_list} for column in columns}
+    if any(len(column_dtypes) > 1 for column_dtypes in dtypes.values()):
+        # Without a schema pandas may guess different dtypes per file
+        return pd.concat(df_list, sort=False)
+    total = sum(len(df) for df in df_list)
+    data = {column: np.empty(total, dtype=dtypes[column].pop()) for column in columns}
+    index = np.empty(total, dtype=np.int64)
+    start = 0
+    while df_list:
+        df = df_list.pop(0)
+        stop = start + len(df)
+        index[start:stop] = df.index
+        for column in columns:
+            data[column][start:stop] = df[column].to_numpy()
+        start = stop
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+def parse_dat_files(
+    data_files: List[Path], n_jobs: Optional[int] = 1, dtype: Optional[dict] = None
+) -> List[pd.DataFrame]:
+    """
+    Parses the given dat files, optionally spread over a process pool.
+    Arguments:
+        data_files {List[Path]} -- Paths of the dat files.
+        n_jobs {Optional[int]} -- Number of worker processes, None for all cores.
+        dtype {Optional[dict]} -- Column dtypes passed to read_csv, see dat_schema.
+    Returns:
+        List[pd.DataFrame] -- One DataFrame per file, in the given order.
+    """
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    with Instrumentation.span("parse_dat_files", files=len(data_files)) as span:
+        if n_jobs > 1 and len(data_files) > 1:
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(data_files))) as pool:
+                frames = list(
+                    tqdm(
+                        pool.map(dat_reader, data_files, [dtype] * len(data_files)),
+                        total=len(data_files),
+                    )
+                )
+        else:
+            frames = [dat_reader(file, dtype) for file in tqdm(data_files)]
+        if span:
+            span.add(
+                rows=sum(len(frame) for frame in frames),
+                bytes_read=sum(os.path.getsize(file) for file in data_files),
+            )
+    return frames
+
+
+def read_dat_files(
+    data_files: List[Path], n_jobs: Optional[int] = 1, dtype: Optional[dict] = None
+) -> pd.DataFrame:
+    """
+    Parses the given dat files, optionally spread over a process pool,
+    and concatenates them in the given order.
+    Arguments:
+        data_files {List[Path]} -- Paths of the dat files.
+        n_jobs {Optional[int]} -- Number of worker processes, None for all cores.
+        dtype {Optional[dict]} -- Column dtypes passed to read_csv, see dat_schema.
+    Returns:
+        pd.DataFrame -- DataFrame containing the rows of all files.
+    """
+    return concat_frames(parse_dat_files(data_files, n_jobs=n_jobs, dtype=dtype))
+
+
+def decode_labels(values: np.ndarray, label_group: pd.DataFrame) -> pd.Categorical:
+    """
+    Decodes the label codes of one label class into a Categorical through
+    a sorted lookup of the known codes. Code 0 (no label) becomes NaN and
+    codes missing from the legend are kept as categories named by the code.
+    Arguments:
+        values {np.ndarray} -- Integer label codes of a label column.
+        label_group {pd.DataFrame} -- Rows of the labels DataFrame of that class.
+    Returns:
+        pd.Categorical -- The decoded labels.
+    """
+    values = np.asarray(values)
+    categories = list(pd.unique(label_group["Label"]))
+    lookup = pd.Series(
+        [categories.index(label) for label in label_group["Label"]],
+        index=label_group["Code"].astype(np.int64),
+    ).sort_index()
+    known_codes = lookup.index.to_numpy()
+    position = np.searchsorted(known_codes, values).clip(max=len(known_codes) - 1)
+    found = known_codes[position] == values
+    codes = np.where(found, lookup.to_numpy()[position], -1)
+    unknown = ~found & (values != 0)
+    if unknown.any():
+        extra_codes, inverse = np.unique(values[unknown], return_inverse=True)
+        codes[unknown] = len(categories) + inverse
+        categories = categories + [str(code) for code in extra_codes]
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def fill_gaps(
+    matrix: np.ndarray,
+    method: str = "linear",
+    max_gap: Optional[int] = None,
+    valid: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Fills the NaN gaps of every column of a 2-D matrix at once.
+    The samples are taken as evenly spaced, as in the Opportunity recordings.
+    Arguments:
+        matrix {np.ndarray} -- Rows are samples, columns are signals.
+        method {str} -- linear to interpolate between the samples around a gap,
+        ffill to repeat the last sample before it, mask to return a masked array.
+        max_gap {Optional[int]} -- Longer gaps are left as NaN, None for no limit.
+        valid {Optional[np.ndarray]} -- Validity mask of the matrix, e.g. from
+        a GapIndex, to avoid scanning it for NaNs.
+    Returns:
+        np.ndarray -- Filled copy of the matrix. Gaps at the start of a column,
+        and for linear at its end, are left as NaN.
+    """
+    matrix = np.asarray(matrix)
+    if matrix.ndim == 1:
+        return fill_gaps(
+            matrix[:, np.newaxis],
+            method,
+            max_gap,
+            None if valid is None else np.asarray(valid)[:, np.newaxis],
+        )[:, 0]
+    valid = ~np.isnan(matrix) if valid is None else np.asarray(valid, dtype=bool)
+    if method == "mask":
+        return np.ma.masked_array(matrix, mask=~valid)
+    if method not in ("linear", "ffill"):
+        raise ValueError(f"Unknown fill method {method}")
+    result = matrix.astype(np.result_type(matrix, np.float32))
+    if valid.all() or len(matrix) == 0:
+        return result
+
+    n_rows = len(matrix)
+    rows = np.arange(n_rows)[:, np.newaxis]
+    cols = np.arange(matrix.shape[1])
+    previous = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    following = np.minimum.accumulate(np.where(valid, rows, n_rows)[::-1], axis=0)
+    following = following[::-1]
+    fill = ~valid & (previous >= 0)
+    if method == "linear":
+        fill &= following < n_rows
+    if max_gap is not None:
+        fill &= following - previous - 1 <= max_gap
+    previous_values = result[previous.clip(min=0), cols]
+    if method == "ffill":
+        result[fill] = previous_values[fill]
+        return result
+    following_values = result[following.clip(max=n_rows - 1), cols]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weights = (rows - previous) / (following - previous)
+    interpolated = previous_values + (following_values - previous_values) * weights
+    result[fill] = interpolated[fill]
+    return result
+
+
+def file_fingerprint(filepath: str, with_hash: bool = True) -> dict:
+    """
+    Fingerprints a file by its size, modification time and content hash.
+    Arguments:
+        filepath {str} -- Path to the file.
+        with_hash {bool} -- Whether to compute the sha256 of the content.
+    Returns:
+        dict -- Dictionary with the fields size, mtime and sha256.
+    """
+    stat = os.stat(filepath)
+    fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha256": None}
+    if with_hash:
+        sha = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        fingerprint["sha256"] = sha.hexdigest()
+    return fingerprint
+
+
+def same_file(filepath: str, fingerprint: Optional[dict]) -> bool:
+    """
+    Checks a file against a previous fingerprint. The content is only
+    hashed when the size matches but the modification time does not.
+    """
+    if not fingerprint:
+        return False
+    current = file_fingerprint(filepath, with_hash=False)
+    if current["size"] != fingerprint["size"]:
+        return False
+    if current["mtime"] == fingerprint["mtime"]:
+        return True
+    return file_fingerprint(filepath)["sha256"] == fingerprint["sha256"]
+
+
+class ColumnStore:
+    """
+        Columnar, memory-mapped storage of a DataFrame.
+        Every column is saved as its own .npy file next to a json manifest.
+        Columns are memory-mapped lazily on first access, so processes reading
+        the same store share the page-cached data instead of private copies.
+        String columns are stored as integer codes plus their categories.
+    """
+
+    MANIFEST_NAME = "manifest.json"
+    INDEX_NAME = "index.npy"
+
+    def __init__(self, path: str):
+        """
+        Opens an existing store.
+        Arguments:
+            path {str} -- Path to the folder containing the manifest and the columns.
+        """
+        self.path = Path(path)
+        with open(self.path / self.MANIFEST_NAME, "r") as f:
+            self.manifest = json.load(f)
+        self.columns = [spec["name"] for spec in self.manifest["columns"]]
+        self._specs = {spec["name"]: spec for spec in self.manifest["columns"]}
+        self._arrays = {}
+
+    def __len__(self) -> int:
+        return self.manifest["n_rows"]
+
+    def __contains__(self, name) -> bool:
+        return name in self._specs
+
+    def __getitem__(self, name) -> np.ndarray:
+        """
+        Returns the stored, read-only values of a column.
+        String columns are returned as their integer codes.
+        """
+        if name not in self._arrays:
+            spec = self._specs[name]
+            self._arrays[name] = np.load(self.path / spec["file"], mmap_mode="r")
+        return self._arrays[name]
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return (Path(path) / ColumnStore.MANIFEST_NAME).is_file()
+
+    def close(self):
+        """
+        Drops the memory maps opened so far.
+        """
+        self._arrays = {}
+
+    def categories(self, name) -> Optional[List[str]]:
+        return self._specs[name]["categories"]
+
+    def index(self) -> np.ndarray:
+        return np.load(self.path / self.INDEX_NAME, mmap_mode="r")
+
+    def values(self, name) -> Union[np.ndarray, pd.Categorical]:
+        """
+        Returns the values of a column, string columns as a Categorical
+        built on top of the stored codes.
+        """
+        categories = self.categories(name)
+        if categories is None:
+            return self[name]
+        return pd.Categorical.from_codes(self[name], categories=categories)
+
+    def to_frame(
+        self, columns: Optional[list] = None, start: int = 0, stop: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Materialises the given columns, or all of them, as a DataFrame.
+        Arguments:
+            columns {Optional[list]} -- Names of the columns, None for all.
+            start {int} -- First row to include.
+            stop {Optional[int]} -- Row where to stop, None for the end of the store.
+        Returns:
+            pd.DataFrame -- The requested rows and columns.
+        """
+        if columns is None:
+            columns = self.columns
+        rows = slice(start, stop)
+        data = {name: self.values(name)[rows] for name in columns}
+        return pd.DataFrame(data, index=self.index()[rows], columns=columns)
+
+    @property
+    def sources(self) -> dict:
+        """
+        Fingerprints of the files the store was built from, see pickle_creation.
+        """
+        return self.manifest.get("sources", {})
+
+    @classmethod
+    def write(
+        cls, df: pd.DataFrame, path: str, sources: Optional[dict] = None
+    ) -> "ColumnStore":
+        """
+        Writes df as a store in path, replacing any previous store there.
+        The columns are written in a sibling folder first, so a failure
+        leaves the previous store untouched.
+        Arguments:
+            df {pd.DataFrame} -- The DataFrame to store.
+            path {str} -- Path to the folder of the store.
+            sources {Optional[dict]} -- Fingerprints of the source files.
+        Returns:
+            ColumnStore -- The written store.
+        """
+        return cls.splice([df], path, sources)
+
+    @classmethod
+    def splice(
+        cls, pieces: list, path: str, sources: Optional[dict] = None
+    ) -> "ColumnStore":
+        """
+        Writes the rows of the pieces, one after the other, as a store in path.
+        A piece is either a DataFrame or a (store, start, stop) tuple of rows
+        of an existing store, so unchanged rows are copied column by column
+        without parsing or materialising them. The store in path itself may
+        be one of the pieces.
+        Arguments:
+            pieces {list} -- DataFrames or (store, start, stop) tuples with the same columns.
+            path {str} -- Path to the folder of the store.
+            sources {Optional[dict]} -- Fingerprints of the source files.
+        Returns:
+            ColumnStore -- The written store.
+        """
+
+        def piece_values(piece, name) -> np.ndarray:
+            if isinstance(piece, pd.DataFrame):
+                return piece[name].to_numpy()
+            store, start, stop = piece
+            return np.asarray(store.values(name)[start:stop])
+
+        def piece_index(piece) -> np.ndarray:
+            if isinstance(piece, pd.DataFrame):
+                return piece.index.to_numpy(dtype=np.int64)
+            store, start, stop = piece
+            return store.index()[start:stop]
+
+        first = pieces[0]
+        columns = first.columns if isinstance(first, pd.DataFrame) else first[0].columns
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir(parents=True)
+        specs = []
+        n_rows = 0
+        for position, name in enumerate(columns):
+            values = [piece_values(piece, name) for piece in pieces]
+            values = np.concatenate(values) if len(values) > 1 else values[0]
+            n_rows = len(values)
+            spec = {"name": name, "file": f"{position:04d}.npy", "categories": None}
+            if values.dtype == object:
+                categorical = pd.Categorical(values)
+                spec["categories"] = [str(x) for x in categorical.categories]
+                array = categorical.codes.astype(np.int32)
+            else:
+                array = values
+            spec["dtype"] = array.dtype.str
+            np.save(tmp_path / spec["file"], array)
+            specs.append(spec)
+            del values, array
+        np.save(
+            tmp_path / cls.INDEX_NAME,
+            np.concatenate([piece_index(piece) for piece in pieces]),
+        )
+        # Release the maps of the stores read, one of them may be replaced
+        for piece in pieces:
+            if not isinstance(piece, pd.DataFrame):
+                piece[0].close()
+        manifest = {"n_rows": n_rows, "columns": specs, "sources": sources or {}}
+        with open(tmp_path / cls.MANIFEST_NAME, "w") as f:
+            json.dump(manifest, f)
+
+        if path.exists():
+            old_path = path.with_name(path.name + ".old")
+            # Left by a run interrupted while replacing the store
+            if old_path.exists():
+                shutil.rmtree(old_path)
+            path.rename(old_path)
+            tmp_path.rename(path)
+            shutil.rmtree(old_path)
+        else:
+            tmp_path.rename(path)
+        return cls(path)
+
+
+class GapIndex:
+    """
+        Validity bitmap and NaN gaps of the signal columns of the dataset.
+        The bitmap keeps one bit per sample, packed per column, and the gaps
+        are the [start, stop) row ranges of the NaN runs of every column,
+        so the masks of any row range can be read back without scanning
+        the data for NaNs again.
+    """
+
+    def __init__(
+        self,
+        columns: np.ndarray,
+        n_rows: int,
+        bitmap: np.ndarray,
+        offsets: np.ndarray,
+        gaps: np.ndarray,
+    ):
+        """
+        Arguments:
+            columns {np.ndarray} -- Positions of the indexed columns.
+            n_rows {int} -- Rows of the dataset.
+            bitmap {np.ndarray} -- Packed validity bits, one row per column.
+            offsets {np.ndarray} -- First gap of every column, plus the total.
+            gaps {np.ndarray} -- The gaps of all the columns, one after the other.
+        """
+        self.columns = np.asarray(columns)
+        self.n_rows = int(n_rows)
+        self.bitmap = bitmap
+        self.offsets = offsets
+        self._gaps = gaps
+        self._rows = {column: row for row, column in enumerate(self.columns)}
+
+    @classmethod
+    def build(cls, model: "OppDF", columns: List[int]) -> "GapIndex":
+        """
+        Scans the given columns of a populated OppDF once, one at a time.
+        Arguments:
+            model {OppDF} -- The dataset.
+            columns {List[int]} -- Positions of the columns to index.
+        Returns:
+            GapIndex -- The index of the columns.
+        """
+        n_rows = model.n_rows
+        bitmap = np.empty((len(columns), (n_rows + 7) // 8), dtype=np.uint8)
+        gaps, offsets = [], [0]
+        for row, column in enumerate(columns):
+            invalid = np.isnan(model.column(column))
+            bitmap[row] = np.packbits(~invalid)
+            edges = np.flatnonzero(np.diff(invalid.view(np.int8), prepend=0, append=0))
+            gaps.append(edges.reshape(-1, 2))
+            offsets.append(offsets[-1] + len(edges) // 2)
+        return cls(
+            columns,
+            n_rows,
+            bitmap,
+            np.array(offsets, dtype=np.int64),
+            np.concatenate(gaps + [np.empty((0, 2), dtype=np.int64)]).astype(np.int64),
+        )
+
+    def gaps(self, column: int) -> np.ndarray:
+        """
+        The [start, stop) row ranges of the NaN runs of a column, by position.
+        """
+        row = self._rows[column]
+        return self._gaps[self.offsets[row] : self.offsets[row + 1]]
+
+    def gap_lengths(self, column: int) -> np.ndarray:
+        gaps = self.gaps(column)
+        return gaps[:, 1] - gaps[:, 0]
+
+    def has_gaps(self, columns: List[int], start: int = 0, stop: Optional[int] = None):
+        """
+        Whether each of the columns has a NaN in the rows [start, stop).
+        """
+        stop = self.n_rows if stop is None else stop
+        result = np.zeros(len(columns), dtype=bool)
+        for i, column in enumerate(columns):
+            gaps = self.gaps(column)
+            first = np.searchsorted(gaps[:, 1], start, side="right")
+            result[i] = first < len(gaps) and gaps[first, 0] < stop
+        return result
+
+    def valid(
+        self, columns: List[int], start: int = 0, stop: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Validity mask of the rows [start, stop) of the columns.
+        Returns:
+            np.ndarray -- Boolean matrix, rows are samples, True where not NaN.
+        """
+        stop = self.n_rows if stop is None else stop
+        if not self.has_gaps(columns, start, stop).any():
+            return np.ones((stop - start, len(columns)), dtype=bool)
+        rows = [self._rows[column] for column in columns]
+        first_byte = start // 8
+        bits = np.unpackbits(
+            self.bitmap[rows, first_byte : (stop + 7) // 8], axis=1
+        ).astype(bool)
+        return bits[:, start - first_byte * 8 : stop - first_byte * 8].T
+
+    def save(self, path: str, sources: Optional[dict] = None):
+        """
+        Saves the index in a npz file, with the sources of the data it was built
+        from, see ColumnStore.sources.
+        """
+        np.savez(
+            path,
+            columns=self.columns,
+            n_rows=self.n_rows,
+            bitmap=self.bitmap,
+            offsets=self.offsets,
+            gaps=self._gaps,
+            sources=json.dumps(sources or {}, sort_keys=True),
+        )
+
+    @classmethod
+    def load(cls, path: str, sources: Optional[dict] = None) -> Optional["GapIndex"]:
+        """
+        Loads an index saved by save. Returns None when there is none or when
+        it was built from other sources.
+        """
+        if not Path(path).is_file():
+            return None
+        with np.load(path) as saved:
+            if str(saved["sources"]) != json.dumps(sources or {}, sort_keys=True):
+                return None
+            return cls(
+                saved["columns"],
+                saved["n_rows"],
+                saved["bitmap"],
+                saved["offsets"],
+                saved["gaps"],
+            )
+
+
 class OppDF:
     """
         Class that handles the access and the filtering of the Opportunity dataset.
     """
 
     DATA_PICKLE_NAME = "data.pkl"
+    DATA_STORE_NAME = "data"
+    GAPS_NAME = "gaps.npz"
     METADATA_PICKLE_NAME = "metadata.pkl"
     LABELS_PICKLE_NAME = "labels.pkl"
 
@@ -45,48 +604,235 @@ class OppDF:
         """
             Class Constructor. Ensures that the DataFrame variables are initialized.
         """
-        self.df = None
+        self._df = None
+        self.store = None
+        self.gaps = None
         self.metadata = None
         self.labels = None
+        self._column_names = {}
+        self._raw_names = {}
 
-    def pickle_creation(self, data_folder: str, pickle_path: str):
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        The Opportunity DataFrame. When populated from a column store,
+        it is only materialised on first access.
+        """
+        if self._df is None and self.store is not None:
+            with Instrumentation.span("materialise", rows=len(self.store)) as span:
+                self._df = self._prepare(self.store.to_frame())
+                if span:
+                    span.add(bytes=int(self._df.memory_usage(index=False).sum()))
+        return self._df
+
+    @df.setter
+    def df(self, value: pd.DataFrame):
+        self._df = value
+
+    @property
+    def in_memory(self) -> bool:
+        return self.store is None or self._df is not None
+
+    @property
+    def columns(self) -> pd.Index:
+        """
+        The column names of the DataFrame, without materialising it.
+        """
+        if self.in_memory:
+            return self.df.columns
+        return pd.Index(
+            [self._column_names.get(name, name) for name in self.store.columns]
+        )
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.df) if self.in_memory else len(self.store)
+
+    def chunk_bounds(self, chunk_size: Optional[int] = None) -> np.ndarray:
+        """
+        Splits the rows of the dataset in chunks.
+        Arguments:
+            chunk_size {Optional[int]} -- Rows per chunk, None for one chunk
+            per source dat file.
+        Returns:
+            np.ndarray -- The [start, stop) row range of every chunk, in order.
+        """
+        n_rows = self.n_rows
+        if chunk_size is not None:
+            starts = np.arange(0, n_rows, chunk_size, dtype=np.int64)
+            return np.stack([starts, np.minimum(starts + chunk_size, n_rows)], axis=1)
+        files = self.store.sources.get("files") if self.store is not None else None
+        if files:
+            bounds = np.array(
+                [[file["start"], file["stop"]] for file in files.values()],
+                dtype=np.int64,
+            )
+        else:
+            file_values = self.column("file")
+            starts = np.flatnonzero(file_values[1:] != file_values[:-1]) + 1
+            starts = np.concatenate([[0], starts]).astype(np.int64)
+            bounds = np.stack([starts, np.append(starts[1:], n_rows)], axis=1)
+        return bounds[bounds[:, 1] > bounds[:, 0]].reshape(-1, 2)
+
+    def read_rows(
+        self, start: int, stop: int, columns: Optional[List[int]] = None
+    ) -> pd.DataFrame:
+        """
+        Reads a range of rows, reading only those rows from the column store
+        when the DataFrame is not materialised.
+        Arguments:
+            start {int} -- First row to read.
+            stop {int} -- Row where to stop.
+            columns {Optional[List[int]]} -- Positions of the columns, None for all.
+        Returns:
+            pd.DataFrame -- The rows, prepared as in the DataFrame.
+        """
+        if self.in_memory:
+            if columns is None:
+                return self.df.iloc[start:stop]
+            return self.df.iloc[start:stop, columns]
+        names = self.store.columns
+        if columns is not None:
+            names = [names[position] for position in columns]
+        Instrumentation.count("rows_read", int(stop - start))
+        return self._prepare(self.store.to_frame(names, start, stop))
+
+    def chunks(
+        self, chunk_size: Optional[int] = None, columns: Optional[List[int]] = None
+    ) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """
+        Iterates over the dataset chunk by chunk, see chunk_bounds, so that
+        only one chunk is in memory at a time when the DataFrame is not
+        materialised.
+        Arguments:
+            chunk_size {Optional[int]} -- Rows per chunk, None for one chunk per file.
+            columns {Optional[List[int]]} -- Positions of the columns, None for all.
+        Returns:
+            Iterator[Tuple[int, pd.DataFrame]] -- The first row and the rows of every chunk.
+        """
+        for start, stop in self.chunk_bounds(chunk_size):
+            yield start, self.read_rows(start, stop, columns)
+
+    @Instrumentation.instrumented("pickle_creation")
+    def pickle_creation(
+        self,
+        data_folder: str,
+        pickle_path: str,
+        n_jobs: Optional[int] = 1,
+        incremental: bool = True,
+    ):
         """
         Method that creates the pickles needed from Opportunity data
+        and populates the object from them.
+        When incremental, every source file is fingerprinted and only the dat
+        files that were added or changed since the previous build are parsed,
+        the rows of the unchanged ones are copied from the existing store.
+        A change in the column_names or label_legend files rebuilds everything.
         Arguments:
             data_folder {str} -- The string of the path to the folder containing the Opportunity dat files.
             pickle_path {str} -- The string of the path to the folder that will contain the produced pickles.
+            n_jobs {Optional[int]} -- Number of processes parsing the dat files, None for all cores.
+            incremental {bool} -- Whether to reuse the rows of an existing store.
         """
-        label_file = Path(data_folder) / "label_legend.txt"
-        column_file = Path(data_folder) / "column_names.txt"
+        label_file = (Path(data_folder) / "label_legend.txt").resolve()
+        column_file = (Path(data_folder) / "column_names.txt").resolve()
+        data_files = self.dat_files(data_folder)
+        data_root = Path(data_folder).resolve()
 
-        self.df = self.df_handler(data_folder)
-        self.labels = self.label_handler(label_file.resolve())
-        self.metadata = self.metadata_handler(column_file.resolve())
-
-        data_pickle_path = Path(pickle_path) / self.DATA_PICKLE_NAME
+        data_store_path = Path(pickle_path) / self.DATA_STORE_NAME
         labels_pickle_path = Path(pickle_path) / self.LABELS_PICKLE_NAME
         metadata_pickle_path = Path(pickle_path) / self.METADATA_PICKLE_NAME
 
+        previous_store = None
+        previous = {}
+        if incremental and ColumnStore.exists(data_store_path):
+            previous_store = ColumnStore(data_store_path)
+            previous = previous_store.sources
+            if not (
+                same_file(label_file, previous.get("label_legend"))
+                and same_file(column_file, previous.get("column_names"))
+            ):
+                previous = {}
+        previous_files = previous.get("files", {})
+
+        sources = {
+            "label_legend": file_fingerprint(label_file),
+            "column_names": file_fingerprint(column_file),
+            "files": {},
+        }
+        pieces = {}
+        changed = []
+        for file in data_files:
+            name = file.relative_to(data_root).as_posix()
+            fingerprint = previous_files.get(name)
+            if same_file(file, fingerprint):
+                pieces[name] = (
+                    previous_store,
+                    fingerprint["start"],
+                    fingerprint["stop"],
+                )
+                sources["files"][name] = dict(fingerprint)
+            else:
+                changed.append(file)
+                sources["files"][name] = file_fingerprint(file)
+
+        Instrumentation.count("dat_files_reused", len(data_files) - len(changed))
+        if changed or set(previous_files) != set(sources["files"]):
+            parsed = parse_dat_files(
+                changed, n_jobs=n_jobs, dtype=dat_schema(column_file)
+            )
+            for file, df in zip(changed, parsed):
+                pieces[file.relative_to(data_root).as_posix()] = df
+            start = 0
+            for name, fingerprint in sources["files"].items():
+                piece = pieces[name]
+                if isinstance(piece, pd.DataFrame):
+                    length = len(piece)
+                else:
+                    length = piece[2] - piece[1]
+                fingerprint["start"] = start
+                fingerprint["stop"] = start + length
+                start += length
+            with Instrumentation.span("write_store", rows=start):
+                ColumnStore.splice(
+                    [pieces[name] for name in sources["files"]],
+                    data_store_path,
+                    sources,
+                )
+
+        self.labels = self.label_handler(label_file)
+        self.metadata = self.metadata_handler(column_file)
         self.labels.to_pickle(labels_pickle_path)
-        self.df.to_pickle(data_pickle_path)
         self.metadata.to_pickle(metadata_pickle_path)
+        self.populate(pickle_path)
+        if self.gaps is None:
+            with Instrumentation.span("gap_index", rows=self.n_rows):
+                self.gaps = self.gap_handler()
+            self.gaps.save(Path(pickle_path) / self.GAPS_NAME, self.store.sources)
+
+    def dat_files(self, data_folder: str) -> List[Path]:
+        """
+        Lists the Opportunity dat files of a folder, in the order they are stored.
+        Arguments:
+            data_folder {str} -- Path to the folder containing the dat files
+        Returns:
+            List[Path] -- Sorted, resolved paths of the dat files.
+        """
+        return sorted(file.resolve() for file in Path(data_folder).glob("**/*.dat"))
 
-    def df_handler(self, data_folder: str) -> pd.DataFrame:
+    def df_handler(
+        self, data_folder: str, n_jobs: Optional[int] = 1, dtype: Optional[dict] = None
+    ) -> pd.DataFrame:
         """
         Method that creates a dataframe from the Opportunity dat files.
         Arguments:
             data_folder {str} -- Path to the folder containing the dat files
+            n_jobs {Optional[int]} -- Number of processes parsing the dat files, None for all cores.
+            dtype {Optional[dict]} -- Column dtypes of the dat files, see dat_schema.
         Returns:
             pd.DataFrame -- DataFrame containing the Opportunity dataset.
         """
-        data_files = Path(data_folder).glob("**/*.dat")
-        df_list = []
-        for file in tqdm(data_files):
-            temp_df = dat_reader(file.resolve())
-            df_list.append(temp_df)
-
-        full_df = pd.concat(df_list, sort=False)
-        return full_df
+        return read_dat_files(self.dat_files(data_folder), n_jobs=n_jobs, dtype=dtype)
 
     def label_handler(self, label_file: str) -> pd.DataFrame:
         """
@@ -145,34 +891,111 @@ class OppDF:
                     metadata = metadata.append(temp_df, ignore_index=True)
         return metadata
 
+    def gap_handler(self) -> GapIndex:
+        """
+        Builds the GapIndex of the signal columns, every column but Time.
+        Returns:
+            GapIndex -- The validity bitmap and NaN gaps of the signals.
+        """
+        return GapIndex.build(self, list(range(1, len(self.metadata))))
+
+    @Instrumentation.instrumented("populate")
     def populate(self, pickle_path: str):
         """
-        Method that populates/updates the DataFrame using existing .
+        Method that populates/updates the DataFrame using existing pickles.
+        The data are memory-mapped from the column store when there is one,
+        otherwise they are read from the legacy data pickle.
         Arguments:
             data_path {str} -- The string of the path to the folder containing the pickles.
         """
+        data_store_path = Path(pickle_path) / self.DATA_STORE_NAME
         data_pickle_path = Path(pickle_path) / self.DATA_PICKLE_NAME
         metadata_pickle_path = Path(pickle_path) / self.METADATA_PICKLE_NAME
         labels_pickle_path = Path(pickle_path) / self.LABELS_PICKLE_NAME
 
-        self.df = pd.read_pickle(data_pickle_path)
         self.metadata = pd.read_pickle(metadata_pickle_path)
         self.labels = pd.read_pickle(labels_pickle_path)
 
-        column_names = self.metadata.apply(
-            lambda x: x.Location + "_" + x.Signal, axis=1
-        )
+        column_names = self.metadata["Location"] + "_" + self.metadata["Signal"]
         column_names[0] = "Time"
-        res = {x: k for x, k in enumerate(column_names)}
-        self.df = self.df.rename(columns=res)
-        replace_dict = {}
-        for index, group in self.labels.groupby("Class"):
-            replace_dict[index] = {
-                int(ind): val for ind, val in zip(group["Code"], group["Label"])
-            }
-            replace_dict[index][0] = np.nan
-        for index, group in self.labels.groupby("Class"):
-            self.df[index] = self.df[index].replace(to_replace=replace_dict[index])
+        self._column_names = dict(enumerate(column_names))
+        self._raw_names = {v: k for k, v in self._column_names.items()}
+
+        if ColumnStore.exists(data_store_path):
+            self.store = ColumnStore(data_store_path)
+            self._df = None
+        else:
+            self.store = None
+            self._df = self._prepare(pd.read_pickle(data_pickle_path))
+        self.gaps = GapIndex.load(
+            Path(pickle_path) / self.GAPS_NAME,
+            self.store.sources if self.store is not None else None,
+        )
+
+    def signal_matrix(
+        self,
+        columns: List[int],
+        start: int = 0,
+        stop: Optional[int] = None,
+        fill: Optional[str] = None,
+        max_gap: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Reads a range of rows of signal columns as a 2-D matrix, optionally
+        filling their NaN gaps with the masks of the GapIndex, see fill_gaps.
+        Arguments:
+            columns {List[int]} -- Positions of the columns.
+            start {int} -- First row to read.
+            stop {Optional[int]} -- Row where to stop, None for the end.
+            fill {Optional[str]} -- Fill method, None to keep the NaNs.
+            max_gap {Optional[int]} -- Longest gap to fill, None for no limit.
+        Returns:
+            np.ndarray -- Rows are samples, columns are the signals.
+        """
+        stop = self.n_rows if stop is None else stop
+        matrix = np.column_stack(
+            [self.column(column)[start:stop] for column in columns]
+        )
+        if fill is None:
+            return matrix
+        valid = None
+        if self.gaps is not None:
+            valid = self.gaps.valid(columns, start, stop)
+        return fill_gaps(matrix, fill, max_gap, valid)
+
+    def column(self, name: Union[str, int]) -> np.ndarray:
+        """
+        Returns the raw values of a single column without materialising
+        the whole DataFrame. Label columns are returned as their codes
+        when read from the column store.
+        Arguments:
+            name {Union[str, int]} -- Name of the column, as in the populated DataFrame,
+            or position of a Time or signal column, which is unambiguous
+            as some Location_Signal names repeat.
+        Returns:
+            np.ndarray -- The values of the column, read-only when memory-mapped.
+        """
+        if self.store is None:
+            if isinstance(name, int):
+                return self.df.iloc[:, name].to_numpy()
+            return self.df[name].to_numpy()
+        return self.store[self._raw_names.get(name, name)]
+
+    def _prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Renames the signal columns of a DataFrame read from the pickles and
+        turns the label and run columns it contains into Categoricals.
+        """
+        df = df.rename(columns=self._column_names, copy=False)
+        for label_class, group in self.labels.groupby("Class"):
+            if label_class in df.columns:
+                df[label_class] = decode_labels(df[label_class].to_numpy(), group)
+        for column in ["file", "PID", "RunID"]:
+            if column not in df.columns:
+                continue
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype("category")
+        return df
 
     # def aggregate_signals(self):
 
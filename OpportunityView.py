@@ -1,17 +1,365 @@
 from OpportunityModel import OppDF
-from typing import List
+from Instrumentation import count, instrumented, logger, span
+from collections import deque
+from copy import deepcopy
+import logging
+from typing import Iterator, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+
+
+def value_codes(values: pd.Series) -> np.ndarray:
+    """
+    Integer codes of a column, -1 for missing values.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy()
+    return pd.factorize(values)[0]
+
+
+def run_lengths(*keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Run-length encodes rows on one or more key arrays of equal length.
+    Returns:
+        Tuple[np.ndarray, np.ndarray] -- Start and stop positions of the runs
+        of rows in which all the keys stay constant.
+    """
+    n_rows = len(keys[0])
+    change = np.zeros(n_rows, dtype=bool)
+    change[:1] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    starts = np.flatnonzero(change)
+    stops = np.append(starts[1:], n_rows)
+    return starts, stops
+
+
+def merge_ranges(ranges: np.ndarray) -> np.ndarray:
+    """
+    Sorts [start, stop) row ranges and merges the overlapping or adjacent ones.
+    """
+    ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+    ranges = ranges[ranges[:, 0] < ranges[:, 1]]
+    if len(ranges) == 0:
+        return ranges
+    ranges = ranges[np.argsort(ranges[:, 0], kind="stable")]
+    ends = np.maximum.accumulate(ranges[:, 1])
+    first = np.flatnonzero(np.r_[True, ranges[1:, 0] > ends[:-1]])
+    return np.column_stack(
+        [ranges[first, 0], np.maximum.reduceat(ranges[:, 1], first)]
+    )
+
+
+def intersect_ranges(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """
+    Intersects two sorted lists of disjoint [start, stop) row ranges.
+    """
+    positions = np.concatenate([left[:, 0], left[:, 1], right[:, 0], right[:, 1]])
+    deltas = np.concatenate(
+        [
+            np.ones(len(left), dtype=np.int64),
+            -np.ones(len(left), dtype=np.int64),
+            np.ones(len(right), dtype=np.int64),
+            -np.ones(len(right), dtype=np.int64),
+        ]
+    )
+    # Closing ranges go first, so touching ranges do not overlap
+    order = np.lexsort((deltas, positions))
+    positions = positions[order]
+    coverage = np.cumsum(deltas[order])
+    inside = np.flatnonzero(coverage[:-1] == 2)
+    ranges = np.column_stack([positions[inside], positions[inside + 1]])
+    return ranges[ranges[:, 0] < ranges[:, 1]]
+
+
+def join_ranges(
+    frame: pd.DataFrame, keys: List[str], boundaries: np.ndarray
+) -> pd.DataFrame:
+    """
+    Joins the consecutive rows of a frame of start, stop ranges that were
+    split at one of the boundaries and have the same keys.
+    """
+    starts = frame["start"].to_numpy()
+    previous_stops = np.append(-1, frame["stop"].to_numpy()[:-1])
+    same_keys = (frame[keys] == frame[keys].shift()).all(axis=1).to_numpy()
+    joined = same_keys & (starts == previous_stops) & np.isin(starts, boundaries)
+    if not joined.any():
+        return frame
+    groups = np.cumsum(~joined)
+    first = frame[~joined].reset_index(drop=True)
+    first["stop"] = frame.groupby(groups)["stop"].last().to_numpy()
+    return first
+
+
+def column_positions(columns: pd.Index, names: List[str]) -> List[int]:
+    """
+    Positions of uniquely named columns, such as Time and the label and
+    run columns, among columns where other names repeat.
+    """
+    return [columns.get_loc(name) for name in names]
+
+
+def ranges_to_positions(ranges: np.ndarray) -> np.ndarray:
+    """
+    Expands [start, stop) row ranges to the row positions they contain.
+    """
+    lengths = ranges[:, 1] - ranges[:, 0]
+    offsets = np.repeat(ranges[:, 0] - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
 
 
 class OppSelect:
-    def __init__(self, base_model: OppDF):
-        self.base_df = base_model.df
-        self.last_df = base_model.df
-        self.df = base_model.df
+    # Selections kept to undo, the oldest are dropped first
+    HISTORY_SIZE = 64
+
+    def __init__(
+        self,
+        base_model: OppDF,
+        out_of_core: bool = False,
+        chunk_size: Optional[int] = None,
+    ):
+        """
+        Arguments:
+            base_model {OppDF} -- The populated dataset.
+            out_of_core {bool} -- Whether to keep the dataset on disk and
+            read only the chunks needed, see OppDF.chunks. The selection is
+            then only materialised when df is accessed.
+            chunk_size {Optional[int]} -- Rows per chunk, None for one chunk per file.
+        """
+        self.model = base_model
+        self.out_of_core = out_of_core and not base_model.in_memory
+        self.chunk_size = chunk_size
         self.labels = base_model.labels
         self.metadata = base_model.metadata
+        self.column_names = base_model.columns
 
         self.columns = self.metadata.to_dict("index")
+        with span("OppSelect.segment_index", rows=self.model.n_rows):
+            if self.out_of_core:
+                self.runs, self.segments = self.chunked_segment_index()
+            else:
+                self.runs, self.segments = self.segment_index(self.base_df)
+        self.ranges = self.all_rows()
+        self.column_positions = np.arange(len(self.column_names))
+        self._df = None
+        # Undo stack of (ranges, column_positions, columns) states
+        self.history = deque(maxlen=self.HISTORY_SIZE)
+        self.queries = {}
+
+    @property
+    def base_df(self) -> pd.DataFrame:
+        return self.model.df
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        The current selection, materialised on first access.
+        """
+        if self._df is None:
+            self._df = self.take(self.ranges, self.column_positions)
+        return self._df
+
+    @df.setter
+    def df(self, value: pd.DataFrame):
+        self._df = value
+
+    def segment_index(
+        self, df: pd.DataFrame, offset: int = 0
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Builds the index of the contiguous row ranges of a DataFrame.
+        Arguments:
+            df {pd.DataFrame} -- The DataFrame to index.
+            offset {int} -- Row of the dataset where df starts.
+        Returns:
+            Tuple[pd.DataFrame, pd.DataFrame] -- The runs, with the columns
+            file, PID, RunID, start and stop, and the segments, with the columns
+            PID, RunID, Class, Label, start and stop. A segment is a maximal
+            range of rows of a run with the same label of a label class.
+            Rows without a label are not part of any segment.
+        """
+        file_codes = value_codes(df["file"])
+        starts, stops = run_lengths(file_codes)
+        runs = pd.DataFrame(
+            {
+                "file": df["file"].to_numpy()[starts],
+                "PID": df["PID"].to_numpy()[starts],
+                "RunID": df["RunID"].to_numpy()[starts],
+                "start": starts + offset,
+                "stop": stops + offset,
+            }
+        )
+        segments = []
+        for label_class in self.labels["Class"].unique():
+            label_codes = value_codes(df[label_class])
+            starts, stops = run_lengths(file_codes, label_codes)
+            labelled = label_codes[starts] >= 0
+            starts, stops = starts[labelled], stops[labelled]
+            segments.append(
+                pd.DataFrame(
+                    {
+                        "PID": df["PID"].to_numpy()[starts],
+                        "RunID": df["RunID"].to_numpy()[starts],
+                        "Class": label_class,
+                        "Label": np.asarray(df[label_class].to_numpy()[starts]),
+                        "start": starts + offset,
+                        "stop": stops + offset,
+                    }
+                )
+            )
+        return runs, pd.concat(segments, ignore_index=True)
+
+    def chunked_segment_index(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Builds the same index as segment_index chunk by chunk, reading only
+        the run and label columns of one chunk at a time.
+        """
+        label_classes = list(self.labels["Class"].unique())
+        key_columns = column_positions(
+            self.column_names, ["file", "PID", "RunID"] + label_classes
+        )
+        runs, segments, boundaries = [], [], []
+        for start, df in self.model.chunks(self.chunk_size, key_columns):
+            chunk_runs, chunk_segments = self.segment_index(df, start)
+            runs.append(chunk_runs)
+            segments.append(chunk_segments)
+            boundaries.append(start)
+        runs = join_ranges(pd.concat(runs, ignore_index=True), ["file"], boundaries)
+        class_order = {label_class: i for i, label_class in enumerate(label_classes)}
+        segments = pd.concat(segments, ignore_index=True)
+        segments = segments.iloc[
+            np.lexsort(
+                (segments["start"].to_numpy(), segments["Class"].map(class_order))
+            )
+        ].reset_index(drop=True)
+        # Segments cannot be joined across the boundary of two runs
+        boundaries = np.setdiff1d(boundaries, runs["start"].to_numpy())
+        segments = join_ranges(segments, ["PID", "RunID", "Class", "Label"], boundaries)
+        return runs, segments
+
+    def all_rows(self) -> np.ndarray:
+        return np.array([[0, self.model.n_rows]], dtype=np.int64)
+
+    def rows(
+        self, start: int, stop: int, column_positions: Optional[np.ndarray] = None
+    ) -> pd.DataFrame:
+        """
+        Reads a range of rows of the base DataFrame, of the given columns or
+        of the selected ones, from disk when out of core.
+        """
+        if column_positions is None:
+            column_positions = self.column_positions
+        if self.out_of_core:
+            return self.model.read_rows(start, stop, column_positions)
+        return self.base_df.iloc[start:stop, column_positions]
+
+    def chunks(self) -> Iterator[pd.DataFrame]:
+        """
+        Iterates over the current selection chunk by chunk, see OppDF.chunks,
+        so that only one chunk of it is in memory at a time.
+        """
+        for bounds in self.model.chunk_bounds(self.chunk_size):
+            ranges = intersect_ranges(self.ranges, bounds[np.newaxis])
+            if len(ranges):
+                yield self.take(ranges, self.column_positions)
+
+    def take(self, ranges: np.ndarray, column_positions: np.ndarray) -> pd.DataFrame:
+        """
+        Materialises row ranges and column positions of the base DataFrame
+        with a single slice or take. The base DataFrame itself is returned
+        when everything is selected.
+        """
+        with span("OppSelect.take") as take_span:
+            if take_span:
+                take_span.add(
+                    rows=int((ranges[:, 1] - ranges[:, 0]).sum()),
+                    columns=len(column_positions),
+                )
+            return self._take(ranges, column_positions)
+
+    def _take(self, ranges: np.ndarray, column_positions: np.ndarray) -> pd.DataFrame:
+        if self.out_of_core:
+            frames = [
+                self.rows(start, stop, column_positions) for start, stop in ranges
+            ]
+            if not frames:
+                return self.rows(0, 0, column_positions)
+            return pd.concat(frames) if len(frames) > 1 else frames[0]
+        all_columns = len(column_positions) == len(self.column_names)
+        if np.array_equal(ranges, self.all_rows()) and all_columns:
+            return self.base_df
+        if len(ranges) == 1:
+            start, stop = ranges[0]
+            return self.base_df.iloc[start:stop, column_positions]
+        return self.base_df.iloc[ranges_to_positions(ranges), column_positions]
+
+    def _set_state(
+        self, ranges: np.ndarray, column_positions: np.ndarray, columns: dict
+    ):
+        """
+        Pushes the current selection to the undo stack and replaces it,
+        unless it is the same selection.
+        """
+        if (
+            np.array_equal(ranges, self.ranges)
+            and np.array_equal(column_positions, self.column_positions)
+            and columns == self.columns
+        ):
+            # df may have been assigned, it is taken again
+            self._df = None
+            return
+        self.history.append((self.ranges, self.column_positions, self.columns))
+        count("OppSelect.selections")
+        self.ranges = ranges
+        self.column_positions = column_positions
+        self.columns = columns
+        self._df = None
 
+    def _select_ranges(self, ranges: np.ndarray):
+        """
+        Restricts the rows of the current selection to the given row ranges
+        of the base DataFrame.
+        """
+        self._set_state(
+            intersect_ranges(self.ranges, merge_ranges(ranges)),
+            self.column_positions,
+            self.columns,
+        )
+
+    def episodes(
+        self, label_class: str, labels: List[str] = None
+    ) -> Iterator[Tuple[str, str, str, pd.DataFrame]]:
+        """
+        Iterates over the contiguous segments of a label class within the
+        current selection, without filtering the whole DataFrame.
+        E.g. : for pid, run_id, label, df in self.episodes('Locomotion', 'Walk')
+        Arguments:
+            label_class {str} -- The label class, e.g. Locomotion.
+            labels {List[str]} -- Labels to keep, None for all of them.
+        Returns:
+            Iterator[Tuple[str, str, str, pd.DataFrame]] -- PID, RunID, label
+            and rows of every segment.
+        """
+        segments = self.segments[self.segments["Class"] == label_class]
+        if labels is not None:
+            if type(labels) is str:
+                labels = [labels]
+            segments = segments[segments["Label"].isin(labels)]
+        columns = self.column_positions
+        range_starts, range_stops = self.ranges[:, 0], self.ranges[:, 1]
+        for segment in segments.itertuples(index=False):
+            first = np.searchsorted(range_stops, segment.start, side="right")
+            last = np.searchsorted(range_starts, segment.stop, side="left")
+            for start, stop in self.ranges[first:last]:
+                start, stop = max(start, segment.start), min(stop, segment.stop)
+                yield (
+                    segment.PID,
+                    segment.RunID,
+                    segment.Label,
+                    self.rows(start, stop, columns),
+                )
+
+    @instrumented()
     def signal_indexing(self, filter_dict: dict):
         """
         Given a dataset and metadata on it, this function retains
@@ -22,19 +370,30 @@ class OppSelect:
         Return:
             pd.Dataframe -- Filtered df
         """
-        labels_columns = list(self.labels['Class'].unique())
-        metadata_columns = ["file", "PID", "RunID"]
-        time_column = ["Time"]
         result_columns = self.metadata2columns(filter_dict)
         selected_columns_index = list(result_columns.keys())
-        print(selected_columns_index)
-        selected_columns_names = list(self.df.columns[selected_columns_index])
-        print(selected_columns_names)
-        self.last_df = self.df
-        selected_columns = (time_column + selected_columns_names +
-                            labels_columns + metadata_columns)
-        self.df = self.df[selected_columns]
-        self.columns = result_columns
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "signal_indexing %s: %s",
+                selected_columns_index,
+                list(self.column_names[selected_columns_index]),
+            )
+        positions = self.signal_columns(result_columns)
+        positions = positions[np.isin(positions, self.column_positions)]
+        self._set_state(self.ranges, positions, result_columns)
+
+    def signal_columns(self, result_columns: dict) -> np.ndarray:
+        """
+        Positions in the base DataFrame of the Time column, the signals
+        returned by metadata2columns, the label columns and the run columns.
+        """
+        labels_columns = list(self.labels["Class"].unique())
+        metadata_columns = ["file", "PID", "RunID"]
+        other_columns = column_positions(
+            self.column_names, labels_columns + metadata_columns
+        )
+        signal_columns = [x for x in result_columns if x != 0]
+        return np.array([0] + signal_columns + list(other_columns))
 
     def metadata2columns(self, filter_dict: dict) -> List[int]:
         """Given a description of the signal based on the 3 basic attributes
@@ -62,6 +421,7 @@ class OppSelect:
             temp = temp[temp[x].isin(filter_dict[x])]
         return temp.to_dict("index")
 
+    @instrumented()
     def label_indexing(self, filter_dict: dict):
         """
         A function that filters a dataframe based
@@ -74,17 +434,20 @@ class OppSelect:
         filtered_df : A panda dataframe with data
         that describe only the required descriptions.
         """
-        self.last_df = self.df
+        self._select_ranges(self.label_ranges(filter_dict))
+
+    def label_ranges(self, filter_dict: dict) -> np.ndarray:
+        """
+        Row ranges of the base DataFrame of the labels of filter_dict,
+        see label_indexing.
+        """
         produced_labels = self.labels2index(filter_dict)
-        temp = [False] * self.df['Time'].count()
-        motion_class = list(map(lambda x: x["Class"], produced_labels))
-        for m in motion_class:
-            regarding_m = list(filter(lambda x: x["Class"] == m,
-                                      produced_labels))
-            index_only = list(map(lambda x: x["Label"], regarding_m))
-            temp_result = self.df[m].isin(index_only)
-            temp = temp | temp_result
-        self.df = self.df[temp]
+        selected = np.zeros(len(self.segments), dtype=bool)
+        for label in produced_labels:
+            selected |= (self.segments["Class"] == label["Class"]).to_numpy() & (
+                self.segments["Label"] == label["Label"]
+            ).to_numpy()
+        return merge_ranges(self.segments[selected][["start", "stop"]].to_numpy())
 
     def labels2index(self, filter_dict):
         """
@@ -108,11 +471,23 @@ class OppSelect:
             result.extend(labels[logical_indexing].to_dict("records"))
         return result
 
+    @instrumented()
     def run_indexing(self, filter_dict):
         """
         Method that filters the DataFrame based on PID and RunID
         Arguments:
-            filter_dict: dict Dictionary has fields PID and RunID
+            filter_dict: dict Dictionary has fields PID and RunID, each a
+            value or a list of values. The rows of any of the values of a
+            field are kept, and of all the fields given.
+        """
+        ranges = self.run_ranges(filter_dict)
+        if ranges is not None:
+            self._select_ranges(ranges)
+
+    def run_ranges(self, filter_dict: dict) -> Union[np.ndarray, None]:
+        """
+        Row ranges of the base DataFrame of the runs of filter_dict,
+        see run_indexing. None when filter_dict has no PID or RunID.
         """
         pids = filter_dict.get("PID", [])
         if type(pids) is str:
@@ -120,15 +495,115 @@ class OppSelect:
         runs = filter_dict.get("RunID", [])
         if type(runs) is str:
             runs = [runs]
-        if pids or runs:
-            self.last_df = self.df
-        for pid in pids:
-            self.df = self.df[self.df["PID"] == pid]
-        for run in runs:
-            self.df = self.df[self.df["RunID"] == run]
+        if not (pids or runs):
+            return None
+        selected = self.runs
+        if pids:
+            selected = selected[selected["PID"].isin(pids)]
+        if runs:
+            selected = selected[selected["RunID"].isin(runs)]
+        return merge_ranges(selected[["start", "stop"]].to_numpy())
+
+    def query(self) -> "OppQuery":
+        """
+        Empty lazy query over the base DataFrame, see OppQuery.
+        """
+        return OppQuery(self)
+
+    def save_query(self, name: str, query: "OppQuery"):
+        self.queries[name] = query
+
+    @instrumented()
+    def apply(self, query: Union[str, "OppQuery"]):
+        """
+        Replaces the current selection with the result of a query,
+        given directly or by the name it was saved with.
+        """
+        if type(query) is str:
+            query = self.queries[query]
+        self._set_state(*query.resolve())
 
     def restart(self):
-        self.df = self.base_df
+        self._set_state(
+            self.all_rows(),
+            np.arange(len(self.column_names)),
+            self.metadata.to_dict("index"),
+        )
 
     def undo(self):
-        self.df = self.last_df
+        if not self.history:
+            return
+        self.ranges, self.column_positions, self.columns = self.history.pop()
+        self._df = None
+
+
+class OppQuery:
+    """
+        Lazy, composable query over the base DataFrame of an OppSelect.
+        The indexing methods return a new query that also records their
+        predicate, so queries can be extended and reused. Nothing is
+        filtered until materialise, which combines all the predicates into
+        one set of row ranges and one column selection and takes them once.
+        E.g. : walking = view.query().run_indexing({'PID': '1'}).label_indexing(
+            {'Locomotion': 'Walk'})
+    """
+
+    def __init__(self, view: OppSelect, steps: tuple = ()):
+        self.view = view
+        self.steps = steps
+
+    def _extend(self, kind: str, filter_dict: dict) -> "OppQuery":
+        return OppQuery(self.view, self.steps + ((kind, deepcopy(filter_dict)),))
+
+    def signal_indexing(self, filter_dict: dict) -> "OppQuery":
+        """
+        Keeps only the signals of filter_dict, see OppSelect.signal_indexing.
+        """
+        return self._extend("signal", filter_dict)
+
+    def label_indexing(self, filter_dict: dict) -> "OppQuery":
+        """
+        Keeps only the rows with the labels of filter_dict,
+        see OppSelect.label_indexing.
+        """
+        return self._extend("label", filter_dict)
+
+    def run_indexing(self, filter_dict: dict) -> "OppQuery":
+        """
+        Keeps only the rows of the runs of filter_dict,
+        see OppSelect.run_indexing.
+        """
+        return self._extend("run", filter_dict)
+
+    def resolve(self) -> Tuple[np.ndarray, np.ndarray, dict]:
+        """
+        Combines the predicates of the query.
+        Returns:
+            Tuple[np.ndarray, np.ndarray, dict] -- Row ranges and column
+            positions of the base DataFrame and the metadata of the signals.
+        """
+        view = self.view
+        ranges = view.all_rows()
+        positions = np.arange(len(view.column_names))
+        columns = view.metadata.to_dict("index")
+        for kind, filter_dict in self.steps:
+            filter_dict = deepcopy(filter_dict)
+            if kind == "signal":
+                columns = view.metadata2columns(filter_dict)
+                positions = positions[np.isin(positions, view.signal_columns(columns))]
+            elif kind == "label":
+                ranges = intersect_ranges(ranges, view.label_ranges(filter_dict))
+            else:
+                run_ranges = view.run_ranges(filter_dict)
+                if run_ranges is not None:
+                    ranges = intersect_ranges(ranges, run_ranges)
+        return ranges, positions, columns
+
+    @instrumented()
+    def materialise(self) -> pd.DataFrame:
+        """
+        Returns the DataFrame selected by the query, without changing
+        the selection of the OppSelect.
+        """
+        ranges, positions, _ = self.resolve()
+        return self.view.take(ranges, positions)
@@ -0,0 +1,138 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Iterable, Optional
+
+# Ends the items of a queue
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class Pipeline:
+    """
+        Staged pipeline over bounded queues, overlapping the loading of the
+        items, their computation and the writing of the results.
+        A producer thread loads up to prefetch items ahead of the compute
+        stage, which runs compute on them, in an executor with at most
+        max_pending of them submitted at a time when one is given, and a
+        writer thread writes the results in the order of the items, at most
+        prefetch of them waiting. Memory is therefore bounded by the sizes
+        of the queues, whatever the number of items.
+        E.g. : Pipeline(read, process, save, prefetch=4).run(items)
+    """
+
+    def __init__(
+        self,
+        load: Optional[Callable],
+        compute: Callable,
+        write: Callable,
+        prefetch: int = 4,
+        executor: Optional[Executor] = None,
+        max_pending: Optional[int] = None,
+    ):
+        """
+        Arguments:
+            load {Optional[Callable]} -- Loads an item, in the producer thread,
+            None to pass the items as they are.
+            compute {Callable} -- Computes the result of a loaded item.
+            write {Callable} -- Writes a result, in the writer thread.
+            prefetch {int} -- Bound of the loaded items and of the results waiting.
+            executor {Optional[Executor]} -- Runs compute, in the calling
+            thread when None.
+            max_pending {Optional[int]} -- Bound of the items submitted to the
+            executor, twice its workers by default.
+        """
+        self.load = load
+        self.compute = compute
+        self.write = write
+        self.prefetch = prefetch
+        self.executor = executor
+        if max_pending is None:
+            max_pending = 2 * (getattr(executor, "_max_workers", None) or 1)
+        self.max_pending = max_pending
+
+    def _produce(self, items: Iterable, loaded: queue.Queue, stop: threading.Event):
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                loaded.put(item if self.load is None else self.load(item))
+        except BaseException as error:
+            loaded.put(_Failure(error))
+            return
+        loaded.put(_DONE)
+
+    def _consume(self, results: queue.Queue, failures: list, written: list):
+        while True:
+            result = results.get()
+            if result is _DONE:
+                return
+            if failures:
+                # Drain the queue so that the compute stage never blocks
+                continue
+            try:
+                self.write(result)
+            except BaseException as error:
+                failures.append(error)
+                continue
+            written[0] += 1
+
+    def run(self, items: Iterable) -> int:
+        """
+        Runs the items through the stages.
+        Returns:
+            int -- Number of results the writer wrote.
+        Raises:
+            The first exception of a stage, once the threads are stopped.
+        """
+        loaded = queue.Queue(self.prefetch)
+        results = queue.Queue(self.prefetch)
+        stop = threading.Event()
+        write_failures = []
+        written = [0]
+        producer = threading.Thread(
+            target=self._produce, args=(items, loaded, stop), daemon=True
+        )
+        writer = threading.Thread(
+            target=self._consume,
+            args=(results, write_failures, written),
+            daemon=True,
+        )
+        producer.start()
+        writer.start()
+        pending = deque()
+        try:
+            while not write_failures:
+                item = loaded.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+                if self.executor is None:
+                    results.put(self.compute(item))
+                    continue
+                pending.append(self.executor.submit(self.compute, item))
+                while len(pending) >= self.max_pending:
+                    results.put(pending.popleft().result())
+            while pending and not write_failures:
+                results.put(pending.popleft().result())
+        finally:
+            stop.set()
+            for future in pending:
+                future.cancel()
+            # Unblock the producer, then let the writer finish
+            while producer.is_alive():
+                try:
+                    loaded.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            results.put(_DONE)
+            writer.join()
+        if write_failures:
+            raise write_failures[0]
+        return written[0]
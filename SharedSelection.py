@@ -0,0 +1,267 @@
+import weakref
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple, Union
+from OpportunityView import OppSelect
+
+
+class SelectionDescriptor:
+    """
+        Picklable description of a selection exported to shared memory,
+        all a worker process needs to attach it, see SharedSelection.attach.
+        It only holds names and the row ranges, so it is cheap to send.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        n_rows: int,
+        columns: List[str],
+        categories: Dict[int, List[str]],
+        ranges: np.ndarray,
+        dtype: str,
+    ):
+        """
+        Arguments:
+            name {str} -- Name of the shared memory segment.
+            n_rows {int} -- Rows of the selection.
+            columns {List[str]} -- Names of the columns, in the order of the block.
+            categories {Dict[int, List[str]]} -- Categories of the label and
+            run columns, by position in columns, stored as their codes.
+            ranges {np.ndarray} -- [start, stop) row ranges of the dataset selected.
+            dtype {str} -- dtype of the block.
+        """
+        self.name = name
+        self.n_rows = n_rows
+        self.columns = columns
+        self.categories = categories
+        self.ranges = ranges
+        self.dtype = dtype
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.columns), self.n_rows
+
+    @property
+    def index_nbytes(self) -> int:
+        return self.n_rows * np.dtype(np.int64).itemsize
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the segment, the int64 index of the rows followed by the block.
+        """
+        n_values = self.n_rows * len(self.columns)
+        return self.index_nbytes + n_values * np.dtype(self.dtype).itemsize
+
+
+def open_segment(
+    name: Optional[str] = None, size: int = 0
+) -> shared_memory.SharedMemory:
+    """
+    Creates a shared memory segment of size bytes when name is None,
+    otherwise opens the existing one, without tracking it where possible,
+    so that only the process that created it unlinks it.
+    """
+    if name is None:
+        return shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always tracks
+        return shared_memory.SharedMemory(name=name)
+
+
+def unlink_segment(segment: shared_memory.SharedMemory):
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class SharedBlock:
+    """
+        Mapping of a shared memory segment, exposed to NumPy as an array of
+        nbytes bytes. The arrays made from it reference it instead of the
+        segment buffer, so the mapping stays open as long as any of them is
+        in use and is closed when the last one is gone.
+    """
+
+    def __init__(self, segment: shared_memory.SharedMemory, nbytes: int):
+        self.segment = segment
+        address = np.frombuffer(segment.buf, dtype=np.uint8).ctypes.data
+        self.__array_interface__ = {
+            "shape": (nbytes,),
+            "typestr": "|u1",
+            "data": (address, False),
+            "version": 3,
+        }
+        weakref.finalize(self, segment.close)
+
+
+class SharedSelection:
+    """
+        Selection of an OppSelect copied once into shared memory, as a float32
+        block of one contiguous row per column, so that worker processes
+        can attach it without copying or unpickling it. Label and run
+        columns are stored as their category codes, and integer columns
+        such as Time are exact up to 2**24.
+        The process that exported it unlinks the segment on release, when
+        leaving a with block, or once the SharedSelection is garbage.
+        The arrays of an attached selection are writable and map the same
+        memory, so a write reaches the data of the owner and of every other
+        process that attached it; workers should treat them as read-only.
+        E.g. : with SharedSelection.export(view) as shared:
+                   pool.map(work, [shared.descriptor] * n_jobs)
+               def work(descriptor):
+                   df = SharedSelection.attach(descriptor).frame()
+    """
+
+    def __init__(self, descriptor: SelectionDescriptor, block: SharedBlock):
+        self.descriptor = descriptor
+        data = np.asarray(block)
+        split = descriptor.index_nbytes
+        self.index = data[:split].view(np.int64)
+        self.values = data[split:].view(descriptor.dtype).reshape(descriptor.shape)
+        self._release = None
+
+    @classmethod
+    def export(
+        cls, view: OppSelect, dtype: str = "float32", chunk_size: int = 65536
+    ) -> "SharedSelection":
+        """
+        Copies the current selection of view to a new shared memory segment,
+        chunk by chunk, so an out of core selection is never materialised.
+        Arguments:
+            view {OppSelect} -- The selection.
+            dtype {str} -- dtype of the block.
+            chunk_size {int} -- Rows copied at a time.
+        Returns:
+            SharedSelection -- The owner of the segment.
+        """
+        ranges, positions = view.ranges, view.column_positions
+        empty = view.rows(0, 0, positions)
+        categorical = np.array(
+            [
+                isinstance(column_dtype, pd.CategoricalDtype)
+                for column_dtype in empty.dtypes
+            ],
+            dtype=bool,
+        )
+        # Numeric columns first, so that they form one block of the frame
+        order = np.r_[np.flatnonzero(~categorical), np.flatnonzero(categorical)]
+        categories = {
+            block_row: list(empty.iloc[:, column].cat.categories)
+            for block_row, column in enumerate(order)
+            if categorical[column]
+        }
+        n_rows = int((ranges[:, 1] - ranges[:, 0]).sum())
+        descriptor = SelectionDescriptor(
+            None,
+            n_rows,
+            list(empty.columns[order]),
+            categories,
+            ranges.copy(),
+            np.dtype(dtype).str,
+        )
+        segment = open_segment(size=descriptor.nbytes)
+        descriptor.name = segment.name
+        shared = cls(descriptor, SharedBlock(segment, descriptor.nbytes))
+        shared._release = weakref.finalize(shared, unlink_segment, segment)
+
+        offset = 0
+        for range_start, range_stop in ranges:
+            for start in range(range_start, range_stop, chunk_size):
+                stop = min(start + chunk_size, range_stop)
+                df = view.rows(start, stop, positions)
+                rows = slice(offset, offset + stop - start)
+                shared.index[rows] = df.index
+                for block_row, column in enumerate(order):
+                    values = df.iloc[:, column]
+                    if categorical[column]:
+                        values = values.cat.codes
+                    shared.values[block_row, rows] = values.to_numpy()
+                offset += stop - start
+        return shared
+
+    @classmethod
+    def attach(cls, descriptor: SelectionDescriptor) -> "SharedSelection":
+        """
+        Maps an exported selection in the current process, without copying it.
+        Its arrays are writable views of the shared segment, writing to them
+        changes the data of the owner.
+        """
+        return cls(
+            descriptor,
+            SharedBlock(open_segment(descriptor.name), descriptor.nbytes),
+        )
+
+    def release(self):
+        """
+        Unlinks the segment, when exported by this process. Processes that
+        attached it keep their mapping until they drop their arrays.
+        """
+        if self._release is not None:
+            self._release()
+
+    def __enter__(self) -> "SharedSelection":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    @property
+    def columns(self) -> List[str]:
+        return self.descriptor.columns
+
+    @property
+    def n_numeric(self) -> int:
+        return len(self.columns) - len(self.descriptor.categories)
+
+    def row_ranges(self) -> np.ndarray:
+        """
+        [start, stop) rows of the block of every row range of the selection,
+        e.g. to process it range by range.
+        """
+        lengths = self.descriptor.ranges[:, 1] - self.descriptor.ranges[:, 0]
+        stops = np.cumsum(lengths)
+        return np.stack([stops - lengths, stops], axis=1)
+
+    def column(self, column: Union[str, int]) -> np.ndarray:
+        """
+        Values of a column, given by name or position in columns, as a view.
+        Label and run columns are their category codes.
+        """
+        if not isinstance(column, (int, np.integer)):
+            column = self.columns.index(column)
+        return self.values[column]
+
+    def matrix(self) -> np.ndarray:
+        """
+        The numeric columns as a rows x columns view, e.g. for histograms.
+        """
+        return self.values[: self.n_numeric].T
+
+    def frame(self, labels: bool = True) -> pd.DataFrame:
+        """
+        The selection as a DataFrame with the index of the dataset. The
+        numeric columns and the index view the shared block, only the label
+        and run columns are decoded into Categoricals.
+        Arguments:
+            labels {bool} -- Whether to include the label and run columns.
+        Returns:
+            pd.DataFrame -- The selection.
+        """
+        df = pd.DataFrame(
+            self.matrix(),
+            index=pd.Index(self.index, copy=False),
+            columns=self.columns[: self.n_numeric],
+            copy=False,
+        )
+        if labels:
+            for block_row, categories in self.descriptor.categories.items():
+                df[self.columns[block_row]] = pd.Categorical.from_codes(
+                    self.values[block_row].astype(np.int64), categories=categories
+                )
+        return df
@@ -1,65 +1,282 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import json
 import math
-from sklearn.preprocessing import scale
+import warnings
+from functools import cached_property
+import Decimation
+import Instrumentation
+import Similarity
+from Sketch import BINNINGS, QuantileSketch, sketch_edges
+import Warping
+
+
+def bin_count(signal_range):
+    """
+    Number of histogram bins FuzzySet uses for a signal of the given range.
+    """
+    return np.max([math.ceil(math.sqrt(signal_range) / 10) * 10, 50])
+
+
+def standardize(data, axis=0):
+    """
+    Standardizes data to zero mean and unit variance along axis, like
+    sklearn.preprocessing.scale: NaNs are ignored and constant data are
+    only centred.
+    """
+    data = np.asarray(data)
+    if not np.issubdtype(data.dtype, np.floating):
+        data = data.astype(np.float64)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(data, axis=axis, keepdims=True)
+        std = np.nanstd(data, axis=axis, keepdims=True)
+    std[std < 10 * np.finfo(std.dtype).eps] = 1
+    return (data - mean) / std
+
+
+def sketched_edges(signal, binning):
+    """
+    Bin edges of the non-NaN values of a signal with a binning of
+    Sketch.sketch_edges, from a QuantileSketch of one pass over them.
+    """
+    sketch = QuantileSketch().update(signal)
+    default_bins = bin_count(sketch.max - sketch.min) if sketch.count else 50
+    return sketch_edges(sketch, binning, default_bins=default_bins)
+
+
+@Instrumentation.instrumented('histograms')
+def histograms(matrix, num_of_bins=None, chunk_size=65536, valid=None,
+               binning='range'):
+    """
+    Density histograms of every column of a 2-D matrix in one vectorized pass.
+    NaNs are ignored. The bins of a column are the ones np.histogram picks
+    for its non-NaN values, with the FuzzySet bin rule unless num_of_bins
+    is given, so each result equals FuzzySet(column.dropna()).
+    Arguments:
+        matrix {np.ndarray} -- Rows are samples, columns are signals.
+        num_of_bins {int or array} -- Bins of every column, or one per column.
+        chunk_size {int} -- Rows binned at a time, bounds the temporary memory.
+        valid {np.ndarray} -- Validity mask of the matrix, e.g. from
+        OppDF.gaps, used instead of scanning it for NaNs.
+        binning {str} -- One of Sketch.BINNINGS, range for the FuzzySet rule,
+        the others bin every column from its quantiles, see sketch_edges,
+        and then ignore num_of_bins. Equals FuzzySet(column, binning=binning).
+    Returns:
+        Tuple[List[np.ndarray], List[np.ndarray]] -- Histograms and bin edges
+        of every column. All-NaN columns get NaN histograms.
+    """
+    matrix = np.asarray(matrix)
+    if matrix.ndim == 1:
+        matrix = matrix[:, np.newaxis]
+    if not np.issubdtype(matrix.dtype, np.floating):
+        matrix = matrix.astype(np.float64)
+    n_cols = matrix.shape[1]
+    Instrumentation.count('histogram_signals', n_cols)
+    Instrumentation.count('histogram_values', matrix.size)
+
+    if valid is not None:
+        valid = np.broadcast_to(np.asarray(valid, dtype=bool), matrix.shape)
+        if valid.all():
+            # No NaNs to skip, neither when binning
+            valid = True
+    if binning != 'range':
+        return _sketched_histograms(matrix, valid, binning, chunk_size)
+
+    if matrix.shape[0] == 0:
+        mins = maxs = np.full(n_cols, np.nan, dtype=matrix.dtype)
+    elif valid is True:
+        mins = matrix.min(axis=0)
+        maxs = matrix.max(axis=0)
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mins = np.nanmin(matrix, axis=0)
+            maxs = np.nanmax(matrix, axis=0)
+    empty = np.isnan(mins)
+    if num_of_bins is None:
+        num_of_bins = [bin_count(signal_range) if not is_empty else 50
+                       for signal_range, is_empty in zip(maxs - mins, empty)]
+    num_of_bins = np.broadcast_to(np.asarray(num_of_bins, dtype=np.intp),
+                                  (n_cols,))
+
+    # Same outer edges and bin edges as np.histogram
+    bin_edges = []
+    for col in range(n_cols):
+        first, last = mins[col], maxs[col]
+        if empty[col]:
+            first, last = matrix.dtype.type(0), matrix.dtype.type(1)
+        elif first == last:
+            first, last = first - 0.5, last + 0.5
+        bin_type = np.result_type(first, last, matrix)
+        bin_edges.append(np.linspace(first, last, num_of_bins[col] + 1,
+                                     endpoint=True, dtype=bin_type))
+    firsts = np.array([edges[0] for edges in bin_edges], dtype=np.float64)
+    lasts = np.array([edges[-1] for edges in bin_edges], dtype=np.float64)
+    norms = num_of_bins / (lasts - firsts)
+    flat_edges = np.concatenate(bin_edges)
+    edge_offsets = np.r_[0, np.cumsum(num_of_bins + 1)[:-1]]
+    bin_offsets = np.r_[0, np.cumsum(num_of_bins)[:-1]]
+
+    counts = np.zeros(num_of_bins.sum(), dtype=np.intp)
+    for start in range(0, matrix.shape[0], chunk_size):
+        block = matrix[start:start + chunk_size]
+        if valid is True:
+            block_valid = np.ones(block.shape, dtype=bool)
+            values = block
+        else:
+            if valid is None:
+                block_valid = ~np.isnan(block)
+            else:
+                block_valid = valid[start:start + chunk_size]
+            values = np.where(block_valid, block, firsts.astype(block.dtype))
+        indices = ((values - firsts) * norms).astype(np.intp)
+        indices = np.minimum(indices, num_of_bins - 1)
+        values = values.astype(flat_edges.dtype, copy=False)
+        indices -= values < flat_edges[indices + edge_offsets]
+        indices += ((values >= flat_edges[indices + edge_offsets + 1])
+                    & (indices != num_of_bins - 1))
+        counts += np.bincount((indices + bin_offsets)[block_valid],
+                              minlength=len(counts))
+
+    hists = []
+    for col in range(n_cols):
+        col_counts = counts[bin_offsets[col]:bin_offsets[col] + num_of_bins[col]]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            hists.append(col_counts / np.diff(bin_edges[col]) / col_counts.sum())
+    return hists, bin_edges
+
+
+def _sketched_histograms(matrix, valid, binning, chunk_size):
+    """
+    histograms of the columns of a matrix binned from their quantiles.
+    The values outside the clipped range are counted in the outer bins.
+    """
+    if binning not in BINNINGS:
+        raise ValueError(f'Unknown binning {binning}, expected one of {BINNINGS}')
+    hists, bin_edges = [], []
+    for col in range(matrix.shape[1]):
+        column = matrix[:, col]
+        if valid is not None and valid is not True:
+            column = column[valid[:, col]]
+        edges = sketched_edges(column, binning)
+        counts = np.zeros(len(edges) - 1, dtype=np.intp)
+        for start in range(0, len(column), chunk_size):
+            block = column[start:start + chunk_size]
+            if valid is None:
+                block = block[~np.isnan(block)]
+            block = np.clip(block, edges[0], edges[-1])
+            if binning == 'quantile':
+                bins = np.searchsorted(edges, block, side='right') - 1
+            else:
+                # Equal widths, the bin follows from the value
+                bins = ((block - edges[0])
+                        * (len(counts) / (edges[-1] - edges[0]))).astype(np.intp)
+            counts += np.bincount(np.minimum(bins, len(counts) - 1),
+                                  minlength=len(counts))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            hists.append(counts / np.diff(edges) / counts.sum())
+        bin_edges.append(edges)
+    return hists, bin_edges
+
 
 class Signal:
-    def __init__(self, time, data):
-    
-        temp = pd.DataFrame({"Time": time, "Signal": data})
-        temp = temp.dropna()
-        self.time = temp['Time']
-        self.data = temp['Signal']
-        self.range = (max(self.data)-min(self.data))
-        self.norm_data = scale(self.data,
-                                     axis=0,
-                                     with_mean=True,
-                                     with_std=True,
-                                     copy=True)
-        self.gradient = np.diff(self.data)
-        self.norm_gradient = np.diff(self.norm_data)
-        
-        self.fuzzy_set = FuzzySet(self.data)
-        self.norm_fuzzy_set = FuzzySet(self.norm_data)
-        self.grad_fuzzy_set = FuzzySet(self.gradient)
-        self.norm_grad_fuzzy_set = FuzzySet(self.norm_gradient)
-        
-    def plot(self, other=None, normalized=False, gradient=False):
-        
-        if normalized and gradient:
-            plot_data = self.norm_gradient
-            plot_time = self.time[1:]
-            if other:
-                other_data = other.norm_gradient
-                other_time = other.time[1:]
-        elif normalized and not gradient:
-            plot_data = self.norm_data
-            plot_time = self.time
-            if other:
-                other_data = other.norm_data
-                other_time = other.time
-        elif not normalized and gradient:
-            plot_data = self.gradient
-            plot_time = self.time[1:]
-            if other:
-                other_data = other.gradient
-                other_time = other.time[1:]
-        elif not normalized and not gradient:
-            plot_data = self.data
-            plot_time = self.time
-            if other:
-                other_data = other.data
-                other_time = other.time
+    """
+    A signal and its derived views. The NaN samples are dropped once, and
+    the normalized data, the gradients and their FuzzySets are only
+    computed on first access, then cached.
+    """
+    def __init__(self, time, data, valid=None):
+        """
+        valid is an optional validity mask of data, e.g. from OppDF.gaps,
+        used instead of scanning the samples for NaNs.
+        """
+        time = np.asarray(time)
+        data = np.asarray(data)
+        if valid is None:
+            valid = ~(pd.isna(time) | pd.isna(data))
         else:
-            raise Exception('boom')
+            valid = np.asarray(valid, dtype=bool)
+        if valid.all():
+            # Keep the given arrays, which may be views of a shared frame
+            self.time = time
+            self.data = data
+        else:
+            self.time = time[valid]
+            self.data = data[valid]
+        # Decimation pyramids of the views plotted, see pyramid
+        self._pyramids = {}
 
-        if not other:
-            plt.plot(plot_time, plot_data)
+    @classmethod
+    def from_frame(cls, df, column):
+        """
+        Signal of a column of a DataFrame containing a Time column,
+        given by name or position, without copying it when it has no NaNs.
+        """
+        if isinstance(column, int):
+            data = df.iloc[:, column]
         else:
-            plt.plot(plot_time, plot_data,
-                     other_time, other_data)
+            data = df[column]
+        return cls(df['Time'].to_numpy(), data.to_numpy())
+
+    @cached_property
+    def range(self):
+        return self.data.max() - self.data.min()
+
+    @cached_property
+    def norm_data(self):
+        return standardize(self.data)
+
+    @cached_property
+    def gradient(self):
+        return np.diff(self.data)
+
+    @cached_property
+    def norm_gradient(self):
+        return np.diff(self.norm_data)
+
+    @cached_property
+    def fuzzy_set(self):
+        return FuzzySet(self.data)
+
+    @cached_property
+    def norm_fuzzy_set(self):
+        return FuzzySet(self.norm_data)
+
+    @cached_property
+    def grad_fuzzy_set(self):
+        return FuzzySet(self.gradient)
+
+    @cached_property
+    def norm_grad_fuzzy_set(self):
+        return FuzzySet(self.norm_gradient)
+
+    def pyramid(self, normalized=False, gradient=False):
+        """
+        Decimation pyramid of the samples, normalized and/or differentiated,
+        built on first use, see Decimation.Pyramid.
+        """
+        key = (normalized, gradient)
+        if key not in self._pyramids:
+            time = self.time[1:] if gradient else self.time
+            self._pyramids[key] = Decimation.Pyramid(
+                time, self.series(normalized, gradient))
+        return self._pyramids[key]
+
+    def plot(self, other=None, normalized=False, gradient=False, ax=None,
+             n_points=None):
+        """
+        Plots the signal, and other, a Signal or a list of them, on the same
+        axes. Only about as many points as the axes have pixels are drawn,
+        and zooming draws the visible range at a finer level of the pyramids,
+        see Decimation.plot.
+        """
+        others = []
+        if other:
+            others = other if isinstance(other, list) else [other]
+        for signal in [self] + others:
+            Decimation.plot(signal.pyramid(normalized, gradient), ax=ax,
+                            n_points=n_points)
 
     def fs_plot(self, other=None, normalized=False, gradient=False):
         
@@ -87,31 +304,306 @@ class Signal:
         else:
             target_fs.plot(other_fs)
 
-    def compare(self, other):
-        ...
+    def series(self, normalized=False, gradient=False):
+        """
+        The samples, normalized and/or differentiated.
+        """
+        if normalized and gradient:
+            return self.norm_gradient
+        elif normalized and not gradient:
+            return self.norm_data
+        elif not normalized and gradient:
+            return self.gradient
+        return self.data
+
+    def compare(self, other, metric='intersection', normalized=False,
+                gradient=False, window=0.1):
+        """
+        Distance between the FuzzySets of two signals,
+        see Similarity.distance_matrix for the metrics.
+        The dtw metric compares the samples themselves instead, by dynamic
+        time warping within a band of window, see Warping.dtw.
+        """
+        if metric == 'dtw':
+            return Warping.dtw(self.series(normalized, gradient),
+                               other.series(normalized, gradient), window)
+        if normalized and gradient:
+            return self.norm_grad_fuzzy_set.compare(
+                other.norm_grad_fuzzy_set, metric)
+        elif normalized and not gradient:
+            return self.norm_fuzzy_set.compare(other.norm_fuzzy_set, metric)
+        elif not normalized and gradient:
+            return self.grad_fuzzy_set.compare(other.grad_fuzzy_set, metric)
+        return self.fuzzy_set.compare(other.fuzzy_set, metric)
+
+    def search(self, others, k=1, window=0.1, normalized=False,
+               gradient=False):
+        """
+        The k signals of others nearest to this one by DTW distance,
+        see Warping.dtw_search.
+        Returns:
+            Tuple[np.ndarray, np.ndarray] -- Positions in others of the
+            nearest signals and their distances, nearest first.
+        """
+        return Warping.dtw_search(
+            self.series(normalized, gradient),
+            [other.series(normalized, gradient) for other in others],
+            k, window)
+
+    @classmethod
+    def from_episodes(cls, db_view, column, label_class='Locomotion',
+                      labels=None):
+        """
+        Signals of a column in every episode of a label class of the
+        current selection of an OppSelect, see OppSelect.episodes,
+        e.g. the candidates of search.
+        Arguments:
+            column {str or int} -- The column, as in from_frame.
+        Returns:
+            Tuple[List[tuple], List[Signal]] -- (PID, RunID, label) and
+            Signal of every episode.
+        """
+        keys, signals = [], []
+        for pid, run_id, label, df in db_view.episodes(label_class, labels):
+            keys.append((pid, run_id, label))
+            signals.append(cls.from_frame(df, column))
+        return keys, signals
 
 class FuzzySet:
-    def __init__(self, signal, mode='density'):
-        
+    # Lightweight, a FuzzySet may only be a view over a HistogramStore
+    __slots__ = ('hist', 'bin_edges')
+
+    def __init__(self, signal, mode='density', binning='range'):
+        """
+        binning is one of Sketch.BINNINGS: range bins the signal with
+        bin_count of its range, the others from its quantiles, with bins
+        as wide as the Freedman-Diaconis rule over the whole range (fd) or
+        without the outliers (clipped), or holding the same share of the
+        values (quantile), see Sketch.sketch_edges.
+        """
+        Instrumentation.count('fuzzy_sets')
+        if binning != 'range':
+            self.hist, self.bin_edges = _sketched_histograms(
+                np.asarray(signal, dtype=np.float64)[:, np.newaxis], None,
+                binning, 65536)
+            self.hist, self.bin_edges = self.hist[0], self.bin_edges[0]
+            return
         signal_range = (max(signal)-min(signal))
-        num_of_bins = np.max([math.ceil(math.sqrt(signal_range) / 10) * 10,
-                              50])
+        num_of_bins = bin_count(signal_range)
         self.hist, self.bin_edges = np.histogram(
             signal, bins=num_of_bins, density=True
         )
+
+    @classmethod
+    def from_histogram(cls, hist, bin_edges):
+        fuzzy_set = cls.__new__(cls)
+        fuzzy_set.hist = hist
+        fuzzy_set.bin_edges = bin_edges
+        return fuzzy_set
+
+    @classmethod
+    def batch(cls, matrix, num_of_bins=None, binning='range'):
+        """
+        Builds the FuzzySets of all the columns of a 2-D matrix at once,
+        see histograms.
+        """
+        return [cls.from_histogram(hist, bin_edges)
+                for hist, bin_edges in zip(*histograms(matrix, num_of_bins,
+                                                       binning=binning))]
     
-    def compare(self, other):
+    def compare(self, other, metric='intersection'):
+        """
+        Distance between two FuzzySets on their common support,
+        see Similarity.distance_matrix for the metrics.
+        """
         if not (type(other) == self.__class__):
             raise Exception
+        return Similarity.distance_matrix([self], [other], metric)[0, 0]
 
-    def plot(self, other=None):
-        if not other:
-            temp_hist = np.insert(self.hist, 0, self.hist[0])
-            plt.plot(self.bin_edges, temp_hist,
-                     '-', drawstyle='steps')
+    def plot(self, other=None, ax=None, n_points=None):
+        """
+        Plots the histogram as steps, and the one of other, decimated
+        to the width of the axes when it has more bins, see Decimation.plot.
+        """
+        fuzzy_sets = [self] if not other else [self, other]
+        for fuzzy_set in fuzzy_sets:
+            temp_hist = np.insert(fuzzy_set.hist, 0, fuzzy_set.hist[0])
+            Decimation.plot(Decimation.Pyramid(fuzzy_set.bin_edges, temp_hist),
+                            '-', drawstyle='steps', ax=ax, n_points=n_points)
+
+class StreamingFuzzySet:
+    """
+    FuzzySet built chunk by chunk, without holding the signal in memory.
+    Values are counted on a grid aligned on 0, keeping only the filled bins
+    of the grid, so an outlier costs one bin whatever the range it adds.
+    By default the step of the grid is the coarsest power of two on which
+    every value counted falls exactly, e.g. 1 for whole numbers such as
+    the Opportunity signals, and the FuzzySet then equals the one of the
+    whole signal. Once more than max_bins bins are filled, the step is
+    doubled until they fit, so memory stays bounded and the values are
+    snapped to their bin, a small fraction of a FuzzySet bin.
+    Two StreamingFuzzySets merge exactly by adding their counts on the
+    coarser of their grids, e.g. per-run sets into a per-subject one.
+    With a fixed resolution the step is resolution, and values that are
+    not multiples of it raise a ValueError instead of being snapped.
+    The FuzzySet is only binned with the usual rule in to_fuzzy_set.
+    """
+
+    # Below the exponent of any float64
+    NO_EXPONENT = -1100
+
+    def __init__(self, resolution=None, max_bins=65536):
+        self.resolution = resolution
+        self.max_bins = max_bins
+        # The step of the grid is 2 ** exponent without a resolution, and
+        # never finer again than once it had to be coarsened
+        self.exponent = None
+        self.coarsest = self.NO_EXPONENT
+        # Sorted filled bins of the grid and their counts
+        self.bins = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    @property
+    def step(self):
+        if self.resolution is not None:
+            return self.resolution
+        return math.ldexp(1.0, self.exponent or 0)
+
+    @staticmethod
+    def _exact_exponent(values):
+        """
+        Exponent of the coarsest power of two grid holding every value
+        exactly, None for zeros only.
+        """
+        values = values[values != 0]
+        if len(values) == 0:
+            return None
+        mantissas, exponents = np.frexp(values)
+        integers = np.abs(np.ldexp(mantissas, 53)).astype(np.int64)
+        trailing_zeros = np.log2(integers & -integers).astype(np.int64)
+        return int((exponents - 53 + trailing_zeros).min())
+
+    def _min_exponent(self):
+        """
+        Finest exponent for which the bins of the values fit in int64.
+        """
+        magnitude = max(abs(self.min), abs(self.max))
+        return math.frexp(magnitude)[1] - 62
+
+    @staticmethod
+    def _combine(bins, counts):
+        """
+        Sums the counts of equal bins, given sorted.
+        """
+        starts = np.flatnonzero(np.r_[True, np.diff(bins) != 0])
+        return bins[starts], np.add.reduceat(counts, starts)
+
+    @classmethod
+    def _shift(cls, bins, counts, shift):
+        """
+        Bins of a grid 2 ** shift times coarser, finer when negative.
+        """
+        if shift < 0:
+            return bins << -shift, counts
+        if shift == 0 or len(bins) == 0:
+            return bins, counts
+        return cls._combine(bins >> shift, counts)
+
+    def _add(self, exponent, bins, counts, coarsest=NO_EXPONENT):
+        """
+        Adds sorted bins of the grid of the given exponent, then coarsens
+        the grid until at most max_bins are filled.
+        """
+        if self.resolution is None:
+            target = exponent if self.exponent is None else min(self.exponent,
+                                                                exponent)
+            self.coarsest = max(self.coarsest, coarsest)
+            target = max(target, self.coarsest, self._min_exponent())
+            if self.exponent is not None:
+                self.bins, self.counts = self._shift(self.bins, self.counts,
+                                                     target - self.exponent)
+            bins, counts = self._shift(bins, counts, target - exponent)
+            self.exponent = target
+        bins = np.concatenate([self.bins, bins])
+        order = np.argsort(bins, kind='stable')
+        self.bins, self.counts = self._combine(
+            bins[order], np.concatenate([self.counts, counts])[order])
+        while self.resolution is None and len(self.bins) > self.max_bins:
+            # Fewer than twice as few bins per doubling of the step
+            shift = max(1, math.ceil(math.log2(len(self.bins) / self.max_bins)))
+            self.bins, self.counts = self._shift(self.bins, self.counts, shift)
+            self.exponent += shift
+            self.coarsest = self.exponent
+
+    def update(self, chunk):
+        """
+        Adds the non-NaN values of a chunk of the signal.
+        """
+        chunk = np.asarray(chunk, dtype=np.float64).ravel()
+        chunk = chunk[~np.isnan(chunk)]
+        if len(chunk) == 0:
+            return self
+        self.min = min(self.min, chunk.min())
+        self.max = max(self.max, chunk.max())
+        if self.resolution is not None:
+            bins = np.rint(chunk / self.resolution)
+            if not np.allclose(bins * self.resolution, chunk, rtol=1e-9,
+                               atol=0):
+                raise ValueError('Values finer than the resolution {}, use '
+                                 'resolution=None'.format(self.resolution))
+            exponent = 0
         else:
-            temp_hist_1 = np.insert(self.hist, 0, self.hist[0])
-            temp_hist_2 = np.insert(other.hist, 0, other.hist[0])
-            plt.plot(self.bin_edges, temp_hist_1,
-                     other.bin_edges, temp_hist_2,
-                     '-', drawstyle='steps')
\ No newline at end of file
+            exponent = self._exact_exponent(chunk)
+            if exponent is None:
+                exponent = self.exponent if self.exponent is not None else 0
+            # Count the chunk on the grid it will be added to
+            exponent = max(exponent, self.coarsest, self._min_exponent())
+            bins = np.floor(np.ldexp(chunk, -exponent))
+        bins, counts = np.unique(bins.astype(np.int64), return_counts=True)
+        self._add(exponent, bins, counts)
+        return self
+
+    def merge(self, *others):
+        """
+        Returns a new StreamingFuzzySet counting the values of self and others.
+        """
+        merged = StreamingFuzzySet(self.resolution, self.max_bins)
+        for other in (self,) + others:
+            if other.resolution != self.resolution:
+                raise ValueError('Cannot merge StreamingFuzzySets with '
+                                 'different resolutions')
+            if len(other.counts):
+                merged.min = min(merged.min, other.min)
+                merged.max = max(merged.max, other.max)
+                merged._add(other.exponent or 0, other.bins, other.counts,
+                            other.coarsest)
+        return merged
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def to_fuzzy_set(self, num_of_bins=None):
+        """
+        FuzzySet of the values counted so far, binned like FuzzySet
+        unless num_of_bins is given. Values are snapped to their grid bin.
+        """
+        if self.count == 0:
+            return FuzzySet.from_histogram(np.full(50, np.nan),
+                                           np.linspace(0, 1, 51))
+        first, last = self.min, self.max
+        if num_of_bins is None:
+            num_of_bins = bin_count(last - first)
+        if first == last:
+            first, last = first - 0.5, last + 0.5
+        values = np.clip(self.bins * self.step, first, last)
+        hist, bin_edges = np.histogram(values, bins=num_of_bins,
+                                       range=(first, last),
+                                       weights=self.counts,
+                                       density=True)
+        return FuzzySet.from_histogram(hist, bin_edges)
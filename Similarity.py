@@ -0,0 +1,154 @@
+import numpy as np
+from typing import Optional, Union
+
+METRICS = ["intersection", "bhattacharyya", "jensen_shannon", "emd"]
+
+
+def common_edges(
+    fuzzy_sets: list, num_of_bins: Optional[int] = None, max_bins: int = 1024
+) -> np.ndarray:
+    """
+    Bin edges covering the support of all the given FuzzySets, by default
+    the union of their own edges, so that a FuzzySet of a much wider
+    support, e.g. with an outlier, does not merge the bins of the others.
+    Beyond max_bins bins, every few edges of the union are kept, which
+    keeps the grid finest where the most FuzzySets have bins.
+    Arguments:
+        fuzzy_sets {list} -- The FuzzySets.
+        num_of_bins {Optional[int]} -- Number of equal-width bins instead.
+        max_bins {int} -- Bound of the number of bins of the union.
+    Returns:
+        np.ndarray -- The common bin edges, increasing.
+    """
+    first = min(fs.bin_edges[0] for fs in fuzzy_sets)
+    last = max(fs.bin_edges[-1] for fs in fuzzy_sets)
+    if num_of_bins is not None:
+        return np.linspace(first, last, num_of_bins + 1)
+    edges = np.unique(
+        np.concatenate(
+            [np.asarray(fs.bin_edges, dtype=np.float64) for fs in fuzzy_sets]
+        )
+    )
+    if len(edges) < 2:
+        return np.array([first - 0.5, last + 0.5])
+    if len(edges) > max_bins + 1:
+        edges = edges[
+            np.unique(
+                np.linspace(0, len(edges) - 1, max_bins + 1).round().astype(np.int64)
+            )
+        ]
+    return edges
+
+
+def rebin(fuzzy_sets: list, bin_edges: np.ndarray) -> np.ndarray:
+    """
+    Redistributes the mass of every FuzzySet over common bin edges,
+    assuming the values are uniformly spread within each original bin.
+    Arguments:
+        fuzzy_sets {list} -- The FuzzySets.
+        bin_edges {np.ndarray} -- The common bin edges, see common_edges.
+    Returns:
+        np.ndarray -- One row of bin probabilities, summing to 1, per FuzzySet.
+    """
+    masses = np.empty((len(fuzzy_sets), len(bin_edges) - 1))
+    for row, fs in enumerate(fuzzy_sets):
+        edges = np.asarray(fs.bin_edges, dtype=np.float64)
+        cdf = np.r_[0, np.cumsum(np.asarray(fs.hist) * np.diff(edges))]
+        masses[row] = np.diff(np.interp(bin_edges, edges, cdf))
+    return masses
+
+
+def _intersection(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    return 1 - np.minimum(p[:, np.newaxis], q[np.newaxis]).sum(axis=-1)
+
+
+def _bhattacharyya(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    coefficient = np.sqrt(p) @ np.sqrt(q).T
+    with np.errstate(divide="ignore"):
+        return -np.log(np.clip(coefficient, 0, 1))
+
+
+def _jensen_shannon(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    p, q = p[:, np.newaxis], q[np.newaxis]
+    m = (p + q) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kl_p = np.where(p > 0, p * np.log2(p / m), 0).sum(axis=-1)
+        kl_q = np.where(q > 0, q * np.log2(q / m), 0).sum(axis=-1)
+    return np.sqrt(np.clip((kl_p + kl_q) / 2, 0, 1))
+
+
+def _emd(p: np.ndarray, q: np.ndarray, bin_widths: np.ndarray) -> np.ndarray:
+    # Integral of the absolute difference of the CDFs, linear within a bin
+    cdf_p, cdf_q = np.cumsum(p, axis=1), np.cumsum(q, axis=1)
+    weights = (bin_widths + np.r_[bin_widths[1:], 0]) / 2
+    return np.abs(cdf_p[:, np.newaxis] - cdf_q[np.newaxis]) @ weights
+
+
+def distance_matrix(
+    left: list,
+    right: Optional[list] = None,
+    metric: str = "intersection",
+    num_of_bins: Optional[int] = None,
+    max_elements: int = 1 << 24,
+) -> np.ndarray:
+    """
+    Pairwise distances between FuzzySets, after rebinning all of them
+    on common bin edges. Every metric is 0 for identical histograms:
+        intersection -- 1 minus the histogram intersection, in [0, 1].
+        bhattacharyya -- Bhattacharyya distance, minus log of the coefficient.
+        jensen_shannon -- Jensen-Shannon distance with base 2 logs, in [0, 1].
+        emd -- Earth Mover's distance, in the units of the signals.
+    Rows of left are processed in chunks, so that the broadcast temporaries
+    hold at most about max_elements values.
+    Arguments:
+        left {list} -- N FuzzySets.
+        right {Optional[list]} -- M FuzzySets, None to compare left with itself.
+        metric {str} -- One of METRICS.
+        num_of_bins {Optional[int]} -- Number of common bins, see common_edges.
+        max_elements {int} -- Bound of the temporaries of a chunk.
+    Returns:
+        np.ndarray -- The N x M distance matrix.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric}, expected one of {METRICS}")
+    right = left if right is None else right
+    bin_edges = common_edges(list(left) + list(right), num_of_bins)
+    p = rebin(left, bin_edges)
+    q = p if right is left else rebin(right, bin_edges)
+    return probability_distances(p, q, metric, np.diff(bin_edges), max_elements)
+
+
+def probability_distances(
+    p: np.ndarray,
+    q: np.ndarray,
+    metric: str = "intersection",
+    bin_width: Union[float, np.ndarray] = 1.0,
+    max_elements: int = 1 << 24,
+) -> np.ndarray:
+    """
+    Pairwise distances between the rows of two matrices of bin probabilities
+    on the same bins, see distance_matrix.
+    Arguments:
+        p {np.ndarray} -- N x B bin probabilities.
+        q {np.ndarray} -- M x B bin probabilities.
+        metric {str} -- One of METRICS.
+        bin_width {Union[float, np.ndarray]} -- Width of the bins, or of
+        every bin, used by emd.
+        max_elements {int} -- Bound of the temporaries of a chunk.
+    Returns:
+        np.ndarray -- The N x M distance matrix.
+    """
+    if metric == "bhattacharyya":
+        return _bhattacharyya(p, q)
+    bin_widths = np.broadcast_to(np.asarray(bin_width, dtype=np.float64), p.shape[1:])
+    chunk = max(1, max_elements // max(1, q.shape[0] * q.shape[1]))
+    distances = np.empty((p.shape[0], q.shape[0]))
+    for start in range(0, p.shape[0], chunk):
+        block = p[start : start + chunk]
+        if metric == "intersection":
+            distances[start : start + chunk] = _intersection(block, q)
+        elif metric == "jensen_shannon":
+            distances[start : start + chunk] = _jensen_shannon(block, q)
+        else:
+            distances[start : start + chunk] = _emd(block, q, bin_widths)
+    return distances
@@ -0,0 +1,192 @@
+import math
+import numpy as np
+from typing import Tuple, Union
+
+BINNINGS = ["range", "fd", "clipped", "quantile"]
+
+
+def add_counts(
+    offset: int, counts: np.ndarray, other_offset: int, other_counts: np.ndarray
+) -> Tuple[int, np.ndarray]:
+    """
+    Sum of two dense count arrays starting at the given bucket indices.
+    """
+    if len(counts) == 0:
+        return other_offset, other_counts.astype(np.int64)
+    if len(other_counts) == 0:
+        return offset, counts
+    low = min(offset, other_offset)
+    high = max(offset + len(counts), other_offset + len(other_counts))
+    total = np.zeros(high - low, dtype=np.int64)
+    total[offset - low : offset - low + len(counts)] += counts
+    total[other_offset - low : other_offset - low + len(other_counts)] += other_counts
+    return low, total
+
+
+class QuantileSketch:
+    """
+        One-pass, mergeable quantile sketch of a signal, after DDSketch.
+        Every value is counted in a bucket of logarithmic width, so any
+        quantile is estimated within twice relative_accuracy of a value of
+        the signal, whatever its distribution and outliers, in memory growing
+        only with the log of the range of the values. Counting a chunk
+        takes one log per value. The minimum and maximum are exact.
+        E.g. : q1, q3 = QuantileSketch().update(signal).quantile([0.25, 0.75])
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-9):
+        """
+        Arguments:
+            relative_accuracy {float} -- Relative error bound of the quantiles.
+            min_value {float} -- Values of smaller magnitude are counted as 0.
+        """
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive_offset, self.positive = 0, np.zeros(0, dtype=np.int64)
+        self.negative_offset, self.negative = 0, np.zeros(0, dtype=np.int64)
+        self.zeros = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> int:
+        return int(self.positive.sum() + self.negative.sum() + self.zeros)
+
+    def _buckets(self, magnitudes: np.ndarray) -> Tuple[int, np.ndarray]:
+        indices = np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64)
+        offset = indices.min()
+        return offset, np.bincount(indices - offset)
+
+    def update(self, chunk: np.ndarray) -> "QuantileSketch":
+        """
+        Adds the non-NaN values of a chunk of the signal.
+        """
+        chunk = np.asarray(chunk, dtype=np.float64).ravel()
+        chunk = chunk[~np.isnan(chunk)]
+        if len(chunk) == 0:
+            return self
+        self.min = min(self.min, chunk.min())
+        self.max = max(self.max, chunk.max())
+        positive = chunk[chunk > self.min_value]
+        negative = -chunk[chunk < -self.min_value]
+        self.zeros += len(chunk) - len(positive) - len(negative)
+        if len(positive):
+            self.positive_offset, self.positive = add_counts(
+                self.positive_offset, self.positive, *self._buckets(positive)
+            )
+        if len(negative):
+            self.negative_offset, self.negative = add_counts(
+                self.negative_offset, self.negative, *self._buckets(negative)
+            )
+        return self
+
+    def merge(self, *others: "QuantileSketch") -> "QuantileSketch":
+        """
+        Returns a new sketch counting the values of self and others.
+        """
+        merged = QuantileSketch(self.relative_accuracy, self.min_value)
+        for other in (self,) + others:
+            if other.gamma != self.gamma or other.min_value != self.min_value:
+                raise ValueError(
+                    "Cannot merge QuantileSketches with different accuracies"
+                )
+            merged.positive_offset, merged.positive = add_counts(
+                merged.positive_offset,
+                merged.positive,
+                other.positive_offset,
+                other.positive,
+            )
+            merged.negative_offset, merged.negative = add_counts(
+                merged.negative_offset,
+                merged.negative,
+                other.negative_offset,
+                other.negative,
+            )
+            merged.zeros += other.zeros
+            merged.min = min(merged.min, other.min)
+            merged.max = max(merged.max, other.max)
+        return merged
+
+    def __add__(self, other: "QuantileSketch") -> "QuantileSketch":
+        return self.merge(other)
+
+    def quantile(self, q: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """
+        Estimated quantiles of the values counted, NaN when there are none.
+        Arguments:
+            q {Union[float, np.ndarray]} -- Quantiles, between 0 and 1.
+        Returns:
+            Union[float, np.ndarray] -- The quantiles, 0 and 1 being the
+            exact minimum and maximum.
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)[()]
+        negative_bounds = -self.gamma ** (
+            self.negative_offset + np.arange(len(self.negative) + 1) - 1
+        )
+        positive_bounds = self.gamma ** (
+            self.positive_offset + np.arange(len(self.positive) + 1) - 1
+        )
+        # Bounds of the buckets in increasing order of their values, the
+        # values of a bucket are spread evenly between its bounds
+        lower = np.concatenate([negative_bounds[:0:-1], [0.0], positive_bounds[:-1]])
+        upper = np.concatenate([negative_bounds[-2::-1], [0.0], positive_bounds[1:]])
+        counts = np.concatenate([self.negative[::-1], [self.zeros], self.positive])
+        ends = np.cumsum(counts)
+        ranks = q * (self.count - 1)
+        buckets = np.minimum(np.searchsorted(ends, ranks, side="right"), len(ends) - 1)
+        shares = (ranks - ends[buckets] + counts[buckets] + 0.5) / counts[buckets]
+        result = lower[buckets] + np.clip(shares, 0, 1) * (
+            upper[buckets] - lower[buckets]
+        )
+        result = np.clip(result, self.min, self.max)
+        result = np.where(q <= 0, self.min, np.where(q >= 1, self.max, result))
+        return result[()]
+
+
+def sketch_edges(
+    sketch: QuantileSketch,
+    binning: str = "fd",
+    max_bins: int = 1000,
+    clip: float = 0.001,
+    default_bins: int = 50,
+) -> np.ndarray:
+    """
+    Bin edges of a signal from its QuantileSketch, with one of the rules:
+        fd -- Freedman-Diaconis bin width, 2 IQR / n ** (1 / 3), over the whole range.
+        clipped -- Freedman-Diaconis bin width over the range between the clip
+        and 1 - clip quantiles, the values outside belong to the outer bins.
+        quantile -- As many bins as clipped, each holding the same share of
+        the values, over the whole range.
+    Arguments:
+        sketch {QuantileSketch} -- The sketch of the signal.
+        binning {str} -- One of fd, clipped and quantile.
+        max_bins {int} -- Bound of the number of bins.
+        clip {float} -- Share of the values left out at each end by clipped.
+        default_bins {int} -- Number of bins without an interquartile range,
+        e.g. for mostly constant signals.
+    Returns:
+        np.ndarray -- The bin edges, increasing.
+    """
+    if binning not in BINNINGS[1:]:
+        raise ValueError(f"Unknown binning {binning}, expected one of {BINNINGS[1:]}")
+    if sketch.count == 0:
+        return np.linspace(0, 1, 51)
+    low, q1, q3, high = sketch.quantile([clip, 0.25, 0.75, 1 - clip])
+    if binning == "fd":
+        low, high = sketch.min, sketch.max
+    width = 2 * (q3 - q1) / sketch.count ** (1 / 3)
+    if width > 0 and high > low:
+        num_of_bins = int(np.clip(math.ceil((high - low) / width), 1, max_bins))
+    else:
+        num_of_bins = min(default_bins, max_bins)
+    if binning == "quantile":
+        edges = np.unique(sketch.quantile(np.linspace(0, 1, num_of_bins + 1)))
+        if len(edges) > 1:
+            return edges
+    elif high > low:
+        return np.linspace(low, high, num_of_bins + 1)
+    return np.array([sketch.min - 0.5, sketch.max + 0.5])
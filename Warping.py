@@ -0,0 +1,201 @@
+import heapq
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+
+def band(
+    n_rows: int, n_cols: int, window: Optional[float]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sakoe-Chiba band of the cost matrix of two series of n_rows and n_cols
+    samples, centred on its diagonal.
+    Arguments:
+        n_rows {int} -- Samples of the first series.
+        n_cols {int} -- Samples of the second series.
+        window {Optional[float]} -- Half width of the band, as a fraction of
+        n_cols, None for no band.
+    Returns:
+        Tuple[np.ndarray, np.ndarray] -- The first and last column of the band
+        in every row, inclusive.
+    """
+    if window is None:
+        return np.zeros(n_rows, dtype=np.int64), np.full(n_rows, n_cols - 1)
+    slope = (n_cols - 1) / (n_rows - 1) if n_rows > 1 else 0.0
+    # Wide enough for consecutive rows to stay connected
+    radius = max(window * n_cols, (slope - 1) / 2, 0.5)
+    centres = np.arange(n_rows) * slope
+    firsts = np.ceil(centres - radius - 1e-9).astype(np.int64).clip(0, n_cols - 1)
+    lasts = np.floor(centres + radius + 1e-9).astype(np.int64).clip(0, n_cols - 1)
+    return firsts, lasts
+
+
+def range_extremes(
+    values: np.ndarray, firsts: np.ndarray, lasts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Minimum and maximum of values[first:last + 1] for every pair of firsts
+    and lasts, from a sparse table of the extremes of the power of two
+    long ranges of values.
+    """
+    mins, maxs = [values], [values]
+    width = 1
+    while 2 * width <= len(values):
+        mins.append(np.minimum(mins[-1][:-width], mins[-1][width:]))
+        maxs.append(np.maximum(maxs[-1][:-width], maxs[-1][width:]))
+        width *= 2
+    lengths = lasts - firsts + 1
+    levels = np.floor(np.log2(lengths)).astype(np.int64)
+    seconds = lasts - (1 << levels) + 1
+    lower = np.empty(len(firsts))
+    upper = np.empty(len(firsts))
+    for level in np.unique(levels):
+        rows = levels == level
+        lower[rows] = np.minimum(mins[level][firsts[rows]], mins[level][seconds[rows]])
+        upper[rows] = np.maximum(maxs[level][firsts[rows]], maxs[level][seconds[rows]])
+    return lower, upper
+
+
+def lb_kim(query: np.ndarray, candidate: np.ndarray) -> float:
+    """
+    LB_Kim lower bound of the squared DTW distance, from the first and last
+    samples, which every warping path matches.
+    """
+    first = (query[0] - candidate[0]) ** 2
+    if len(query) == 1 and len(candidate) == 1:
+        return first
+    return first + (query[-1] - candidate[-1]) ** 2
+
+
+def lb_keogh(
+    query: np.ndarray, candidate: np.ndarray, window: Optional[float] = 0.1
+) -> np.ndarray:
+    """
+    LB_Keogh lower bound of the squared DTW distance, per sample of the query:
+    the squared distance of every sample from the envelope of the candidate
+    over its band. Every warping path matches every sample of the query
+    within its band, so the sum bounds the distance, and the sum of the
+    last samples bounds what the end of a path can still add.
+    Returns:
+        np.ndarray -- The bound of every sample of the query.
+    """
+    firsts, lasts = band(len(query), len(candidate), window)
+    lower, upper = range_extremes(candidate, firsts, lasts)
+    above = np.maximum(query - upper, 0)
+    below = np.maximum(lower - query, 0)
+    return above * above + below * below
+
+
+def dtw(
+    query: np.ndarray,
+    candidate: np.ndarray,
+    window: Optional[float] = 0.1,
+    max_distance: float = np.inf,
+    row_bounds: Optional[np.ndarray] = None,
+) -> float:
+    """
+    Dynamic time warping distance of two series, the square root of the
+    sum of the squared differences along the best warping path within
+    a Sakoe-Chiba band. The cost matrix is filled one row at a time, every
+    row with a cumulative minimum instead of a loop over its columns, and
+    the computation is abandoned as soon as every path of the band is
+    longer than max_distance.
+    Arguments:
+        query {np.ndarray} -- The first series.
+        candidate {np.ndarray} -- The second series.
+        window {Optional[float]} -- Half width of the band as a fraction of
+        the candidate length, None for unconstrained DTW.
+        max_distance {float} -- Distance beyond which to abandon.
+        row_bounds {Optional[np.ndarray]} -- lb_keogh of the query and the
+        candidate, to abandon earlier.
+    Returns:
+        float -- The distance, inf when it exceeds max_distance.
+    """
+    query = np.asarray(query, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    n_rows, n_cols = len(query), len(candidate)
+    if n_rows == 0 or n_cols == 0:
+        return np.inf
+    threshold = max_distance * max_distance
+    if row_bounds is None:
+        remaining = np.zeros(n_rows + 1)
+    else:
+        remaining = np.append(np.cumsum(row_bounds[::-1])[::-1], 0)
+    firsts, lasts = band(n_rows, n_cols, window)
+
+    # Rows of the cost matrix, column j at position j + 1, position 0 is
+    # the column before the first, where the paths start
+    previous = np.full(n_cols + 1, np.inf)
+    previous[0] = 0
+    current = np.full(n_cols + 1, np.inf)
+    # Positions set in each buffer, reset before it is reused
+    previous_set, current_set = slice(0, 1), slice(0, 0)
+    for row in range(n_rows):
+        first, last = firsts[row], lasts[row]
+        costs = candidate[first : last + 1] - query[row]
+        costs *= costs
+        # Best of the diagonal and vertical steps, then of the horizontal ones
+        steps = costs + np.minimum(
+            previous[first : last + 1], previous[first + 1 : last + 2]
+        )
+        sums = np.cumsum(costs)
+        totals = np.minimum.accumulate(steps - sums) + sums
+        current[current_set] = np.inf
+        current[first + 1 : last + 2] = totals
+        current_set = slice(first + 1, last + 2)
+        if totals.min() + remaining[row + 1] > threshold:
+            return np.inf
+        previous, current = current, previous
+        previous_set, current_set = current_set, previous_set
+    if previous[n_cols] > threshold:
+        return np.inf
+    return float(np.sqrt(previous[n_cols]))
+
+
+def dtw_search(
+    query: np.ndarray,
+    candidates: Sequence[np.ndarray],
+    k: int = 1,
+    window: Optional[float] = 0.1,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The k candidates nearest to the query by DTW distance, see dtw.
+    The candidates are ranked by their LB_Kim and LB_Keogh bounds, the search
+    stops at the first candidate whose bound exceeds the k-th distance found,
+    and every DTW is abandoned once it exceeds it.
+    Arguments:
+        query {np.ndarray} -- The series searched for.
+        candidates {Sequence[np.ndarray]} -- The series searched.
+        k {int} -- Number of neighbours.
+        window {Optional[float]} -- Half width of the band, see dtw.
+    Returns:
+        Tuple[np.ndarray, np.ndarray] -- Positions in candidates of the nearest
+        ones and their distances, nearest first.
+    """
+    query = np.asarray(query, dtype=np.float64)
+    candidates = [np.asarray(candidate, dtype=np.float64) for candidate in candidates]
+    usable = [i for i, candidate in enumerate(candidates) if len(candidate)]
+    if not len(query) or not usable:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    kim_bounds = np.array([lb_kim(query, candidates[i]) for i in usable])
+    row_bounds = [lb_keogh(query, candidates[i], window) for i in usable]
+    bounds = np.maximum(kim_bounds, [bounds.sum() for bounds in row_bounds])
+    # Max-heap of the k best (distance, position) so far
+    best: List[Tuple[float, int]] = []
+    for position in np.argsort(bounds, kind="stable"):
+        kth = -best[0][0] if len(best) == k else np.inf
+        if bounds[position] > kth * kth:
+            break
+        distance = dtw(
+            query, candidates[usable[position]], window, kth, row_bounds[position]
+        )
+        if distance < kth or len(best) < k:
+            if len(best) == k:
+                heapq.heapreplace(best, (-distance, usable[position]))
+            else:
+                heapq.heappush(best, (-distance, usable[position]))
+    best = sorted((-distance, position) for distance, position in best)
+    return (
+        np.array([position for _, position in best], dtype=np.int64),
+        np.array([distance for distance, _ in best]),
+    )
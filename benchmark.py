@@ -0,0 +1,294 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Callable, List, Optional
+import main
+import synthetic_data
+from OpportunityModel import OppDF, dat_reader, dat_schema
+from OpportunityView import OppSelect
+from Signal import FuzzySet, histograms
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+def measure(
+    stage: str,
+    function: Callable,
+    rows: Optional[int] = None,
+    signals: Optional[int] = None,
+    repeat: int = 1,
+    memory: bool = True,
+) -> dict:
+    """
+    Times a stage, best of repeat runs, then measures its peak memory
+    in one more run traced by tracemalloc, so tracing does not slow the
+    timed runs. The memory of worker processes is not traced.
+    Arguments:
+        stage {str} -- Name of the stage.
+        function {Callable} -- Runs the stage.
+        rows {Optional[int]} -- Rows processed by the stage, for rows/s.
+        signals {Optional[int]} -- Signals processed by the stage, for signals/s.
+        repeat {int} -- Timed runs.
+        memory {bool} -- Whether to measure the peak memory.
+    Returns:
+        dict -- The stage, seconds, throughputs and peak_bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        times.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    seconds = min(times)
+    result = {"stage": stage, "seconds": seconds, "peak_bytes": peak}
+    for unit, count in [("rows", rows), ("signals", signals)]:
+        if count is not None:
+            result[unit] = int(count)
+            result[f"{unit}_per_s"] = count / seconds if seconds > 0 else None
+    print(
+        f"{stage:<18} {seconds:9.4f} s"
+        + "".join(
+            f" {result[unit + '_per_s']:14,.0f} {unit}/s"
+            for unit in ["rows", "signals"]
+            if result.get(unit + "_per_s")
+        )
+        + (f" {peak / 2 ** 20:10.1f} MiB" if peak is not None else "")
+    )
+    return result
+
+
+def count_rows(path: str, chunk_size: int = 2**20) -> int:
+    """
+    Rows of a dat file, one per line, counted without parsing it.
+    """
+    n_rows, last = 0, b"\n"
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            n_rows += chunk.count(b"\n")
+            last = chunk[-1:]
+    # The last line may not end with a newline
+    return n_rows + (last != b"\n")
+
+
+def run(
+    data_folder: str,
+    work_folder: str,
+    n_jobs: Optional[int] = 1,
+    repeat: int = 1,
+    memory: bool = True,
+) -> List[dict]:
+    """
+    Benchmarks the stages of the pipeline on the dataset of data_folder:
+    parsing, ingestion, populate, the OppSelect filters, the FuzzySets
+    and the main loop.
+    Arguments:
+        data_folder {str} -- Folder of the dat, column_names and label_legend files.
+        work_folder {str} -- Folder for the pickles and the results.
+        n_jobs {Optional[int]} -- Processes of ingestion and of main, None for all cores.
+        repeat {int} -- Timed runs of every stage.
+        memory {bool} -- Whether to measure the peak memory of every stage.
+    Returns:
+        List[dict] -- The results of the stages, see measure.
+    """
+    pickle_path = Path(work_folder) / "pickles"
+    output_path = Path(work_folder) / "signal_info"
+    pickle_path.mkdir(parents=True, exist_ok=True)
+    db = OppDF()
+    data_files = db.dat_files(data_folder)
+    schema = dat_schema(Path(data_folder) / "column_names.txt")
+    results = []
+
+    def stage(name, function, **kwargs):
+        results.append(measure(name, function, repeat=repeat, memory=memory, **kwargs))
+
+    first_rows = len(dat_reader(data_files[0], schema))
+    stage("dat_reader", lambda: dat_reader(data_files[0], schema), rows=first_rows)
+    n_rows = sum(count_rows(file) for file in data_files)
+    stage(
+        "pickle_creation",
+        lambda: OppDF().pickle_creation(
+            data_folder, pickle_path, n_jobs=n_jobs, incremental=False
+        ),
+        rows=n_rows,
+    )
+    db.populate(pickle_path)
+    stage("populate", lambda: OppDF().populate(pickle_path))
+
+    def materialise():
+        model = OppDF()
+        model.populate(pickle_path)
+        return model.df
+
+    stage("materialise", materialise, rows=n_rows)
+    # The in-memory filters below work on the materialised DataFrame
+    db.df
+    stage("segment_index", lambda: OppSelect(db), rows=n_rows)
+
+    view = OppSelect(db)
+    pid, run_id = view.runs["PID"].iloc[0], view.runs["RunID"].iloc[0]
+    locomotion = view.segments[view.segments["Class"] == "Locomotion"]["Label"].iloc[0]
+    location = db.metadata["Location"].iloc[1]
+
+    def filter_stage(method, filter_dict):
+        def function():
+            getattr(view, method)(filter_dict)
+            view.df
+            view.restart()
+
+        return function
+
+    stage("run_indexing", filter_stage("run_indexing", {"PID": pid}), rows=n_rows)
+    stage(
+        "label_indexing",
+        filter_stage("label_indexing", {"Locomotion": locomotion}),
+        rows=n_rows,
+    )
+    stage(
+        "signal_indexing",
+        filter_stage("signal_indexing", {"Location": location}),
+        rows=n_rows,
+    )
+    query = (
+        view.query()
+        .run_indexing({"PID": pid, "RunID": run_id})
+        .label_indexing({"Locomotion": locomotion})
+    )
+    stage("query", query.materialise, rows=n_rows)
+
+    segment = query.materialise().iloc[:, 1:243]
+    matrix = segment.to_numpy()
+    columns = [matrix[:, col] for col in range(matrix.shape[1])]
+    stage(
+        "fuzzy_sets",
+        lambda: [FuzzySet(column[~np.isnan(column)]) for column in columns],
+        rows=len(matrix) * len(columns),
+        signals=len(columns),
+    )
+    stage(
+        "histograms",
+        lambda: histograms(matrix),
+        rows=len(matrix) * len(columns),
+        signals=len(columns),
+    )
+
+    tasks = main.segment_tasks(db, OppSelect(db, out_of_core=True))
+    task_rows = sum(int((ranges[:, 1] - ranges[:, 0]).sum()) for *_, ranges in tasks)
+    stage(
+        "main",
+        lambda: main.main(str(pickle_path), str(output_path), n_jobs),
+        rows=task_rows,
+        signals=sum(len(task[3]) for task in tasks),
+    )
+    return results
+
+
+def environment() -> dict:
+    return {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(baseline: dict, current: dict):
+    """
+    Prints the speedup of every stage of current over baseline,
+    both as saved by this script.
+    """
+    previous = {result["stage"]: result for result in baseline["stages"]}
+    print(
+        f"{'stage':<18} {'baseline':>10} {'current':>10} {'speedup':>8} {'memory':>8}"
+    )
+    for result in current["stages"]:
+        old = previous.get(result["stage"])
+        if old is None:
+            continue
+        memory = ""
+        if result.get("peak_bytes") and old.get("peak_bytes"):
+            memory = f"{result['peak_bytes'] / old['peak_bytes']:7.2f}x"
+        print(
+            f"{result['stage']:<18} {old['seconds']:10.4f} {result['seconds']:10.4f} "
+            f"{old['seconds'] / result['seconds']:7.2f}x {memory:>8}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the pipeline on a synthetic Opportunity-shaped dataset."
+    )
+    parser.add_argument(
+        "--data",
+        help="Existing dataset folder, a synthetic one is generated otherwise.",
+    )
+    parser.add_argument(
+        "--work", help="Folder of the pickles, a temporary one by default."
+    )
+    parser.add_argument("--subjects", type=int, default=2)
+    parser.add_argument("--runs", nargs="+", default=["ADL1", "ADL2", "Drill"])
+    parser.add_argument("--rows", type=int, default=10000, help="Samples per run.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes.")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per stage.")
+    parser.add_argument(
+        "--no-memory", action="store_true", help="Skip the peak memory runs."
+    )
+    parser.add_argument("--output", default="benchmark.json", help="JSON results file.")
+    parser.add_argument("--baseline", help="Previous JSON results to compare with.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary:
+        data_folder = args.data
+        config = vars(args).copy()
+        if data_folder is None:
+            data_folder = Path(temporary) / "data"
+            start = time.perf_counter()
+            synthetic_data.generate(
+                data_folder, args.subjects, args.runs, args.rows, args.seed
+            )
+            config["generate_seconds"] = time.perf_counter() - start
+        work_folder = args.work or Path(temporary) / "work"
+        stages = run(
+            data_folder, work_folder, args.jobs, args.repeat, not args.no_memory
+        )
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "config": config,
+        "max_rss_kib": (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+        ),
+        "stages": stages,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            compare(json.load(f), report)
@@ -0,0 +1,246 @@
+import time
+
+START = time.perf_counter()
+
+import argparse
+import importlib
+import sys
+from pathlib import Path
+from typing import List, Tuple
+import Instrumentation
+
+# Modules each subcommand needs, imported and timed only once it is chosen
+MODULES = {
+    "ingest": ["OpportunityModel"],
+    "fuzzify": ["main"],
+    "compare": ["HistogramStore", "Similarity"],
+    "export": ["OpportunityModel", "OpportunityView"],
+}
+
+
+def filter_item(item: str) -> Tuple[str, List[str]]:
+    """
+    Parses a KEY=VALUE[,VALUE...] filter argument, e.g. PID=1,2, which
+    keeps the rows of any of the values.
+    """
+    key, separator, values = item.partition("=")
+    if not separator or not key or not values:
+        raise argparse.ArgumentTypeError(f"Expected KEY=VALUE[,VALUE...], got {item!r}")
+    return key, values.split(",")
+
+
+def ingest(args: argparse.Namespace):
+    from OpportunityModel import OppDF
+
+    Path(args.pickles).mkdir(parents=True, exist_ok=True)
+    db = OppDF()
+    db.pickle_creation(
+        args.data, args.pickles, n_jobs=args.jobs, incremental=not args.full
+    )
+    print(f"{db.n_rows} rows of {len(db.columns)} columns in {args.pickles}")
+
+
+def fuzzify(args: argparse.Namespace):
+    import main
+
+    main.main(
+        args.pickles, args.output, args.jobs, args.binning, resume=not args.restart
+    )
+
+
+def compare(args: argparse.Namespace):
+    """
+    Distances between the FuzzySets of the left and right selections of
+    a HistogramStore, for every pair of them of the same signal.
+    """
+    import numpy as np
+    import pandas as pd
+    import Similarity
+    from HistogramStore import HistogramStore
+
+    store = HistogramStore(args.store)
+    left = store.select(dict(args.left))
+    right = store.select(dict(args.right))
+    keys = ["PID", "RunID", "Class", "Label"]
+    results = []
+    for column, left_rows in left.groupby("Column", sort=True):
+        right_rows = right[right["Column"] == column]
+        if not len(right_rows):
+            continue
+        distances = Similarity.distance_matrix(
+            [store.fuzzy_set(row) for row in left_rows.itertuples(index=False)],
+            [store.fuzzy_set(row) for row in right_rows.itertuples(index=False)],
+            args.metric,
+        )
+        n_left, n_right = distances.shape
+        pairs = pd.DataFrame(
+            {"Column": column, "Name": left_rows["Name"].iloc[0]},
+            index=range(n_left * n_right),
+        )
+        for key in keys:
+            pairs["left_" + key] = np.repeat(left_rows[key].to_numpy(), n_right)
+            pairs["right_" + key] = np.tile(right_rows[key].to_numpy(), n_left)
+        pairs[args.metric] = distances.ravel()
+        results.append(pairs)
+    if results:
+        results = pd.concat(results, ignore_index=True)
+    else:
+        results = pd.DataFrame(
+            columns=["Column", "Name"]
+            + [side + key for key in keys for side in ["left_", "right_"]]
+            + [args.metric]
+        )
+    results.to_csv(args.output or sys.stdout, index=False)
+
+
+def export(args: argparse.Namespace):
+    """
+    Writes a selection of the dataset to a csv file chunk by chunk, or to
+    a pickle when the output ends with .pkl.
+    """
+    from OpportunityModel import OppDF
+    from OpportunityView import OppSelect
+
+    db = OppDF()
+    db.populate(args.pickles)
+    view = OppSelect(db, out_of_core=True, chunk_size=args.chunk_size)
+    query = view.query()
+    if args.run:
+        query = query.run_indexing(dict(args.run))
+    if args.label:
+        query = query.label_indexing(dict(args.label))
+    if args.signal:
+        query = query.signal_indexing(dict(args.signal))
+    view.apply(query)
+
+    output = Path(args.output)
+    if output.suffix == ".pkl":
+        view.df.to_pickle(output)
+        return
+    written = 0
+    for df in view.chunks():
+        df.to_csv(output, mode="a" if written else "w", header=not written)
+        written += len(df)
+    if not written:
+        view.rows(0, 0).to_csv(output)
+    print(f"{written} rows of {len(view.column_positions)} columns in {output}")
+
+
+def parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Opportunity dataset handling and sensor similarity."
+    )
+    parser.add_argument(
+        "--timing",
+        action="store_true",
+        help="Report the import and startup time on stderr.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser(
+        "ingest", help="Parses the dat files into the column store."
+    )
+    command.add_argument(
+        "data", help="Folder of the dat, column_names and label_legend files."
+    )
+    command.add_argument("pickles", help="Folder of the produced pickles.")
+    command.add_argument(
+        "--jobs", type=int, default=1, help="Parsing processes, 0 for all cores."
+    )
+    command.add_argument(
+        "--full", action="store_true", help="Rebuild instead of only the changed files."
+    )
+    command.set_defaults(function=ingest)
+
+    command = commands.add_parser(
+        "fuzzify", help="Builds the HistogramStore of the FuzzySets of the segments."
+    )
+    command.add_argument("pickles", help="Folder of the dataset pickles.")
+    command.add_argument("output", help="Folder of the produced HistogramStore.")
+    command.add_argument(
+        "--jobs", type=int, default=1, help="Worker processes, 0 for all cores."
+    )
+    command.add_argument(
+        "--binning",
+        default="range",
+        choices=["range", "fd", "clipped", "quantile"],
+        help="Bins of the FuzzySets, from the range or from the quantiles.",
+    )
+    command.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore the checkpoint of an interrupted run instead of resuming it.",
+    )
+    command.set_defaults(function=fuzzify)
+
+    command = commands.add_parser(
+        "compare", help="Compares the FuzzySets of two selections of a HistogramStore."
+    )
+    command.add_argument("store", help="Folder of the HistogramStore.")
+    command.add_argument(
+        "--left", type=filter_item, nargs="*", default=[], metavar="KEY=VALUES"
+    )
+    command.add_argument(
+        "--right", type=filter_item, nargs="*", default=[], metavar="KEY=VALUES"
+    )
+    command.add_argument("--metric", default="intersection")
+    command.add_argument(
+        "--output", help="Csv file of the distances, stdout by default."
+    )
+    command.set_defaults(function=compare)
+
+    command = commands.add_parser(
+        "export", help="Writes a selection of the dataset to a csv or pkl file."
+    )
+    command.add_argument("pickles", help="Folder of the dataset pickles.")
+    command.add_argument("output", help="The csv or pkl file.")
+    command.add_argument(
+        "--run",
+        type=filter_item,
+        nargs="*",
+        metavar="KEY=VALUES",
+        help="PID, RunID, e.g. PID=1,2.",
+    )
+    command.add_argument(
+        "--label",
+        type=filter_item,
+        nargs="*",
+        metavar="KEY=VALUES",
+        help="Label classes, e.g. Locomotion=Walk,Stand.",
+    )
+    command.add_argument(
+        "--signal",
+        type=filter_item,
+        nargs="*",
+        metavar="KEY=VALUES",
+        help="Signal, Location or Sensor.",
+    )
+    command.add_argument(
+        "--chunk-size", type=int, help="Rows per chunk, one chunk per file by default."
+    )
+    command.set_defaults(function=export)
+    return parser
+
+
+def main(argv: List[str] = None):
+    args = parser().parse_args(argv)
+    if getattr(args, "jobs", None) == 0:
+        args.jobs = None
+    import_start = time.perf_counter()
+    for module in MODULES[args.command]:
+        importlib.import_module(module)
+    ready = time.perf_counter()
+    Instrumentation.record("cli.imports", ready - import_start)
+    Instrumentation.record("cli.startup", ready - START)
+    if args.timing:
+        print(
+            f"imports {ready - import_start:.3f} s, startup {ready - START:.3f} s",
+            file=sys.stderr,
+        )
+    args.function(args)
+    if args.timing:
+        print(f"total {time.perf_counter() - START:.3f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
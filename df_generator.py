@@ -5,8 +5,7 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from typing import List, Tuple
-from tqdm import tqdm
-import shutil
+from OpportunityModel import OppDF, dat_schema, read_dat_files
 
 data_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), '../Data/OpportunityUCIDataset/dataset')
 results_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), '../results/pickles')
@@ -110,42 +109,23 @@ def dat_reader(full_filepath: str) -> pd.DataFrame:
     df['RunID'] = file_re.group(2)
     return df
 
-def df_generator() -> Tuple[pd.DataFrame, pd.DataFrame]:
-    data_files = list(filter(lambda x: x.endswith('.dat'), os.listdir(data_folder)))
+def df_generator(n_jobs: int = 1) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    data_files = sorted(filter(lambda x: x.endswith('.dat'), os.listdir(data_folder)))
 
-    df_list = []
     metadata = column_name_handler(data_folder)
+    schema = dat_schema(os.path.join(data_folder, 'column_names.txt'))
     # Filename pattern for retrieving run_metadata
     # Metadata:
     # PID : Participant ID
     # RunID : Which run and iteration this file represents
-    for file in tqdm(data_files):
-
-        temp_df = dat_reader(os.path.abspath(os.path.join(data_folder,file)))
-        df_list.append(temp_df)
-
-    full_df = pd.concat(df_list, sort=False)
+    data_paths = [os.path.abspath(os.path.join(data_folder, file)) for file in data_files]
+    full_df = read_dat_files(data_paths, n_jobs=n_jobs, dtype=schema)
     return (full_df, metadata)
 
 if __name__ == "__main__":
 
-    data_pickle_path = os.path.join(results_folder, 'data.pkl')
-    metadata_pickle_path = os.path.join(results_folder, 'metadata.pkl')
-    labels_pickle_path = os.path.join(results_folder, 'labels.pkl')
-
     if not os.path.exists(results_folder):
         os.makedirs(results_folder)
-    if not os.path.isfile(data_pickle_path) or not os.path.isfile(metadata_pickle_path):
-        shutil.rmtree(results_folder)
-        os.makedirs(results_folder)
-        df, metadata = df_generator()
-        labels = label_handler(data_folder)
-        labels.to_pickle(labels_pickle_path)
-        df.to_pickle(data_pickle_path)
-        metadata.to_pickle(metadata_pickle_path)
-    else:
-        print('Already existing pickles')
-        df = pd.read_pickle(data_pickle_path)
-        metadata = pd.read_pickle(metadata_pickle_path)
-        labels = pd.read_pickle(labels_pickle_path)
-
+    # Only the dat files added or changed since the last run are parsed
+    db = OppDF()
+    db.pickle_creation(data_folder, results_folder)
@@ -1,51 +1,172 @@
 from OpportunityModel import OppDF
 from OpportunityView import OppSelect
+from HistogramStore import HistogramWriter
+from Pipeline import Pipeline
+import Instrumentation
 import Signal
-import pickle
-from pathlib import Path
-from collections import defaultdict
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from tqdm import tqdm
 
-class NestedDefaultDict(defaultdict):
-    def __init__(self, *args, **kwargs):
-        super(NestedDefaultDict, self).__init__(NestedDefaultDict, *args, **kwargs)
+# OppDF of the current process, used by fuzzify_segment
+_worker_db = None
 
-    def __repr__(self):
-        return repr(dict(self))
+def init_worker(pickle_path):
+    """
+    Populates the OppDF of a worker process. With a column store this only
+    memory-maps it, so all the workers share the same page-cached data.
+    """
+    global _worker_db
+    _worker_db = OppDF()
+    _worker_db.populate(pickle_path)
 
-def main():
+def segment_matrix(db, signals, ranges):
+    """
+    Reads the given row ranges of the signal columns, given by position,
+    into a 2-D matrix.
+    """
+    n_rows = int(sum(stop - start for start, stop in ranges))
+    columns = [db.column(signal) for signal in signals]
+    matrix = np.empty((n_rows, len(columns)), dtype=columns[0].dtype)
+    for position, column in enumerate(columns):
+        offset = 0
+        for start, stop in ranges:
+            matrix[offset:offset + stop - start, position] = column[start:stop]
+            offset += stop - start
+    return matrix
 
-    db = OppDF()
-    db.populate("../results/pickles")
-    db_view = OppSelect(db)
-    unique_pids = list(db.df['PID'].unique())
-    unique_locomotions = list(db.df['Locomotion'].unique())
-    unique_run_ids = list(db.df['RunID'].unique())
-    signal_info = NestedDefaultDict()
+def load_segment(task):
+    """
+    Reads the matrix of a segment and, with a gap index, its valid mask.
+    """
+    pid, run_id, locomotion, signals, ranges = task
+    with Instrumentation.span('load_segment', signals=len(signals)) as span:
+        matrix = segment_matrix(_worker_db, signals, ranges)
+        valid = None
+        if _worker_db.gaps is not None:
+            # Precomputed masks, so the histograms need not look for NaNs
+            valid = np.concatenate([_worker_db.gaps.valid(signals, start, stop)
+                                    for start, stop in ranges])
+        if span:
+            span.add(rows=len(matrix), bytes=matrix.nbytes)
+    return task, matrix, valid
+
+def fuzzify_loaded(loaded, binning='range'):
+    task, matrix, valid = loaded
+    return task, Signal.histograms(matrix, valid=valid, binning=binning)
+
+def fuzzify_task(task, binning='range'):
+    return fuzzify_loaded(load_segment(task), binning)
 
+def fuzzify_segment(task, binning='range'):
+    task, histograms = fuzzify_task(task, binning)
+    pid, run_id, locomotion = task[:3]
+    return pid, run_id, locomotion, histograms
+
+@Instrumentation.instrumented('segment_tasks')
+def segment_tasks(db, db_view):
+    """
+    Lists the (PID, RunID, Locomotion) segments to fuzzify, as row ranges
+    of the base DataFrame. Empty segments are skipped.
+    """
+    # Read from the index of the view, so the data are never materialised
+    locomotions = db_view.segments[db_view.segments['Class'] == 'Locomotion']
+    unique_pids = list(db_view.runs['PID'].unique())
+    unique_locomotions = list(locomotions['Label'].unique())
+    unique_run_ids = list(db_view.runs['RunID'].unique())
+    signals = list(range(1, 243))
+    tasks = []
     for pid in unique_pids:
         for run_id in unique_run_ids:
             db_view.run_indexing({'PID': pid, 'RunID': run_id})
-            for locomotion in unique_locomotions[1:]:
+            for locomotion in unique_locomotions:
                 db_view.label_indexing({'Locomotion': locomotion})
-                time = db_view.df['Time']
-                for signal in range(1,243):
-                    data = db_view.df.iloc[:,signal]
-                    temp_fs = Signal.FuzzySet(data)
-                    signal_name = data.name
-                    signal_info[pid][run_id][locomotion][signal_name]['fs'] = temp_fs
-                    print("---"*10)
-                    print(f"\tSignal:\t{signal_name}")
-                    print(f"\tMin:\t{min(data)}")
-                    print(f"\tMax:\t{max(data)}")
-                db_view.restart()
+                if len(db_view.ranges):
+                    tasks.append((pid, run_id, locomotion, signals,
+                                  db_view.ranges))
+                db_view.undo()
             db_view.restart()
-    result = dict(signal_info)
-    print(result)
-    print(type(result))
-    with open('../results/fs/signal_info.pkl', 'wb') as f:
-        pickle.dump(result, f)
-    
+    return tasks
 
-if __name__ == "__main__":
-    main()
+def main(pickle_path="../results/pickles",
+         output_path="../results/fs/signal_info", n_jobs=None,
+         binning='range', resume=True, prefetch=4):
+    """
+    Builds the FuzzySet of every signal for every PID, RunID and Locomotion
+    and saves them as a HistogramStore.
+    The segments are spread over n_jobs processes, None for all cores.
+    binning is one of Sketch.BINNINGS, see Signal.histograms.
+    The segments are loaded, fuzzified and written by a Pipeline, with at
+    most prefetch of them waiting between stages, and every segment is
+    checkpointed once written, see HistogramWriter. With resume, the
+    segments checkpointed by an interrupted run of the same dataset and
+    binning are not fuzzified again.
+    """
+    global _worker_db
+    db = OppDF()
+    db.populate(pickle_path)
+    # Out of core with a column store, only the segments fuzzified are read
+    db_view = OppSelect(db, out_of_core=True)
+    tasks = segment_tasks(db, db_view)
+    run = {'binning': binning,
+           'sources': db.store.sources if db.store is not None else {}}
+    writer = HistogramWriter(output_path, run=run, resume=resume)
+    todo = [task for task in tasks
+            if not writer.done((task[0], task[1], 'Locomotion', task[2]))]
+    progress = tqdm(total=len(tasks), initial=len(tasks) - len(todo),
+                    unit='segment')
+
+    def write(result):
+        task, (segment_hists, segment_edges) = result
+        pid, run_id, locomotion, signals, ranges = task
+        writer.write((pid, run_id, 'Locomotion', locomotion), signals,
+                     segment_hists, segment_edges)
+        progress.update()
+        if span:
+            span.add(rows=int((ranges[:, 1] - ranges[:, 0]).sum()),
+                     signals=len(signals))
+
+    if n_jobs == 1 or db.store is None:
+        # Without a column store the workers could not share the data, the
+        # segments are read ahead in a thread while the previous one is
+        # fuzzified
+        _worker_db = db
+        pool = None
+        pipeline = Pipeline(load_segment, partial(fuzzify_loaded,
+                                                  binning=binning),
+                            write, prefetch=prefetch)
+    else:
+        # The workers read their segments themselves from the column store
+        pool = ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker,
+                                   initargs=(pickle_path,))
+        pipeline = Pipeline(None, partial(fuzzify_task, binning=binning),
+                            write, prefetch=prefetch, executor=pool)
+    try:
+        with Instrumentation.span('fuzzify', segments=len(todo)) as span:
+            pipeline.run(todo)
+    finally:
+        progress.close()
+        writer.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    writer.finish(db.metadata)
 
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Builds the FuzzySets of the Opportunity signals.')
+    parser.add_argument('--pickles', default='../results/pickles',
+                        help='Folder containing the dataset pickles.')
+    parser.add_argument('--output', default='../results/fs/signal_info',
+                        help='Folder of the produced HistogramStore.')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Number of worker processes, all cores by default.')
+    parser.add_argument('--binning', default='range',
+                        help='FuzzySet binning: range, fd, clipped or quantile.')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore the checkpoint of an interrupted run.')
+    args = parser.parse_args()
+    main(args.pickles, args.output, args.jobs, args.binning,
+         resume=not args.restart)
@@ -0,0 +1,411 @@
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+BODY_ACCELEROMETERS = [
+    "RKN^",
+    "HIP",
+    "LUA^",
+    "RUA_",
+    "LH",
+    "BACK",
+    "RKN_",
+    "RWR",
+    "RUA^",
+    "LUA_",
+    "LWR",
+    "RH",
+]
+IMU_LOCATIONS = ["BACK", "RUA", "RLA", "LUA", "LLA"]
+IMU_SIGNALS = [
+    "accX",
+    "accY",
+    "accZ",
+    "gyroX",
+    "gyroY",
+    "gyroZ",
+    "magneticX",
+    "magneticY",
+    "magneticZ",
+    "Quaternion",
+    "Quaternion",
+    "Quaternion",
+    "Quaternion",
+]
+SHOE_LOCATIONS = ["L-SHOE", "R-SHOE"]
+SHOE_SIGNALS = [
+    "EuX",
+    "EuY",
+    "EuZ",
+    "NavAx",
+    "NavAy",
+    "NavAz",
+    "BodyAx",
+    "BodyAy",
+    "BodyAz",
+    "AngVelBodyFrameX",
+    "AngVelBodyFrameY",
+    "AngVelBodyFrameZ",
+    "AngVelNavFrameX",
+    "AngVelNavFrameY",
+    "AngVelNavFrameZ",
+    "Compass",
+]
+OBJECTS = [
+    "CUP",
+    "SALAD",
+    "WATER",
+    "CHEESE",
+    "BREAD",
+    "KNIFE1",
+    "MILK",
+    "SPOON",
+    "SUGAR",
+    "KNIFE2",
+    "PLATE",
+    "GLASS",
+]
+OBJECT_SIGNALS = ["accX", "accY", "accZ", "gyroX", "gyroY"]
+REED_SWITCHES = [
+    "DISHWASHER1",
+    "FRIDGE1",
+    "FRIDGE2",
+    "FRIDGE3",
+    "MIDDLEDRAWER1",
+    "MIDDLEDRAWER2",
+    "MIDDLEDRAWER3",
+    "LOWERDRAWER1",
+    "LOWERDRAWER2",
+    "LOWERDRAWER3",
+    "UPPERDRAWER",
+    "DISHWASHER2",
+    "DISHWASHER3",
+]
+AMBIENT_ACCELEROMETERS = [
+    "DOOR1",
+    "LAZYCHAIR",
+    "DOOR2",
+    "DISHWASHER",
+    "UPPERDRAWER",
+    "LOWERDRAWER",
+    "MIDDLEDRAWER",
+    "FRIDGE",
+    "CHAIR",
+    "TABLE",
+    "SWITCH",
+    "WINDOW",
+]
+LABEL_CLASSES = [
+    "Locomotion",
+    "HL_Activity",
+    "LL_Left_Arm",
+    "LL_Left_Arm_Object",
+    "LL_Right_Arm",
+    "LL_Right_Arm_Object",
+    "ML_Both_Arms",
+]
+GESTURES = [
+    "unlock",
+    "stir",
+    "lock",
+    "close",
+    "reach",
+    "open",
+    "sip",
+    "clean",
+    "bite",
+    "cut",
+    "spread",
+    "release",
+    "move",
+]
+GESTURE_OBJECTS = [
+    "Bottle",
+    "Salami",
+    "Bread",
+    "Sugar",
+    "Dishwasher",
+    "Switch",
+    "Milk",
+    "Drawer3 (lower)",
+    "Spoon",
+    "Knife cheese",
+    "Drawer2 (middle)",
+    "Table",
+    "Glass",
+    "Cheese",
+    "Chair",
+    "Door1",
+    "Door2",
+    "Plate",
+    "Drawer1 (top)",
+    "Fridge",
+    "Cup",
+    "Knife salami",
+    "Lazychair",
+]
+BOTH_ARMS = {
+    406516: "Open Door 1",
+    406517: "Open Door 2",
+    404516: "Close Door 1",
+    404517: "Close Door 2",
+    406520: "Open Fridge",
+    404520: "Close Fridge",
+    406505: "Open Dishwasher",
+    404505: "Close Dishwasher",
+    406519: "Open Drawer 1",
+    404519: "Close Drawer 1",
+    406511: "Open Drawer 2",
+    404511: "Close Drawer 2",
+    406508: "Open Drawer 3",
+    404508: "Close Drawer 3",
+    408512: "Clean Table",
+    407521: "Drink from Cup",
+    405506: "Toggle Switch",
+}
+# Mean length of the label runs of every class, in samples at 30 Hz
+MEAN_RUN_LENGTHS = {
+    "Locomotion": 300,
+    "HL_Activity": 6000,
+    "LL_Left_Arm": 60,
+    "LL_Left_Arm_Object": 60,
+    "LL_Right_Arm": 60,
+    "LL_Right_Arm_Object": 60,
+    "ML_Both_Arms": 90,
+}
+SAMPLE_PERIOD_MS = 33
+
+
+def sensor_layout() -> List[Tuple[str, str, str, str]]:
+    """
+    The 242 sensor columns of the Opportunity dataset, in its order.
+    Returns:
+        List[Tuple[str, str, str, str]] -- Sensor, Location, Signal and unit
+        description of every column.
+    """
+    layout = []
+    for location in BODY_ACCELEROMETERS:
+        for signal in ["accX", "accY", "accZ"]:
+            layout.append(("Accelerometer", location, signal, "unit = milli g"))
+    for location in IMU_LOCATIONS:
+        for signal in IMU_SIGNALS:
+            layout.append(("InertialMeasurementUnit", location, signal, "unit = raw"))
+    for location in SHOE_LOCATIONS:
+        for signal in SHOE_SIGNALS:
+            layout.append(("InertialMeasurementUnit", location, signal, "unit = raw"))
+    for location in OBJECTS:
+        for signal in OBJECT_SIGNALS:
+            layout.append(("Accelerometer", location, signal, "unit = milli g"))
+    for location in REED_SWITCHES:
+        layout.append(("REED", location, "state", "unit = binary"))
+    for location in AMBIENT_ACCELEROMETERS:
+        for signal in ["accX", "accY", "accZ"]:
+            layout.append(("Accelerometer", location, signal, "unit = milli g"))
+    return layout
+
+
+def label_legend() -> Dict[str, Dict[int, str]]:
+    """
+    Code to label name of every label class, as in the Opportunity legend.
+    """
+    return {
+        "Locomotion": {1: "Stand", 2: "Walk", 4: "Sit", 5: "Lie"},
+        "HL_Activity": {
+            101: "Relaxing",
+            102: "Coffee time",
+            103: "Early morning",
+            104: "Cleanup",
+            105: "Sandwich time",
+        },
+        "LL_Left_Arm": {201 + i: name for i, name in enumerate(GESTURES)},
+        "LL_Left_Arm_Object": {301 + i: name for i, name in enumerate(GESTURE_OBJECTS)},
+        "LL_Right_Arm": {401 + i: name for i, name in enumerate(GESTURES)},
+        "LL_Right_Arm_Object": {
+            501 + i: name for i, name in enumerate(GESTURE_OBJECTS)
+        },
+        "ML_Both_Arms": BOTH_ARMS,
+    }
+
+
+def write_column_names(path: str):
+    """
+    Writes the column_names.txt file of the synthetic dataset.
+    """
+    lines = ["Data columns:", "Column: 1 MILLISEC"]
+    for position, (sensor, location, signal, unit) in enumerate(sensor_layout(), 2):
+        lines.append(
+            f"Column: {position} {sensor} {location} {signal}; "
+            f"value = round(original_value), {unit}"
+        )
+    for position, label_class in enumerate(LABEL_CLASSES, len(lines)):
+        lines.append(f"Column: {position} {label_class}")
+    Path(path).write_text("\n".join(lines) + "\n")
+
+
+def write_label_legend(path: str):
+    """
+    Writes the label_legend.txt file of the synthetic dataset.
+    """
+    lines = ["Index   |   Track name   |   Label name"]
+    for label_class, labels in label_legend().items():
+        for code, name in labels.items():
+            lines.append(f"{code}   -   {label_class}   -   {name}")
+    Path(path).write_text("\n".join(lines) + "\n")
+
+
+def label_runs(
+    n_rows: int, codes: Sequence[int], mean_length: float, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    A label column made of runs of geometrically distributed lengths,
+    about a third of them of the null label 0.
+    """
+    n_runs = int(2 * n_rows / mean_length) + 2
+    lengths = rng.geometric(1 / mean_length, size=n_runs)
+    values = rng.choice(np.asarray(codes), size=n_runs)
+    values[rng.random(n_runs) < 0.3] = 0
+    column = np.repeat(values, lengths)
+    while len(column) < n_rows:
+        column = np.concatenate([column, column])
+    return column[:n_rows].astype(np.int64)
+
+
+def sensor_matrix(
+    n_rows: int,
+    n_cols: int,
+    rng: np.random.Generator,
+    locomotion: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Smooth, noisy sensor readings, rounded like the Opportunity values.
+    Every column mixes a few slow sinusoids, whose amplitude follows the
+    locomotion labels, with white noise.
+    """
+    time = np.arange(n_rows, dtype=np.float32)
+    matrix = np.empty((n_rows, n_cols), dtype=np.float32)
+    scales = rng.uniform(50, 1000, size=n_cols).astype(np.float32)
+    offsets = rng.normal(0, 500, size=n_cols).astype(np.float32)
+    activity = np.ones(n_rows, dtype=np.float32)
+    if locomotion is not None:
+        activity = np.where(locomotion == 2, 3.0, 1.0).astype(np.float32)
+    for col in range(n_cols):
+        frequencies = rng.uniform(0.001, 0.2, size=3).astype(np.float32)
+        phases = rng.uniform(0, 2 * np.pi, size=3).astype(np.float32)
+        wave = np.sin(np.outer(time, frequencies) + phases).sum(axis=1)
+        noise = rng.standard_normal(n_rows, dtype=np.float32)
+        matrix[:, col] = offsets[col] + scales[col] * (wave * activity + 0.3 * noise)
+    return np.round(matrix)
+
+
+def add_gaps(
+    matrix: np.ndarray,
+    rng: np.random.Generator,
+    gap_rate: float = 1e-3,
+    mean_gap: float = 20,
+    dead_fraction: float = 0.05,
+):
+    """
+    Adds NaN gaps in place: short dropped packet runs in every column, and
+    a long outage, of a tenth to a half of the rows, in a few columns.
+    Arguments:
+        gap_rate {float} -- Expected gaps per sample and column.
+        mean_gap {float} -- Mean samples of a dropped packet run.
+        dead_fraction {float} -- Fraction of the columns with a long outage.
+    """
+    n_rows, n_cols = matrix.shape
+    for col in range(n_cols):
+        n_gaps = rng.poisson(gap_rate * n_rows)
+        starts = rng.integers(0, n_rows, size=n_gaps)
+        lengths = rng.geometric(1 / mean_gap, size=n_gaps)
+        for start, length in zip(starts, lengths):
+            matrix[start : start + length, col] = np.nan
+        if rng.random() < dead_fraction:
+            length = int(n_rows * rng.uniform(0.1, 0.5))
+            start = rng.integers(0, n_rows - length + 1)
+            matrix[start : start + length, col] = np.nan
+
+
+def write_dat(path: str, time: np.ndarray, matrix: np.ndarray, labels: np.ndarray):
+    """
+    Writes a dat file, space separated, with NaN for the missing values.
+    """
+    # The values are whole numbers, written faster as nullable integers
+    df = pd.DataFrame(matrix).astype("Int64")
+    df.insert(0, "time", time)
+    for position, column in enumerate(labels.T):
+        df[f"label{position}"] = column
+    df.to_csv(path, sep=" ", header=False, index=False, na_rep="NaN")
+
+
+def generate(
+    folder: str,
+    subjects: int = 4,
+    runs: Sequence[str] = ("ADL1", "ADL2", "ADL3", "ADL4", "ADL5", "Drill"),
+    rows_per_run: int = 30000,
+    seed: int = 0,
+    gap_rate: float = 1e-3,
+    dead_fraction: float = 0.05,
+) -> List[Path]:
+    """
+    Writes a synthetic dataset shaped like Opportunity: one dat file per
+    subject and run, with the 250 columns of the original, plus its
+    column_names.txt and label_legend.txt.
+    The default scale is about the size of the original dataset.
+    Arguments:
+        folder {str} -- Folder to write to, created if needed.
+        subjects {int} -- Number of subjects, S1 to S{subjects}.
+        runs {Sequence[str]} -- Runs of every subject.
+        rows_per_run {int} -- Samples of every ADL run, Drill runs are longer.
+        seed {int} -- Seed of the random generator.
+        gap_rate {float} -- See add_gaps.
+        dead_fraction {float} -- See add_gaps.
+    Returns:
+        List[Path] -- The dat files written.
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    write_column_names(folder / "column_names.txt")
+    write_label_legend(folder / "label_legend.txt")
+    legend = label_legend()
+    n_cols = len(sensor_layout())
+    rng = np.random.default_rng(seed)
+    files = []
+    for subject in range(1, subjects + 1):
+        for run in runs:
+            n_rows = int(rows_per_run * (1.5 if run == "Drill" else 1))
+            labels = np.column_stack(
+                [
+                    label_runs(
+                        n_rows,
+                        list(legend[label_class]),
+                        MEAN_RUN_LENGTHS[label_class],
+                        rng,
+                    )
+                    for label_class in LABEL_CLASSES
+                ]
+            )
+            matrix = sensor_matrix(n_rows, n_cols, rng, labels[:, 0])
+            add_gaps(matrix, rng, gap_rate, dead_fraction=dead_fraction)
+            time = np.arange(n_rows, dtype=np.int64) * SAMPLE_PERIOD_MS
+            path = folder / f"S{subject}-{run}.dat"
+            write_dat(path, time, matrix, labels)
+            files.append(path)
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Writes a synthetic dataset shaped like Opportunity."
+    )
+    parser.add_argument("folder", help="Folder of the dataset.")
+    parser.add_argument("--subjects", type=int, default=4)
+    parser.add_argument(
+        "--runs", nargs="+", default=["ADL1", "ADL2", "ADL3", "ADL4", "ADL5", "Drill"]
+    )
+    parser.add_argument("--rows", type=int, default=30000, help="Samples per run.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gap-rate", type=float, default=1e-3)
+    args = parser.parse_args()
+    generate(args.folder, args.subjects, args.runs, args.rows, args.seed, args.gap_rate)
@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+
+# The modules live at the root of the repository
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import synthetic_data
+from OpportunityModel import OppDF
+
+
+@pytest.fixture
+def rng() -> np.random.Generator:
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def locomotion(rng) -> np.ndarray:
+    """
+    Locomotion labels of 3000 samples, in runs as in the synthetic dataset.
+    """
+    codes = list(synthetic_data.label_legend()["Locomotion"])
+    return synthetic_data.label_runs(3000, codes, 200, rng)
+
+
+@pytest.fixture
+def sensors(rng, locomotion) -> np.ndarray:
+    """
+    3000 samples of 12 synthetic sensor columns, whole numbers as the
+    Opportunity values, with NaN gaps and one column dead for a while.
+    """
+    matrix = synthetic_data.sensor_matrix(len(locomotion), 12, rng, locomotion)
+    synthetic_data.add_gaps(matrix, rng, gap_rate=5e-3, mean_gap=10)
+    matrix[1000:2500, 3] = np.nan
+    return matrix
+
+
+@pytest.fixture(scope="session")
+def opportunity(tmp_path_factory) -> Path:
+    """
+    Column store of a small synthetic dataset, one subject with an ADL and
+    a Drill run.
+    """
+    folder = tmp_path_factory.mktemp("opportunity")
+    synthetic_data.generate(
+        folder / "data", subjects=1, runs=("ADL1", "Drill"), rows_per_run=2000
+    )
+    OppDF().pickle_creation(str(folder / "data"), str(folder / "store"))
+    return folder / "store"
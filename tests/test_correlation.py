@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from Correlation import correlation_matrix, lag_correlations, standardized_block
+
+
+def brute_force_lags(matrix, max_lag, episodes=None):
+    """
+    Best lag and correlation of every pair of columns, one lag at a time,
+    pairing only samples of the same episode.
+    """
+    n_rows, n_cols = matrix.shape
+    if episodes is None:
+        episodes = np.zeros(n_rows, dtype=np.int64)
+    z = standardized_block(matrix, slice(0, n_cols))
+    lags = np.zeros((n_cols, n_cols), dtype=np.int64)
+    peaks = np.zeros((n_cols, n_cols))
+    for i in range(n_cols):
+        for j in range(n_cols):
+            correlations = []
+            for lag in range(-max_lag, max_lag + 1):
+                rows = np.arange(max(0, -lag), min(n_rows, n_rows - lag))
+                rows = rows[episodes[rows] == episodes[rows + lag]]
+                correlations.append((z[rows + lag, i] * z[rows, j]).sum() / n_rows)
+            best = np.abs(correlations).argmax()
+            lags[i, j] = best - max_lag
+            peaks[i, j] = correlations[best]
+    return lags, peaks
+
+
+@pytest.mark.parametrize("block_size", [1, 5, 64])
+def test_correlation_equals_dataframe_corr(sensors, block_size):
+    sensors = sensors.copy()
+    sensors[:, 5] = 1.0
+    result = correlation_matrix(sensors, block_size)
+    expected = pd.DataFrame(sensors).corr().to_numpy()
+    np.testing.assert_array_equal(np.isnan(result), np.isnan(expected))
+    np.testing.assert_allclose(result, expected, atol=1e-8, equal_nan=True)
+
+
+@pytest.fixture
+def lagged(sensors):
+    """
+    Sensors without gaps, column 1 following column 0 by 4 samples.
+    """
+    matrix = np.nan_to_num(sensors[:600, :6]).astype(np.float64)
+    matrix[:, 1] = np.roll(matrix[:, 0], 4) + 0.1 * matrix[:, 1]
+    return matrix
+
+
+@pytest.mark.parametrize("block_size", [2, 32])
+def test_lags_equal_brute_force(lagged, block_size):
+    lags, peaks = lag_correlations(lagged, 10, block_size)
+    expected_lags, expected_peaks = brute_force_lags(lagged, 10)
+    np.testing.assert_allclose(peaks, expected_peaks, atol=1e-9)
+    np.testing.assert_array_equal(lags, expected_lags)
+    assert lags[1, 0] == 4 and lags[0, 1] == -4
+
+
+def test_lags_never_cross_seams(lagged):
+    matrix = lagged
+    lengths = [250, 30, 320]
+    seams = np.cumsum(lengths)[:-1]
+    episodes = np.repeat(np.arange(len(lengths)), lengths)
+    lags, peaks = lag_correlations(matrix, 10, 4, seams)
+    expected_lags, expected_peaks = brute_force_lags(matrix, 10, episodes)
+    np.testing.assert_allclose(peaks, expected_peaks, atol=1e-9)
+    np.testing.assert_array_equal(lags, expected_lags)
+
+
+def test_lag_zero_is_pearson(lagged):
+    _, peaks = lag_correlations(lagged, 0)
+    np.testing.assert_allclose(peaks, np.corrcoef(lagged.T), atol=1e-9)
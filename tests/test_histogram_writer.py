@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import pytest
+import main
+from HistogramStore import HistogramStore, HistogramWriter
+from Signal import FuzzySet
+
+METADATA = pd.DataFrame(
+    {
+        "Sensor": ["Accelerometer", "Accelerometer"],
+        "Location": ["BACK", "HIP"],
+        "Signal": ["accX", "accY"],
+    },
+    index=[1, 2],
+)
+
+
+@pytest.fixture
+def segments(rng):
+    """
+    Four segments of two FuzzySets each, as written by main.
+    """
+    segments = []
+    for label in ["Stand", "Walk", "Sit", "Lie"]:
+        fuzzy_sets = [FuzzySet(rng.normal(size=300)) for _ in range(2)]
+        segments.append(
+            (
+                ("1", "ADL1", "Locomotion", label),
+                [1, 2],
+                [fuzzy_set.hist for fuzzy_set in fuzzy_sets],
+                [fuzzy_set.bin_edges for fuzzy_set in fuzzy_sets],
+            )
+        )
+    return segments
+
+
+def assert_same_store(store, expected):
+    store, expected = store.fuzzy_sets(), expected.fuzzy_sets()
+    assert list(store) == list(expected)
+    for key, fuzzy_set in expected.items():
+        np.testing.assert_array_equal(store[key].hist, fuzzy_set.hist)
+        np.testing.assert_array_equal(store[key].bin_edges, fuzzy_set.bin_edges)
+
+
+def write_all(path, segments, run=None):
+    with HistogramWriter(path, run=run) as writer:
+        for segment in segments:
+            writer.write(*segment)
+    return writer.finish(METADATA)
+
+
+def test_finish_equals_write(tmp_path, segments):
+    keys = [
+        segment + (column,) for segment, columns, _, _ in segments for column in columns
+    ]
+    expected = HistogramStore.write(
+        tmp_path / "expected",
+        keys,
+        [hist for segment in segments for hist in segment[2]],
+        [edges for segment in segments for edges in segment[3]],
+        METADATA,
+    )
+    store = write_all(tmp_path / "store", segments)
+    assert_same_store(store, expected)
+    assert not (tmp_path / "store.partial").exists()
+
+
+def test_torn_line_dropped(tmp_path, segments):
+    path = tmp_path / "store"
+    with HistogramWriter(path) as writer:
+        for segment in segments[:2]:
+            writer.write(*segment)
+    # A run stopped while writing the checkpoint line of the third segment
+    with open(writer.partial / HistogramWriter.CHECKPOINT_NAME, "a") as checkpoint:
+        checkpoint.write('{"segment": ["1", "ADL1", "Locom')
+    writer = HistogramWriter(path)
+    assert len(writer) == 2
+    assert writer.done(segments[1][0]) and not writer.done(segments[2][0])
+    for segment in segments[2:]:
+        writer.write(*segment)
+    assert_same_store(writer.finish(METADATA), write_all(tmp_path / "full", segments))
+
+
+def test_data_after_checkpoint_truncated(tmp_path, segments):
+    path = tmp_path / "store"
+    with HistogramWriter(path) as writer:
+        for segment in segments[:2]:
+            writer.write(*segment)
+    # A run stopped after writing data that no checkpoint line points to
+    ends = writer.segments[-1]["hists_end"], writer.segments[-1]["edges_end"]
+    for name in (HistogramWriter.HISTS_NAME, HistogramWriter.EDGES_NAME):
+        with open(writer.partial / name, "ab") as data_file:
+            np.full(7, np.nan).tofile(data_file)
+    writer = HistogramWriter(path)
+    for name, end in zip(
+        (HistogramWriter.HISTS_NAME, HistogramWriter.EDGES_NAME), ends
+    ):
+        assert (writer.partial / name).stat().st_size == end * 8
+    for segment in segments[2:]:
+        writer.write(*segment)
+    assert_same_store(writer.finish(METADATA), write_all(tmp_path / "full", segments))
+
+
+@pytest.mark.parametrize(
+    "run, resume", [({"binning": "fd"}, True), ({"binning": "range"}, False)]
+)
+def test_checkpoint_discarded(tmp_path, segments, run, resume):
+    path = tmp_path / "store"
+    with HistogramWriter(path, run={"binning": "range"}) as writer:
+        for segment in segments[:2]:
+            writer.write(*segment)
+    # Another run, or no resume, starts over
+    writer = HistogramWriter(path, run=run, resume=resume)
+    assert len(writer) == 0 and not writer.done(segments[0][0])
+    for segment in segments[2:]:
+        writer.write(*segment)
+    assert_same_store(
+        writer.finish(METADATA), write_all(tmp_path / "full", segments[2:])
+    )
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_main_resumes(tmp_path, opportunity, monkeypatch, n_jobs):
+    main.main(str(opportunity), str(tmp_path / "clean"), n_jobs)
+    expected = HistogramStore(tmp_path / "clean")
+    n_segments = len(expected.index.groupby(["PID", "RunID", "Label"]))
+
+    write = HistogramWriter.write
+
+    def crash(writer, *args):
+        if len(writer) == 3:
+            raise KeyboardInterrupt
+        write(writer, *args)
+
+    monkeypatch.setattr(HistogramWriter, "write", crash)
+    with pytest.raises(KeyboardInterrupt):
+        main.main(str(opportunity), str(tmp_path / "store"), n_jobs)
+    assert not (tmp_path / "store").exists()
+
+    fuzzified = []
+    fuzzify_loaded = main.fuzzify_loaded
+
+    def count(loaded, *args, **kwargs):
+        fuzzified.append(loaded[0])
+        return fuzzify_loaded(loaded, *args, **kwargs)
+
+    monkeypatch.setattr(HistogramWriter, "write", write)
+    monkeypatch.setattr(main, "fuzzify_loaded", count)
+    main.main(str(opportunity), str(tmp_path / "store"), n_jobs)
+    if n_jobs == 1:
+        # The segments checkpointed before the crash are not fuzzified again
+        assert len(fuzzified) == n_segments - 3
+    assert_same_store(HistogramStore(tmp_path / "store"), expected)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from Signal import FuzzySet, histograms
+
+
+def assert_same_fuzzy_set(fuzzy_set, expected):
+    np.testing.assert_allclose(fuzzy_set.bin_edges, expected.bin_edges, rtol=1e-12)
+    np.testing.assert_allclose(fuzzy_set.hist, expected.hist, rtol=1e-9)
+
+
+def test_batch_equals_fuzzy_set(sensors):
+    for col, fuzzy_set in enumerate(FuzzySet.batch(sensors)):
+        column = sensors[:, col]
+        assert_same_fuzzy_set(fuzzy_set, FuzzySet(column[~np.isnan(column)]))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 777, 65536])
+def test_histograms_with_valid_mask(sensors, chunk_size):
+    hists, bin_edges = histograms(sensors, chunk_size=chunk_size)
+    masked_hists, masked_edges = histograms(
+        sensors, chunk_size=chunk_size, valid=~np.isnan(sensors)
+    )
+    for col in range(sensors.shape[1]):
+        np.testing.assert_array_equal(masked_edges[col], bin_edges[col])
+        np.testing.assert_array_equal(masked_hists[col], hists[col])
+
+
+def test_histograms_num_of_bins(sensors):
+    hists, bin_edges = histograms(sensors, num_of_bins=7)
+    for col in range(sensors.shape[1]):
+        column = sensors[:, col]
+        expected_hist, expected_edges = np.histogram(
+            column[~np.isnan(column)], bins=7, density=True
+        )
+        np.testing.assert_allclose(bin_edges[col], expected_edges, rtol=1e-12)
+        np.testing.assert_allclose(hists[col], expected_hist, rtol=1e-9)
+
+
+def test_all_nan_column():
+    matrix = np.full((10, 2), np.nan)
+    matrix[:, 1] = np.arange(10)
+    hists, _ = histograms(matrix)
+    assert np.isnan(hists[0]).all()
+    assert np.isfinite(hists[1]).all()
@@ -0,0 +1,41 @@
+import pytest
+import Instrumentation
+
+
+@pytest.fixture(autouse=True)
+def disabled():
+    Instrumentation.disable()
+    yield
+    Instrumentation.disable()
+
+
+def test_parse_sinks_default_paths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sinks = Instrumentation.parse_sinks("log, json, cprofile")
+    assert [type(sink) for sink in sinks] == [
+        Instrumentation.LogSink,
+        Instrumentation.JsonSink,
+        Instrumentation.ProfileSink,
+    ]
+    Instrumentation.enable(sinks[1:])
+    with Instrumentation.span("work", rows=3):
+        Instrumentation.count("items", 2)
+    summary = Instrumentation.disable()
+    assert summary["spans"]["work"]["calls"] == 1
+    assert summary["counters"]["items"] == 2
+    assert (tmp_path / "instrumentation.json").exists()
+    assert (tmp_path / "profile.prof").exists()
+
+
+def test_parse_sinks_paths(tmp_path):
+    sink = Instrumentation.parse_sinks(f"json={tmp_path / 'summary.json'}")[0]
+    assert sink.path == str(tmp_path / "summary.json")
+    with pytest.raises(ValueError):
+        Instrumentation.parse_sinks("log,unknown")
+
+
+def test_invalid_environment_is_logged(monkeypatch, caplog):
+    monkeypatch.setenv(Instrumentation.ENV_VAR, "unknown")
+    Instrumentation.configure_from_env()
+    assert not Instrumentation.enabled()
+    assert "unknown" in caplog.text
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+import Similarity
+from HistogramStore import HistogramStore
+from NeighbourIndex import NeighbourIndex
+from Signal import FuzzySet
+
+
+@pytest.fixture
+def store(tmp_path, rng):
+    """
+    Store of 150 FuzzySets of normal samples of different means and
+    deviations, one of them with an outlier.
+    """
+    metadata = pd.DataFrame(
+        {
+            "Sensor": ["Accelerometer", "InertialMeasurementUnit", "REED switch"],
+            "Location": ["BACK", "HIP", "DOOR1"],
+            "Signal": ["accX", "accY", "S1"],
+        },
+        index=[1, 2, 3],
+    )
+    keys, hists, bin_edges = [], [], []
+    for position in range(150):
+        values = rng.normal(rng.uniform(-3, 3), rng.uniform(0.5, 3), 500)
+        if position == 7:
+            values[0] = 1e5
+        fuzzy_set = FuzzySet(values)
+        keys.append(("1", "ADL1", "Locomotion", str(position), position % 3 + 1))
+        hists.append(fuzzy_set.hist)
+        bin_edges.append(fuzzy_set.bin_edges)
+    return HistogramStore.write(tmp_path / "store", keys, hists, bin_edges, metadata)
+
+
+def brute_force(store, position, mask=None):
+    """
+    Rows of the store other than position, by increasing Hellinger
+    distance from the Bhattacharyya distances of Similarity.
+    """
+    fuzzy_sets = [store.fuzzy_set(row) for row in store.index.itertuples()]
+    distances = Similarity.distance_matrix(
+        [fuzzy_sets[position]], fuzzy_sets, "bhattacharyya"
+    )[0]
+    distances = np.sqrt(np.clip(1 - np.exp(-distances), 0, None))
+    rows = np.flatnonzero(np.arange(len(fuzzy_sets)) != position)
+    if mask is not None:
+        rows = rows[mask[rows]]
+    rows = rows[np.argsort(distances[rows], kind="stable")]
+    return rows, distances[rows]
+
+
+@pytest.mark.parametrize("leaf_size", [1, 4, 200])
+def test_query_equals_brute_force(store, leaf_size):
+    index = NeighbourIndex(store, leaf_size=leaf_size)
+    for position in [0, 7, 42, 149]:
+        found = index.query_row(position, k=10)
+        rows, distances = brute_force(store, position)
+        np.testing.assert_array_equal(
+            store.index.index.get_indexer(found.index), rows[:10]
+        )
+        np.testing.assert_allclose(found["distance"], distances[:10], atol=1e-4)
+
+
+def test_filtered_query_equals_brute_force(store):
+    index = NeighbourIndex(store, leaf_size=4)
+    found = index.query_row(3, k=5, filter_dict={"Location": "HIP"})
+    mask = (store.index["Location"] == "HIP").to_numpy()
+    rows, _ = brute_force(store, 3, mask)
+    assert (found["Location"] == "HIP").all()
+    np.testing.assert_array_equal(store.index.index.get_indexer(found.index), rows[:5])
+
+
+def test_save_load(store, tmp_path):
+    index = NeighbourIndex(store, leaf_size=4)
+    index.save(tmp_path / "neighbours.npz")
+    loaded = NeighbourIndex.load(store, tmp_path / "neighbours.npz")
+    pd.testing.assert_frame_equal(loaded.query_row(5), index.query_row(5))
+
+
+def test_leaf_size_validated(store):
+    with pytest.raises(ValueError):
+        NeighbourIndex(store, leaf_size=0)
@@ -0,0 +1,40 @@
+import shutil
+import numpy as np
+import pandas as pd
+import synthetic_data
+from OpportunityModel import OppDF
+
+
+def build(data_folder, store_path, incremental=True) -> OppDF:
+    db = OppDF()
+    db.pickle_creation(str(data_folder), str(store_path), incremental=incremental)
+    return db
+
+
+def test_incremental_equals_full_rebuild(tmp_path):
+    data, other = tmp_path / "data", tmp_path / "other"
+    runs = ("ADL1", "ADL2")
+    synthetic_data.generate(data, subjects=2, runs=runs, rows_per_run=500)
+    synthetic_data.generate(other, subjects=3, runs=runs, rows_per_run=600, seed=1)
+    build(data, tmp_path / "store")
+
+    # A modified, an added and a deleted file
+    shutil.copy(other / "S1-ADL2.dat", data / "S1-ADL2.dat")
+    shutil.copy(other / "S3-ADL1.dat", data / "S3-ADL1.dat")
+    (data / "S2-ADL1.dat").unlink()
+    # Left by an interrupted build
+    for name in ("data.old", "data.tmp"):
+        (tmp_path / "store" / name).mkdir()
+        (tmp_path / "store" / name / "0000.npy").write_bytes(b"stale")
+
+    incremental = build(data, tmp_path / "store")
+    full = build(data, tmp_path / "full", incremental=False)
+    assert incremental.store.sources == full.store.sources
+    pd.testing.assert_frame_equal(incremental.df, full.df)
+    columns = list(range(1, 243))
+    np.testing.assert_array_equal(
+        incremental.gaps.valid(columns, 0, incremental.n_rows),
+        full.gaps.valid(columns, 0, full.n_rows),
+    )
+    assert not (tmp_path / "store" / "data.old").exists()
+    assert not (tmp_path / "store" / "data.tmp").exists()
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from Pipeline import Pipeline
+
+
+def fail_on(value):
+    def stage(item):
+        if item == value:
+            raise RuntimeError(f"failed on {item}")
+        return item
+
+    return stage
+
+
+@pytest.mark.parametrize("executor", [None, ThreadPoolExecutor(3)])
+def test_results_written_in_order(executor):
+    written = []
+    pipeline = Pipeline(
+        lambda item: item * 2,
+        lambda item: item + 1,
+        written.append,
+        prefetch=2,
+        executor=executor,
+    )
+    assert pipeline.run(range(50)) == 50
+    assert written == [item * 2 + 1 for item in range(50)]
+
+
+@pytest.mark.parametrize("stage", ["load", "compute", "write"])
+@pytest.mark.parametrize("executor", [None, ThreadPoolExecutor(3)])
+def test_errors_propagate(stage, executor):
+    written = []
+    stages = {"load": None, "compute": lambda item: item, "write": written.append}
+    if stage == "write":
+        stages["write"] = lambda item: written.append(fail_on(10)(item))
+    else:
+        stages[stage] = fail_on(10)
+    pipeline = Pipeline(stages["load"], stages["compute"], stages["write"], 2, executor)
+    with pytest.raises(RuntimeError, match="failed on 10"):
+        pipeline.run(range(1000))
+    # Only the items before the failing one are written, in order
+    assert written == list(range(len(written)))
+    assert len(written) == 10 if stage == "write" else len(written) <= 10
@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import pytest
+from OpportunityModel import OppDF
+from OpportunityView import OppSelect
+from SharedSelection import SharedSelection
+
+
+def attached_frame(descriptor):
+    return SharedSelection.attach(descriptor).frame().copy()
+
+
+@pytest.fixture
+def view(opportunity):
+    db = OppDF()
+    db.populate(str(opportunity))
+    view = OppSelect(db, out_of_core=True)
+    view.label_indexing({"Locomotion": "Walk"})
+    return view
+
+
+def test_round_trip(view):
+    expected = view.df
+    categorical = (expected.dtypes == "category").to_numpy()
+    with SharedSelection.export(view, chunk_size=100) as shared:
+        name = shared.descriptor.name
+        with ProcessPoolExecutor(1) as pool:
+            df = pool.submit(attached_frame, shared.descriptor).result()
+    # The owner unlinked the segment when leaving the with block
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+    assert len(view.ranges) > 1
+    np.testing.assert_array_equal(df.index, expected.index)
+    np.testing.assert_array_equal(
+        df.iloc[:, : (~categorical).sum()].to_numpy(),
+        expected.iloc[:, ~categorical].to_numpy(np.float32),
+    )
+    for column in expected.columns[categorical]:
+        pd.testing.assert_series_equal(df[column], expected[column])
+
+
+def test_attached_arrays_share_memory(view):
+    with SharedSelection.export(view) as shared:
+        attached = SharedSelection.attach(shared.descriptor)
+        attached.values[0, 0] = -1
+        assert shared.values[0, 0] == -1
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+import Similarity
+from Signal import FuzzySet
+
+
+def uniform(first, last, num_of_bins=4):
+    edges = np.linspace(first, last, num_of_bins + 1)
+    return FuzzySet.from_histogram(np.full(num_of_bins, 1 / (last - first)), edges)
+
+
+@pytest.fixture
+def normals(rng):
+    return [FuzzySet(rng.normal(size=5000)) for _ in range(2)]
+
+
+def test_common_edges_union():
+    fuzzy_sets = [uniform(0, 1, 2), uniform(0.25, 2, 1)]
+    np.testing.assert_array_equal(
+        Similarity.common_edges(fuzzy_sets), [0, 0.25, 0.5, 1, 2]
+    )
+    np.testing.assert_array_equal(
+        Similarity.common_edges(fuzzy_sets, num_of_bins=4), [0, 0.5, 1, 1.5, 2]
+    )
+
+
+def test_common_edges_capped(normals):
+    edges = Similarity.common_edges(normals, max_bins=10)
+    assert len(edges) <= 11
+    assert np.all(np.diff(edges) > 0)
+    assert edges[0] == min(fs.bin_edges[0] for fs in normals)
+    assert edges[-1] == max(fs.bin_edges[-1] for fs in normals)
+
+
+def test_rebin_preserves_mass(normals):
+    edges = Similarity.common_edges(normals)
+    masses = Similarity.rebin(normals, edges)
+    np.testing.assert_allclose(masses.sum(axis=1), 1)
+    own = Similarity.rebin(normals[:1], normals[0].bin_edges)[0]
+    np.testing.assert_allclose(own, normals[0].hist * np.diff(normals[0].bin_edges))
+    halves = Similarity.rebin([uniform(0, 1, 1)], np.array([0, 0.25, 1]))[0]
+    np.testing.assert_allclose(halves, [0.25, 0.75])
+
+
+@pytest.mark.parametrize("metric", Similarity.METRICS)
+def test_identical_is_zero(normals, metric):
+    distances = Similarity.distance_matrix(normals, metric=metric)
+    np.testing.assert_allclose(np.diag(distances), 0, atol=1e-7)
+    np.testing.assert_allclose(distances, distances.T, atol=1e-12)
+    assert distances[0, 1] > 0
+
+
+@pytest.mark.parametrize(
+    "metric, expected",
+    [
+        ("intersection", 1),
+        ("bhattacharyya", np.inf),
+        ("jensen_shannon", 1),
+        ("emd", 2),
+    ],
+)
+def test_disjoint_supports(metric, expected):
+    distance = Similarity.distance_matrix([uniform(0, 1)], [uniform(2, 3)], metric)
+    assert distance[0, 0] == pytest.approx(expected)
+
+
+def test_known_values():
+    p = np.array([[0.5, 0.5]])
+    q = np.array([[1.0, 0.0]])
+    assert Similarity.probability_distances(p, q, "intersection")[0, 0] == 0.5
+    assert Similarity.probability_distances(p, q, "bhattacharyya")[
+        0, 0
+    ] == pytest.approx(-np.log(np.sqrt(0.5)))
+    assert Similarity.probability_distances(p, q, "emd", 2.0)[0, 0] == pytest.approx(1)
+
+
+@pytest.mark.parametrize("metric", Similarity.METRICS)
+def test_wide_fuzzy_set_does_not_merge_bins(rng, normals, metric):
+    wide = FuzzySet(np.r_[rng.normal(size=5000), 1e5])
+    alone = Similarity.distance_matrix(normals[:1], normals[1:], metric)[0, 0]
+    together = Similarity.distance_matrix(normals + [wide], metric=metric)[0, 1]
+    assert together == pytest.approx(alone, rel=1e-6)
+
+
+def test_chunks(rng, normals):
+    fuzzy_sets = normals + [FuzzySet(rng.normal(1, 2, 1000)) for _ in range(5)]
+    for metric in Similarity.METRICS:
+        np.testing.assert_allclose(
+            Similarity.distance_matrix(fuzzy_sets, metric=metric, max_elements=1),
+            Similarity.distance_matrix(fuzzy_sets, metric=metric),
+        )
+
+
+def test_unknown_metric(normals):
+    with pytest.raises(ValueError):
+        Similarity.distance_matrix(normals, metric="cosine")
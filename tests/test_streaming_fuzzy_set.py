@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from Signal import FuzzySet, StreamingFuzzySet
+
+
+def valid_values(column):
+    # StreamingFuzzySet counts float64 values
+    return column[~np.isnan(column)].astype(np.float64)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100, 3000])
+def test_chunks_equal_fuzzy_set(sensors, chunk_size):
+    for col in range(sensors.shape[1]):
+        column = sensors[:, col]
+        streaming = StreamingFuzzySet()
+        for start in range(0, len(column), chunk_size):
+            streaming.update(column[start : start + chunk_size])
+        fuzzy_set = streaming.to_fuzzy_set()
+        expected = FuzzySet(valid_values(column))
+        np.testing.assert_allclose(fuzzy_set.bin_edges, expected.bin_edges, rtol=1e-12)
+        np.testing.assert_allclose(fuzzy_set.hist, expected.hist, rtol=1e-9)
+
+
+def test_merge_equals_whole_signal(sensors):
+    column = sensors[:, 0]
+    parts = [StreamingFuzzySet().update(part) for part in np.array_split(column, 5)]
+    merged = parts[0].merge(*parts[1:])
+    whole = StreamingFuzzySet().update(column)
+    assert merged.count == whole.count == len(valid_values(column))
+    assert (merged.min, merged.max) == (whole.min, whole.max)
+    np.testing.assert_array_equal(
+        (parts[0] + parts[1]).counts,
+        StreamingFuzzySet()
+        .update(np.concatenate(np.array_split(column, 5)[:2]))
+        .counts,
+    )
+    np.testing.assert_array_equal(merged.to_fuzzy_set().hist, whole.to_fuzzy_set().hist)
+
+
+def test_merge_different_resolutions():
+    with pytest.raises(ValueError):
+        StreamingFuzzySet(1.0).merge(StreamingFuzzySet(0.5))
+    with pytest.raises(ValueError):
+        StreamingFuzzySet().merge(StreamingFuzzySet(1.0))
+
+
+def test_empty():
+    fuzzy_set = StreamingFuzzySet().update(np.full(5, np.nan)).to_fuzzy_set()
+    assert np.isnan(fuzzy_set.hist).all()
+
+
+def test_non_integer_values(rng):
+    values = rng.normal(0, 0.01, 3000)
+    streaming = StreamingFuzzySet()
+    for chunk in np.array_split(values, 7):
+        streaming.update(chunk)
+    fuzzy_set = streaming.to_fuzzy_set()
+    expected = FuzzySet(values)
+    assert np.count_nonzero(fuzzy_set.hist) == np.count_nonzero(expected.hist)
+    np.testing.assert_allclose(fuzzy_set.bin_edges, expected.bin_edges, rtol=1e-12)
+    np.testing.assert_allclose(fuzzy_set.hist, expected.hist, rtol=1e-9)
+
+
+def test_memory_bounded_by_max_bins(rng):
+    values = rng.normal(0, 1, 20000)
+    streaming = StreamingFuzzySet(max_bins=512)
+    for chunk in np.array_split(values, 10):
+        streaming.update(chunk)
+    assert len(streaming.bins) <= 512
+    fuzzy_set, expected = streaming.to_fuzzy_set(), FuzzySet(values)
+    # Values are only snapped within their FuzzySet bin or the next one
+    distance = np.abs(fuzzy_set.hist - expected.hist) @ np.diff(expected.bin_edges)
+    assert distance < 0.05
+
+
+def test_outlier_costs_one_bin(rng):
+    streaming = StreamingFuzzySet().update(np.r_[np.zeros(100), 1e9])
+    assert len(streaming.bins) == 2
+    values = np.r_[rng.normal(0, 1, 1000), 1e5]
+    streaming = StreamingFuzzySet().update(values)
+    assert len(streaming.bins) == len(np.unique(values))
+    np.testing.assert_allclose(
+        streaming.to_fuzzy_set().hist, FuzzySet(values).hist, rtol=1e-9
+    )
+
+
+def test_merge_different_grids(rng):
+    whole_numbers = np.round(rng.normal(0, 100, 500))
+    fractions = rng.normal(0, 1, 500)
+    merged = StreamingFuzzySet().update(whole_numbers) + StreamingFuzzySet().update(
+        fractions
+    )
+    expected = FuzzySet(np.r_[whole_numbers, fractions])
+    np.testing.assert_allclose(merged.to_fuzzy_set().hist, expected.hist, rtol=1e-9)
+
+
+def test_values_finer_than_resolution():
+    streaming = StreamingFuzzySet(resolution=0.5).update([0.5, 1.5, -2.0])
+    assert streaming.count == 3
+    with pytest.raises(ValueError):
+        StreamingFuzzySet(resolution=1.0).update([0.0, 0.5])
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from Warping import band, dtw, dtw_search, lb_keogh, lb_kim
+
+
+def brute_force_dtw(query, candidate, window=None):
+    """
+    DTW distance filling the whole cost matrix one cell at a time.
+    """
+    n_rows, n_cols = len(query), len(candidate)
+    firsts, lasts = band(n_rows, n_cols, window)
+    costs = np.full((n_rows + 1, n_cols + 1), np.inf)
+    costs[0, 0] = 0
+    for row in range(n_rows):
+        for col in range(firsts[row], lasts[row] + 1):
+            costs[row + 1, col + 1] = (query[row] - candidate[col]) ** 2 + min(
+                costs[row, col], costs[row, col + 1], costs[row + 1, col]
+            )
+    return np.sqrt(costs[n_rows, n_cols])
+
+
+@pytest.fixture
+def series(sensors):
+    """
+    Standardized segments of the sensor columns, of different lengths.
+    """
+    values = np.nan_to_num(sensors[:, :8]).astype(np.float64)
+    values = (values - values.mean(axis=0)) / values.std(axis=0)
+    lengths = [40, 55, 40, 33, 61, 40, 47, 52]
+    return [values[100 * i : 100 * i + n, i] for i, n in enumerate(lengths)]
+
+
+@pytest.mark.parametrize("window", [None, 0.1, 0.3])
+def test_dtw_equals_brute_force(series, window):
+    for query in series[:3]:
+        for candidate in series:
+            assert dtw(query, candidate, window) == pytest.approx(
+                brute_force_dtw(query, candidate, window), rel=1e-12
+            )
+
+
+def test_lower_bounds(series):
+    for query in series:
+        for candidate in series:
+            distance = dtw(query, candidate, 0.1) ** 2
+            assert lb_kim(query, candidate) <= distance + 1e-9
+            assert lb_keogh(query, candidate, 0.1).sum() <= distance + 1e-9
+
+
+def test_abandon(series):
+    query, candidate = series[0], series[1]
+    distance = dtw(query, candidate, 0.1)
+    assert dtw(query, candidate, 0.1, max_distance=distance * 0.99) == np.inf
+    bounds = lb_keogh(query, candidate, 0.1)
+    assert dtw(query, candidate, 0.1, distance * 1.01, bounds) == pytest.approx(
+        distance
+    )
+
+
+@pytest.mark.parametrize("k", [1, 3])
+def test_search_equals_exhaustive_scan(series, k):
+    query, candidates = series[0] + 0.05, series[1:]
+    positions, distances = dtw_search(query, candidates, k, 0.1)
+    expected = np.array([dtw(query, candidate, 0.1) for candidate in candidates])
+    order = np.argsort(expected, kind="stable")[:k]
+    np.testing.assert_array_equal(positions, order)
+    np.testing.assert_allclose(distances, expected[order])